@@ -0,0 +1,114 @@
+"""Backfill parsed citations onto existing research results.
+
+First gives cached Kanoon documents that predate citation parsing their
+``citation_keys``. Then walks ``research_results`` in batches, parses each
+``ai_response``, resolves every batch with one corpus query and writes
+``citations`` and the merged ``legal_authorities`` back with a single
+bulk_write per batch.
+
+Run from the backend directory:
+    python backfill_citations.py [--batch-size 500] [--all]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from citations import authority_labels, citation_keys, extract_citations, resolve_citations
+from storage_codec import FieldCodec
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+# Reads only; documents compressed with any algorithm are unpacked
+research_codec = FieldCodec(("ai_response", "indian_kanoon_results"))
+
+
+async def backfill_corpus_keys(db, batch_size: int) -> int:
+    updates = []
+    updated = 0
+    async for doc in db.kanoon_documents.find(
+        {"citation_keys": {"$exists": False}, "citation": {"$nin": [None, ""]}},
+        {"_id": 0, "tid": 1, "citation": 1}
+    ):
+        updates.append(UpdateOne({"tid": doc["tid"]}, {"$set": {"citation_keys": citation_keys(doc["citation"])}}))
+        if len(updates) >= batch_size:
+            updated += (await db.kanoon_documents.bulk_write(updates, ordered=False)).modified_count
+            updates = []
+    if updates:
+        updated += (await db.kanoon_documents.bulk_write(updates, ordered=False)).modified_count
+    return updated
+
+
+async def backfill_batch(db, batch: list) -> int:
+    parsed = [extract_citations(result.get("ai_response", "")) for result in batch]
+    local_results = [hit for result in batch for hit in result.get("indian_kanoon_results") or []]
+    await resolve_citations(parsed, db.kanoon_documents, local_results=local_results)
+
+    updates = [
+        UpdateOne(
+            {"id": result["id"]},
+            {"$set": {
+                "citations": citations,
+                "legal_authorities": list(dict.fromkeys((result.get("legal_authorities") or []) + authority_labels(citations))),
+            }}
+        )
+        for result, citations in zip(batch, parsed)
+    ]
+    if not updates:
+        return 0
+    return (await db.research_results.bulk_write(updates, ordered=False)).modified_count
+
+
+async def backfill(db, batch_size: int = 500, reparse_all: bool = False):
+    started = time.perf_counter()
+    corpus_updated = await backfill_corpus_keys(db, batch_size)
+
+    query = {} if reparse_all else {"citations": {"$exists": False}}
+    projection = {"_id": 0, "id": 1, "ai_response": 1, "legal_authorities": 1, "indian_kanoon_results.citation": 1,
+                  "indian_kanoon_results.tid": 1, "indian_kanoon_results.title": 1, "indian_kanoon_results.court": 1,
+                  "ai_response_z": 1, "indian_kanoon_results_z": 1, "indian_kanoon_results_json": 1, "compression": 1}
+    batch = []
+    scanned = 0
+    updated = 0
+    async for result in db.research_results.find(query, projection).batch_size(batch_size):
+        batch.append(research_codec.unpack(result))
+        if len(batch) >= batch_size:
+            updated += await backfill_batch(db, batch)
+            scanned += len(batch)
+            batch = []
+            logger.info(f"Backfilled {scanned} research results")
+    if batch:
+        updated += await backfill_batch(db, batch)
+        scanned += len(batch)
+
+    logger.info(
+        f"Citation backfill done: {corpus_updated} corpus documents keyed, "
+        f"{updated}/{scanned} research results updated in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--all", action="store_true", help="Re-parse results that already have citations")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        asyncio.run(backfill(client[os.environ['DB_NAME']], args.batch_size, args.all))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
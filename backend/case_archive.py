@@ -0,0 +1,179 @@
+"""Hot/cold tiering for cases.
+
+Cases that have been closed (``status`` closed or dropped, or the closed
+stage) for longer than a cutoff move from ``cases`` to ``cases_archive``.
+Their research results and documents move with them into
+``research_results_archive`` and ``legal_documents_archive``. The hot
+collections and their indexes then only hold active matters.
+
+Archiving copies to the cold collections first and then deletes from the hot
+ones, so an interrupted run loses nothing and can simply be re-run. Runs walk
+the ``case_archival`` index in closing order, a batch at a time, so each batch
+picks up where the previous one ended instead of rescanning. A case is
+only removed from the hot collection if it has not changed since it was
+copied. If it was reopened in between, its cold copies are dropped again.
+
+``find_by_id`` (repository.py) reads hot first and falls back to cold, which
+keeps lookups by id transparent. ``restore_case`` moves a case and its records back.
+
+Run from the backend directory:
+    python case_archive.py [--older-than-days 180] [--batch-size 200]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DeleteOne, ReplaceOne
+
+from repository import CLOSED_STATUSES, archive_name
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+# Records that belong to a case (by case_id) and move with it
+RELATED_COLLECTIONS = ("research_results", "legal_documents")
+# Order of the case_archival index
+ARCHIVAL_ORDER = ("closed_at", "updated_at", "id")
+
+
+def _closed_filter() -> dict:
+    return {"$or": [{"status": {"$in": list(CLOSED_STATUSES)}}, {"stage": "closed"}]}
+
+
+def _archival_windows(cutoff: datetime) -> List[Tuple[dict, Tuple[str, ...]]]:
+    """``(filter, keyset order)`` for cases with closed_at, then for those closed before it existed"""
+    return [
+        ({"closed_at": {"$lt": cutoff}}, ARCHIVAL_ORDER),
+        ({"closed_at": None, "updated_at": {"$lt": cutoff}}, ARCHIVAL_ORDER[1:]),
+    ]
+
+
+def archivable_filter(cutoff: datetime) -> dict:
+    """Closed cases whose closing (or, before closed_at existed, last update) predates ``cutoff``"""
+    return {"$and": [_closed_filter(), {"$or": [window for window, _ in _archival_windows(cutoff)]}]}
+
+
+def _after(keys: Tuple[str, ...], last: dict) -> dict:
+    """Keyset condition: documents that sort after ``last`` on ``keys``"""
+    return {"$or": [
+        {**{key: last[key] for key in keys[:n]}, keys[n]: {"$gt": last[keys[n]]}}
+        for n in range(len(keys))
+    ]}
+
+
+async def _copy(target, documents: List[dict]):
+    if documents:
+        await target.bulk_write(
+            [ReplaceOne({"id": doc["id"]}, doc, upsert=True) for doc in documents], ordered=False
+        )
+
+
+async def _move_related(db, case_ids: List[str], to_archive: bool):
+    """Copy, then delete, the research and documents of ``case_ids``"""
+    for collection in RELATED_COLLECTIONS:
+        source, target = db[collection], db[archive_name(collection)]
+        if not to_archive:
+            source, target = target, source
+        documents = await source.find({"case_id": {"$in": case_ids}}, {"_id": 0}).to_list(None)
+        await _copy(target, documents)
+        # Only what was copied; anything written meanwhile stays where it is
+        if documents:
+            await source.delete_many({"id": {"$in": [doc["id"] for doc in documents]}})
+
+
+async def notify_workers(db, namespace: str, keys):
+    """Invalidate the servers' read caches if their invalidation bus exists"""
+    keys = list(dict.fromkeys(keys))
+    if not keys or "cache_invalidations" not in await db.list_collection_names(filter={"name": "cache_invalidations"}):
+        return  # Inserting would create an uncapped collection the bus can't tail
+    await db.cache_invalidations.insert_many(
+        [{"origin": "case_archive", "namespace": namespace, "key": key} for key in keys]
+    )
+
+
+async def archive_batch(db, cases: List[dict]) -> List[str]:
+    """Move ``cases`` (full hot documents) to cold storage; returns the archived ids"""
+    now = datetime.utcnow()
+    ids = [case["id"] for case in cases]
+
+    await _copy(db.cases_archive, [{**case, "archived_at": now} for case in cases])
+    # Only unchanged cases leave the hot collection; reopened ones stay
+    await db.cases.bulk_write(
+        [DeleteOne({"id": case["id"], "updated_at": case.get("updated_at")}) for case in cases], ordered=False
+    )
+    still_hot = {doc["id"] for doc in await db.cases.find({"id": {"$in": ids}}, {"_id": 0, "id": 1}).to_list(None)}
+    if still_hot:
+        await db.cases_archive.delete_many({"id": {"$in": list(still_hot)}})
+    archived = [case_id for case_id in ids if case_id not in still_hot]
+    if archived:
+        await _move_related(db, archived, to_archive=True)
+    return archived
+
+
+async def archive_closed_cases(db, older_than_days: float = 180, batch_size: int = 200) -> dict:
+    started = time.perf_counter()
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    archived = 0
+    firms = set()
+    sort = [(key, 1) for key in ARCHIVAL_ORDER]
+    for window, keys in _archival_windows(cutoff):
+        last = None
+        while True:
+            query = {"$and": [_closed_filter(), window, *([_after(keys, last)] if last else [])]}
+            batch = await db.cases.find(query, {"_id": 0}).sort(sort).limit(batch_size).to_list(batch_size)
+            if not batch:
+                break
+            # Cases that changed under us stay behind; the next run picks them up
+            last = batch[-1]
+            moved = await archive_batch(db, batch)
+            archived += len(moved)
+            firms.update(case["law_firm_id"] for case in batch if case["id"] in moved)
+            logger.info(f"Archived {archived} cases")
+    await notify_workers(db, "firm_stats", firms)
+
+    result = {"archived": archived, "firms": len(firms), "cutoff": cutoff, "seconds": round(time.perf_counter() - started, 1)}
+    logger.info(f"Case archival done: {result}")
+    return result
+
+
+async def restore_case(db, case_id: str) -> Optional[dict]:
+    """Move an archived case and its records back to the hot collections"""
+    case = await db.cases_archive.find_one({"id": case_id}, {"_id": 0})
+    if case is None:
+        return None
+    case.pop("archived_at", None)
+    # Restart the archival clock; it stays closed until someone reopens it
+    case["closed_at"] = None
+    case["updated_at"] = datetime.utcnow()
+
+    await _move_related(db, [case_id], to_archive=False)
+    await _copy(db.cases, [case])
+    await db.cases_archive.delete_one({"id": case_id})
+    return case
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=float, default=float(os.environ.get('CASE_ARCHIVE_AFTER_DAYS', '180')))
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        asyncio.run(archive_closed_cases(client[os.environ['DB_NAME']], args.older_than_days, args.batch_size))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Citation extraction and resolution for AI research answers.
+
+``extract_citations`` finds case citations (AIR, SCC, SCC OnLine, SCR, Cri LJ,
+Supreme Court and High Court neutral citations) and statutory references
+("Section 138 of the Negotiable Instruments Act", "s. 302 IPC", "Article 21 of
+the Constitution") in free text. Plain substring scans locate reporter
+abbreviations and section/article markers, and the precompiled reporter pattern
+is only run in a small window around each hit. A 2000-token answer takes well
+under a millisecond (see benchmarks/citation_benchmark.py).
+
+Every case citation gets a normalised ``key`` such as ``scc:2017:10:1``. The
+same keys are stored on cached Kanoon documents (``citation_keys``), so
+``resolve_citations`` can resolve a whole batch of answers with one ``$in``
+query. Statutes resolve against ``STATUTES``, a table of common central Acts
+and their abbreviations.
+"""
+import re
+from typing import Dict, Iterable, List, Optional
+
+# Canonical Act -> (year, aliases). Aliases are matched case-insensitively
+# after dropping a leading "the" and a trailing year.
+_STATUTE_TABLE = {
+    "Constitution of India": (1950, ["constitution", "constitution of india", "coi"]),
+    "Indian Penal Code": (1860, ["indian penal code", "penal code", "ipc", "i.p.c."]),
+    "Code of Criminal Procedure": (1973, ["code of criminal procedure", "criminal procedure code", "crpc", "cr.p.c.", "cr. p.c."]),
+    "Code of Civil Procedure": (1908, ["code of civil procedure", "civil procedure code", "cpc", "c.p.c."]),
+    "Indian Evidence Act": (1872, ["indian evidence act", "evidence act", "iea"]),
+    "Bharatiya Nyaya Sanhita": (2023, ["bharatiya nyaya sanhita", "bns"]),
+    "Bharatiya Nagarik Suraksha Sanhita": (2023, ["bharatiya nagarik suraksha sanhita", "bnss"]),
+    "Bharatiya Sakshya Adhiniyam": (2023, ["bharatiya sakshya adhiniyam", "bsa"]),
+    "Indian Contract Act": (1872, ["indian contract act", "contract act"]),
+    "Negotiable Instruments Act": (1881, ["negotiable instruments act", "ni act", "n.i. act"]),
+    "Specific Relief Act": (1963, ["specific relief act"]),
+    "Limitation Act": (1963, ["limitation act"]),
+    "Transfer of Property Act": (1882, ["transfer of property act", "tp act", "t.p. act"]),
+    "Arbitration and Conciliation Act": (1996, ["arbitration and conciliation act", "arbitration act"]),
+    "Companies Act": (2013, ["companies act"]),
+    "Insolvency and Bankruptcy Code": (2016, ["insolvency and bankruptcy code", "ibc"]),
+    "Information Technology Act": (2000, ["information technology act", "it act"]),
+    "Consumer Protection Act": (2019, ["consumer protection act"]),
+    "Income Tax Act": (1961, ["income tax act", "income-tax act"]),
+    "Hindu Marriage Act": (1955, ["hindu marriage act"]),
+    "Hindu Succession Act": (1956, ["hindu succession act"]),
+    "Protection of Women from Domestic Violence Act": (2005, ["protection of women from domestic violence act", "domestic violence act", "pwdva"]),
+    "Narcotic Drugs and Psychotropic Substances Act": (1985, ["narcotic drugs and psychotropic substances act", "ndps act"]),
+    "Prevention of Corruption Act": (1988, ["prevention of corruption act", "pc act"]),
+    "Motor Vehicles Act": (1988, ["motor vehicles act", "mv act"]),
+    "Industrial Disputes Act": (1947, ["industrial disputes act", "id act"]),
+    "Right to Information Act": (2005, ["right to information act", "rti act"]),
+    "Protection of Children from Sexual Offences Act": (2012, ["protection of children from sexual offences act", "pocso act", "pocso"]),
+    "Real Estate (Regulation and Development) Act": (2016, ["real estate (regulation and development) act", "rera"]),
+}
+
+STATUTES: Dict[str, dict] = {
+    alias: {"act": name, "year": year}
+    for name, (year, aliases) in _STATUTE_TABLE.items()
+    for alias in aliases
+}
+
+# Reporter patterns, tried in a window around a trigger
+_CASE_PATTERNS = dict([
+    ("air", re.compile(r"\bAIR\s+(?P<year>(?:18|19|20)\d{2})\s+(?P<court>[A-Z][A-Za-z&]{1,10}(?:\s+[A-Z][a-z]{1,6})?)\s+(?P<page>\d{1,5})\b")),
+    ("scconline", re.compile(r"\b(?P<year>(?:19|20)\d{2})\s+SCC\s+On[Ll]ine\s+(?P<court>[A-Z][A-Za-z]{1,8})\s+(?P<page>\d{1,6})\b")),
+    ("scc", re.compile(r"[(\[]?(?P<year>(?:19|20)\d{2})[)\]]?\s+(?:(?P<supp>Supp(?:\.|l\.)?)\s*)?\(?(?P<volume>\d{1,2})\)?\s+SCC\s+(?:\(Cri\)\s+|\(Civ\)\s+|\(L&S\)\s+)?(?P<page>\d{1,5})\b")),
+    ("scr", re.compile(r"[(\[]?(?P<year>(?:18|19|20)\d{2})[)\]]?\s+(?:(?P<supp>Supp(?:\.|l\.)?)\s*)?(?:\(?(?P<volume>\d{1,2})\)?\s+)?SCR\s+(?P<page>\d{1,5})\b")),
+    ("crilj", re.compile(r"\b(?P<year>(?:18|19|20)\d{2})\s+(?:Cri\.? ?L\.? ?J\.?|CriLJ)\s+(?P<page>\d{1,5})\b")),
+    ("insc", re.compile(r"\b(?P<year>20\d{2})\s+INSC\s+(?P<page>\d{1,5})\b")),
+    ("neutral", re.compile(r"\b(?P<year>20\d{2}):(?P<court>[A-Z]{2,8}):(?P<page>\d{1,6})(?::[A-Z]{1,4})?\b")),
+])
+
+# Trigger literals. Every citation form contains one of these, and scanning for
+# plain literals is far cheaper than running the full patterns at every offset.
+# Reporters map to the patterns to try ("SCC OnLine" must win over plain "SCC");
+# None marks a statutory reference.
+_TRIGGERS = {
+    "AIR": ["air"],
+    "SCC": ["scconline", "scc"],
+    "SCR": ["scr"],
+    "Cri": ["crilj"],
+    "INSC": ["insc"],
+    ":": ["neutral"],
+    "Sec": None,
+    "Art": None,
+    "s.": None,
+    "S.": None,
+    "u/s": None,
+}
+
+_ACT_NAME = (
+    r"[A-Z][\w.'()-]*\s+(?:(?:[A-Z][\w.'()-]*|and|of|for|from|the|&)\s+){0,8}?"
+    r"(?:Act|Code|Sanhita|Adhiniyam)(?:,?\s+(?P<act_year>1[89]\d{2}|20\d{2}))?"
+)
+_ACT_ABBREVIATION = (
+    r"Constitution(?:\s+of\s+India)?|I\.?P\.?C\.?|Cr\.?\s?P\.?C\.?|C\.?P\.?C\.?|BNSS|BNS|BSA|IBC"
+    r"|NDPS\s+Act|POCSO(?:\s+Act)?|NI\s+Act|N\.I\.\s+Act|IT\s+Act|RERA"
+)
+_SECTION_NUMBERS = r"\d+[A-Z]{0,3}(?:\s*\(\w{1,4}\))*"
+_STATUTE_RE = re.compile(
+    r"\b(?P<marker>Sections?|Secs?\.?|Articles?|Arts?\.?|[Ss]s?\.|u/s\.?)\s*"
+    r"(?P<numbers>" + _SECTION_NUMBERS + r"(?:\s*(?:,|and|&|to|/)\s*" + _SECTION_NUMBERS + r"){0,6})"
+    r"(?:\s+(?:of\s+)?(?:the\s+)?(?P<act>" + _ACT_NAME + "|" + _ACT_ABBREVIATION + r"))?"
+)
+_SECTION_NUMBER_RE = re.compile(_SECTION_NUMBERS)
+_TRAILING_YEAR_RE = re.compile(r",?\s+(?:1[89]\d{2}|20\d{2})$")
+_SPACE_RE = re.compile(r"\s+")
+
+# Window scanned around a trigger; long enough for "(2017) 10 SCC (Cri) 12345"
+# and "(1994) Suppl. (3) SCC 569"
+_BEFORE = 20
+_AFTER = 40
+
+
+def _case_key(kind: str, match) -> str:
+    groups = match.groupdict()
+    parts = [kind, groups["year"]]
+    if groups.get("court"):
+        parts.append(_SPACE_RE.sub("", groups["court"]).lower())
+    if kind in ("scc", "scr"):
+        volume = (groups.get("volume") or "").lower().rstrip("l.").rstrip(".")
+        parts.append(f"supp{volume}" if groups.get("supp") else volume)
+    parts.append(groups["page"].lstrip("0") or "0")
+    return ":".join(parts)
+
+
+def lookup_statute(act: Optional[str]) -> Optional[dict]:
+    """Canonical Act for a name or abbreviation as written, if it is in STATUTES"""
+    if not act:
+        return None
+    name = _SPACE_RE.sub(" ", act).strip().lower()
+    if name.startswith("the "):
+        name = name[4:]
+    name = _TRAILING_YEAR_RE.sub("", name)
+    return STATUTES.get(name) or STATUTES.get(name.replace(" ", ""))
+
+
+def _trigger_positions(text: str) -> List[tuple]:
+    positions = []
+    for literal, reporters in _TRIGGERS.items():
+        index = text.find(literal)
+        while index != -1:
+            positions.append((index, len(literal), reporters))
+            index = text.find(literal, index + 1)
+    positions.sort()  # Literals never share a start offset, so this orders by position
+    return positions
+
+
+def extract_citations(text: str) -> List[dict]:
+    """Case and statute citations in ``text``, de-duplicated, in order of appearance.
+
+    Case citations look like ``{"kind": "case", "reporter": "scc", "key":
+    "scc:2017:10:1", "text": "(2017) 10 SCC 1"}``. Statutory references look like
+    ``{"kind": "statute", "provision": "section", "sections": ["138"], "act":
+    "Negotiable Instruments Act", "resolved": True, ...}``; ``act`` is None
+    when no Act is named and ``resolved`` is False when it is not in STATUTES.
+    """
+    if not text:
+        return []
+    citations = []
+    seen = set()
+    seen_text = set()  # Answers repeat citations; skip normalising the same text twice
+    covered_until = -1
+    length = len(text)
+
+    for position, size, reporters in _trigger_positions(text):
+        if position < covered_until:
+            continue
+
+        if reporters:
+            start = max(0, position - _BEFORE)
+            end = min(length, position + size + _AFTER)
+            for kind in reporters:
+                match = _CASE_PATTERNS[kind].search(text, start, end)
+                if match is None or match.end() <= position:
+                    continue
+                covered_until = match.end()
+                if match.group() in seen_text:
+                    break
+                seen_text.add(match.group())
+                key = _case_key(kind, match)
+                if key not in seen:
+                    seen.add(key)
+                    citations.append({"kind": "case", "reporter": kind, "key": key, "text": match.group().strip()})
+                break
+            continue
+
+        if size == 2 and position and text[position - 1] in "sS":
+            position -= 1  # "ss." abbreviates "sections"
+        match = _STATUTE_RE.match(text, position, min(length, position + 200))
+        if match is None:
+            continue
+        covered_until = match.end()
+        if match.group() in seen_text:
+            continue
+        seen_text.add(match.group())
+        marker = match.group("marker").lower()
+        provision = "article" if marker.startswith("art") else "section"
+        sections = _SECTION_NUMBER_RE.findall(match.group("numbers"))
+        statute = lookup_statute(match.group("act"))
+        if statute is None and provision == "article" and match.group("act") is None:
+            statute = STATUTES["constitution"]
+        act = statute["act"] if statute else match.group("act")
+        key = f"{provision}:{act or ''}:{','.join(_SPACE_RE.sub('', s) for s in sections)}".lower()
+        if key not in seen:
+            seen.add(key)
+            citations.append({
+                "kind": "statute",
+                "provision": provision,
+                "sections": [_SPACE_RE.sub("", s) for s in sections],
+                "act": act,
+                "act_year": statute["year"] if statute else (int(match.group("act_year")) if match.group("act_year") else None),
+                "resolved": statute is not None,
+                "text": match.group().strip(),
+            })
+    return citations
+
+
+def citation_keys(text: str) -> List[str]:
+    """Normalised keys of the case citations in ``text`` (e.g. a Kanoon citation field)"""
+    return [citation["key"] for citation in extract_citations(text) if citation["kind"] == "case"]
+
+
+def _kanoon_authority(doc: dict) -> dict:
+    return {
+        "tid": doc.get("tid"),
+        "title": doc.get("title"),
+        "court": doc.get("court"),
+        "url": f"https://indiankanoon.org/doc/{doc.get('tid')}" if doc.get("tid") is not None else doc.get("url"),
+    }
+
+
+async def resolve_citations(batches: List[List[dict]], documents=None, local_results: Iterable[dict] = ()) -> List[List[dict]]:
+    """Attach Kanoon matches to the case citations of several answers at once.
+
+    ``batches`` holds one citation list per answer, as returned by
+    ``extract_citations``. Keys are looked up first in ``local_results`` (for
+    instance the Kanoon hits returned with the answer), then in the cached
+    corpus ``documents`` with a single ``$in`` query. Statute citations were
+    already resolved against the statute table during extraction.
+    """
+    by_key = {}
+    for result in local_results:
+        for key in citation_keys(result.get("citation") or ""):
+            by_key.setdefault(key, _kanoon_authority(result))
+
+    wanted = {
+        citation["key"] for citations in batches for citation in citations
+        if citation["kind"] == "case" and citation["key"] not in by_key
+    }
+    if wanted and documents is not None:
+        async for doc in documents.find(
+            {"citation_keys": {"$in": list(wanted)}},
+            {"_id": 0, "tid": 1, "title": 1, "court": 1, "citation_keys": 1}
+        ):
+            for key in doc.get("citation_keys", []):
+                by_key.setdefault(key, _kanoon_authority(doc))
+
+    for citations in batches:
+        for citation in citations:
+            if citation["kind"] == "case":
+                match = by_key.get(citation["key"])
+                citation["resolved"] = match is not None
+                citation["authority"] = match
+    return batches
+
+
+def authority_labels(citations: List[dict]) -> List[str]:
+    """Short human-readable labels for ``legal_authorities``"""
+    labels = []
+    for citation in citations:
+        if citation["kind"] == "case":
+            authority = citation.get("authority")
+            labels.append(f"{authority['title']}, {citation['text']}" if authority and authority.get("title") else citation["text"])
+        elif citation["act"]:
+            provision = "Article" if citation["provision"] == "article" else "Section"
+            plural = "s" if len(citation["sections"]) > 1 else ""
+            labels.append(f"{provision}{plural} {', '.join(citation['sections'])} of the {citation['act']}")
+        else:
+            labels.append(citation["text"])
+    return labels
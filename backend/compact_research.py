@@ -0,0 +1,89 @@
+"""Compress existing research results at rest.
+
+Rewrites ``research_results`` documents stored before compression was enabled:
+``ai_response`` and ``indian_kanoon_results`` are packed with the configured
+RESEARCH_COMPRESSION algorithm, and the ``ai_preview`` used by history list
+views is added. Documents with nothing large enough to compress are marked
+``compression: "none"``, so every document is rewritten at most once.
+
+Run from the backend directory:
+    python compact_research.py [--batch-size 500]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne
+
+from repository import RESEARCH_COMPRESSED_FIELDS, research_preview
+from storage_codec import UNCOMPRESSED, FieldCodec
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger(__name__)
+
+
+def compact_update(codec: FieldCodec, document: dict) -> UpdateOne:
+    packed = codec.pack({field: document[field] for field in codec.fields if field in document})
+    # Fields that were compressed move to <field>_z; small ones are left as they are
+    unset = {field: "" for field in codec.fields if field in document and field not in packed}
+    update = {"$set": {
+        "compression": UNCOMPRESSED, **packed, "ai_preview": research_preview(document.get("ai_response"))
+    }}
+    if unset:
+        update["$unset"] = unset
+    return UpdateOne({"id": document["id"]}, update)
+
+
+async def compact(db, codec: FieldCodec, batch_size: int = 500):
+    started = time.perf_counter()
+    stats_before = await db.command("collStats", "research_results")
+    updates = []
+    rewritten = 0
+    async for document in db.research_results.find(
+        {"compression": {"$exists": False}},
+        {"_id": 0, "id": 1, **{field: 1 for field in codec.fields}}
+    ).batch_size(batch_size):
+        updates.append(compact_update(codec, document))
+        if len(updates) >= batch_size:
+            rewritten += (await db.research_results.bulk_write(updates, ordered=False)).modified_count
+            updates = []
+            logger.info(f"Compacted {rewritten} research results")
+    if updates:
+        rewritten += (await db.research_results.bulk_write(updates, ordered=False)).modified_count
+
+    stats_after = await db.command("collStats", "research_results")
+    logger.info(
+        f"Compacted {rewritten} research results with {codec.algorithm} in {time.perf_counter() - started:.1f}s; "
+        f"data size {stats_before.get('size', 0)} -> {stats_after.get('size', 0)} bytes"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    codec = FieldCodec(
+        RESEARCH_COMPRESSED_FIELDS,
+        algorithm=os.environ.get('RESEARCH_COMPRESSION', 'zlib').lower(),
+        min_bytes=int(os.environ.get('RESEARCH_COMPRESSION_MIN_BYTES', '1024'))
+    )
+    if codec.algorithm is None:
+        raise SystemExit("RESEARCH_COMPRESSION is disabled; nothing to do")
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    try:
+        asyncio.run(compact(client[os.environ['DB_NAME']], codec, args.batch_size))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
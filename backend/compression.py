@@ -0,0 +1,123 @@
+"""Negotiated response compression for the API.
+
+``CompressionMiddleware`` compresses single-body responses with brotli or gzip,
+whichever the client's ``Accept-Encoding`` ranks higher. Brotli wins ties
+because it is smaller at the same CPU cost. Responses below ``minimum_size``,
+already encoded ones and non-text content types are sent as they are. So are
+streamed responses (NDJSON research batches, Kanoon streams), which must reach
+the client line by line.
+
+Compressible responses always carry ``Vary: Accept-Encoding``, so the nginx
+micro-cache keeps one variant per encoding. Bodies above ``offload_bytes`` are
+compressed in a worker thread to keep the event loop free.
+
+brotli needs the optional ``brotli`` package. Without it only gzip is offered.
+"""
+import asyncio
+import gzip
+import logging
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional, gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "image/svg+xml")
+
+
+def _compressible(content_type: str) -> bool:
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return media_type.startswith("text/") or media_type in COMPRESSIBLE_TYPES
+
+
+def negotiate(accept_encoding: str, offered: List[str]) -> Optional[str]:
+    """Best of ``offered`` (in preference order) for an Accept-Encoding header"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    best, best_q = None, 0.0
+    for coding in offered:
+        q = weights.get(coding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = 1024,
+        gzip_level: int = 5,
+        brotli_quality: int = 4,
+        offload_bytes: int = 256 * 1024,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.offload_bytes = offload_bytes
+        self.offered = (["br"] if brotli is not None else []) + ["gzip"]
+
+    def _compress(self, encoding: str, body: bytes) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate(Headers(scope=scope).get("accept-encoding", ""), self.offered)
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                if _compressible(headers.get("content-type", "")) and "content-encoding" not in headers:
+                    MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                    start_message = message  # Held until we know whether the body is streamed
+                    return
+                await send(message)
+                return
+            if message["type"] != "http.response.body" or start_message is None:
+                await send(message)
+                return
+
+            start, start_message = start_message, None
+            body = message.get("body", b"")
+            if encoding is None or message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) > self.offload_bytes:
+                compressed = await asyncio.to_thread(self._compress, encoding, body)
+            else:
+                compressed = self._compress(encoding, body)
+            headers = MutableHeaders(scope=start)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start)
+            await send({**message, "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
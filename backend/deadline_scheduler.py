@@ -0,0 +1,304 @@
+"""Alerts generated from case dates.
+
+``DeadlineScheduler`` runs in every worker, but only the holder of a lease in
+``scheduler_leases`` fires alerts. The lease is renewed on every tick and
+expires if the holder dies, so another worker takes over within
+``lease_ttl_s``.
+
+The leader keeps a min-heap of alert times, one entry per lead time of each
+upcoming hearing, filing deadline and limitation date. Dates are loaded
+through an indexed range query in windows that run ahead of the clock, so
+only the near future is ever in memory. Case writes publish ``case_dates`` on
+the invalidation bus. The leader then re-reads that case and re-queues it;
+superseded heap entries are dropped lazily by generation. Before firing, due
+entries are checked against the current case dates in one batched read.
+Alerts carry a ``source_key`` and are pushed conditionally, so a restart or a
+leader change never duplicates them. For the same reason a batch whose writes
+fail is simply requeued and fired again on the next tick.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from repository import CASE_ALERT_FIELDS, CLOSED_STATUSES, is_closed
+
+logger = logging.getLogger(__name__)
+
+# Lead times in days per case date field, longest first
+DEFAULT_LEAD_DAYS = {
+    "next_hearing_date": (7, 1),
+    "filing_deadline": (7, 2),
+    "statute_limitations": (30, 7),
+}
+
+
+def parse_lead_days(spec: Optional[str]) -> Dict[str, Tuple[float, ...]]:
+    """``"next_hearing_date=7,1;filing_deadline=3"`` over the defaults"""
+    lead_days = dict(DEFAULT_LEAD_DAYS)
+    for part in (spec or "").split(";"):
+        if not part.strip():
+            continue
+        field, _, days = part.partition("=")
+        field = field.strip()
+        if field not in CASE_ALERT_FIELDS:
+            raise ValueError(f"Unknown case date field for alerts: {field}")
+        lead_days[field] = tuple(sorted((float(d) for d in days.split(",") if d.strip()), reverse=True))
+    return lead_days
+
+
+def alert_priority(lead_days: float) -> str:
+    if lead_days <= 1:
+        return "urgent"
+    if lead_days <= 7:
+        return "high"
+    return "medium"
+
+
+class DeadlineScheduler:
+    def __init__(
+        self,
+        lead_days: Dict[str, Tuple[float, ...]],
+        lease_ttl_s: float = 30.0,
+        tick_s: float = 10.0,
+        horizon_s: float = 6 * 3600,
+        batch_size: int = 500,
+        on_alerts: Optional[Callable[[Set[str]], Awaitable]] = None,
+    ):
+        self.lead_days = {field: days for field, days in lead_days.items() if days}
+        self.max_lead = timedelta(days=max((max(days) for days in self.lead_days.values()), default=0))
+        self.lease_ttl_s = lease_ttl_s
+        self.tick_s = tick_s
+        self.horizon = timedelta(seconds=horizon_s)
+        self.batch_size = batch_size
+        self.on_alerts = on_alerts
+        self.instance_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+        self.db = None
+        self.is_leader = False
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._changed: Set[str] = set()
+        # (fire_at, seq, case_id, field, due, lead_days, generation)
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._generations: Dict[str, int] = {}
+        self._loaded_until: Optional[datetime] = None
+        self._requeued = 0
+        self.alerts_fired = 0
+        self.leader_changes = 0
+        self.errors = 0
+
+    async def start(self, db):
+        self.db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        if self.is_leader:
+            try:
+                await self.db.scheduler_leases.delete_one({"_id": "deadline_scheduler", "holder": self.instance_id})
+            except Exception as e:
+                logger.warning(f"Failed to release the deadline scheduler lease: {str(e)}")
+            self.is_leader = False
+            self._reset()
+
+    def case_changed(self, case_id: str):
+        """Bus handler: a case's dates may have changed"""
+        if self.is_leader:
+            self._changed.add(case_id)
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                if await self._hold_lease():
+                    now = datetime.utcnow()
+                    await self._requeue_changed(now)
+                    await self._load_window(now)
+                    await self._fire_due(now)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Deadline scheduler error: {str(e)}")
+            await self._sleep()
+
+    async def _sleep(self):
+        delay = self.tick_s
+        if self.is_leader and self._heap:
+            until_next = (self._heap[0][0] - datetime.utcnow()).total_seconds()
+            delay = max(0.0, min(delay, until_next))
+        self._wake.clear()
+        try:
+            await asyncio.wait_for(self._wake.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _hold_lease(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            lease = await self.db.scheduler_leases.find_one_and_update(
+                {"_id": "deadline_scheduler", "$or": [{"holder": self.instance_id}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"holder": self.instance_id, "expires_at": now + timedelta(seconds=self.lease_ttl_s)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            leader = lease is not None and lease.get("holder") == self.instance_id
+        except DuplicateKeyError:
+            leader = False  # Another worker holds a live lease
+        if leader != self.is_leader:
+            self.is_leader = leader
+            self.leader_changes += 1
+            self._reset()
+            logger.info(f"Deadline scheduler {'acquired' if leader else 'lost'} leadership ({self.instance_id})")
+        return leader
+
+    def _reset(self):
+        self._heap = []
+        self._generations = {}
+        self._changed = set()
+        self._loaded_until = None
+        self._requeued = 0
+
+    def _schedule(self, case: dict, now: datetime, field: str):
+        due = case.get(field)
+        if not isinstance(due, datetime) or due <= now or is_closed(case):
+            return
+        generation = self._generations.get(case["id"], 0)
+        passed = None
+        for lead in self.lead_days[field]:  # Longest lead first
+            fire_at = due - timedelta(days=lead)
+            if fire_at > now:
+                heapq.heappush(self._heap, (fire_at, next(self._seq), case["id"], field, due, lead, generation))
+            else:
+                passed = lead
+        if passed is not None:
+            # Only the most urgent of the leads already passed (e.g. a hearing set for tomorrow)
+            heapq.heappush(self._heap, (now, next(self._seq), case["id"], field, due, passed, generation))
+
+    async def _load_window(self, now: datetime):
+        """Queue dates falling due before now + max lead + horizon, not yet loaded"""
+        start = self._loaded_until or now
+        end = now + self.max_lead + self.horizon
+        if end - start < self.horizon / 2:
+            return  # Loaded far enough ahead
+        for field in self.lead_days:
+            cursor = self.db.cases.find(
+                {field: {"$gte": start, "$lt": end}, "status": {"$nin": list(CLOSED_STATUSES)}, "stage": {"$ne": "closed"}},
+                {"_id": 0, "id": 1, "status": 1, "stage": 1, field: 1}
+            ).batch_size(self.batch_size)
+            async for case in cursor:
+                self._schedule(case, now, field)
+        self._loaded_until = end
+
+    async def _requeue_changed(self, now: datetime):
+        if not self._changed or self._loaded_until is None:
+            return
+        changed, self._changed = list(self._changed), set()
+        for case_id in changed:
+            self._generations[case_id] = self._generations.get(case_id, 0) + 1
+        # Dates beyond the loaded window are picked up by later window loads
+        cases = await self.db.cases.find(
+            {"id": {"$in": changed}}, {"_id": 0, "id": 1, "status": 1, "stage": 1, **{field: 1 for field in self.lead_days}}
+        ).to_list(None)
+        for case in cases:
+            for field in self.lead_days:
+                if isinstance(case.get(field), datetime) and case[field] < self._loaded_until:
+                    self._schedule(case, now, field)
+        # Superseded entries are skipped when popped; rebuild once they could dominate
+        self._requeued += len(changed)
+        if self._requeued > max(1024, len(self._heap) // 4):
+            self._compact()
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if entry[6] == self._generations.get(entry[2], 0)]
+        heapq.heapify(self._heap)
+        live = {entry[2] for entry in self._heap}
+        self._generations = {case_id: gen for case_id, gen in self._generations.items() if case_id in live}
+        self._requeued = 0
+
+    async def _fire_due(self, now: datetime):
+        due_entries = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            if entry[6] == self._generations.get(entry[2], 0):
+                due_entries.append(entry)
+        for start in range(0, len(due_entries), self.batch_size):
+            try:
+                await self._fire_batch(due_entries[start:start + self.batch_size], now)
+            except Exception:
+                # Requeue everything not yet fired for the next tick; the conditional
+                # $push makes firing an entry twice harmless
+                retry_at = now + timedelta(seconds=self.tick_s)
+                for entry in due_entries[start:]:
+                    heapq.heappush(self._heap, (retry_at, next(self._seq), *entry[2:]))
+                raise
+
+    async def _fire_batch(self, entries: List[tuple], now: datetime):
+        case_ids = list({entry[2] for entry in entries})
+        cases = {
+            case["id"]: case
+            for case in await self.db.cases.find(
+                {"id": {"$in": case_ids}},
+                {"_id": 0, "id": 1, "law_firm_id": 1, "case_number": 1, "status": 1, "stage": 1, **{field: 1 for field in self.lead_days}}
+            ).to_list(None)
+        }
+        updates = []
+        firms = set()
+        for _, _, case_id, field, due, lead, _ in entries:
+            case = cases.get(case_id)
+            # Skip dates that moved, closed cases and archived ones
+            if case is None or case.get(field) != due or is_closed(case):
+                continue
+            alert_type, label = CASE_ALERT_FIELDS[field]
+            source_key = f"{field}:{due.isoformat()}:{lead:g}"
+            days_left = max(0, (due.date() - now.date()).days)
+            when = "today" if days_left == 0 else f"in {days_left} day{'s' if days_left != 1 else ''}"
+            alert = {
+                "id": str(uuid.uuid4()),
+                "type": alert_type,
+                "message": f"{label} for {case.get('case_number', 'case')} on {due:%d %b %Y} ({when})",
+                "due_date": due,
+                "priority": alert_priority(lead),
+                "is_read": False,
+                "source_key": source_key,
+            }
+            updates.append(UpdateOne(
+                {"id": case_id, "alerts.source_key": {"$ne": source_key}},
+                {"$push": {"alerts": alert}, "$set": {"last_activity": now}}
+            ))
+            firms.add(case["law_firm_id"])
+        if not updates:
+            return
+        result = await self.db.cases.bulk_write(updates, ordered=False)
+        self.alerts_fired += result.modified_count
+        if result.modified_count:
+            logger.info(f"Deadline scheduler created {result.modified_count} alerts")
+            if self.on_alerts is not None:
+                await self.on_alerts(firms)
+
+    def snapshot(self) -> dict:
+        return {
+            "instance_id": self.instance_id,
+            "leader": self.is_leader,
+            "queued": len(self._heap),
+            "next_alert_at": self._heap[0][0] if self._heap else None,
+            "loaded_until": self._loaded_until,
+            "alerts_fired": self.alerts_fired,
+            "leader_changes": self.leader_changes,
+            "errors": self.errors,
+        }
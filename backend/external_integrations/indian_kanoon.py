@@ -0,0 +1,245 @@
+"""Indian Kanoon API client with retries and a circuit breaker.
+
+Besides single-page search, ``stream`` fetches several result pages
+concurrently (bounded), de-duplicates hits by ``tid`` and can fetch the full
+judgment text and matching fragments for the top hits in parallel. Pages are
+yielded in page order, each as soon as it and the pages before it are in, and
+judgments as they arrive. Wider recall therefore costs roughly the latency of
+the slowest page rather than the sum of all of them, while the results stay
+the same whatever order the pages arrive in.
+
+``timeout_cap`` can shorten each call's timeout to the caller's remaining
+budget; a call cut short that way raises DeadlineExceeded, which is neither
+retried nor held against the breaker.
+"""
+import asyncio
+import functools
+import html
+import logging
+import re
+from typing import AsyncIterator, Callable, List, Optional
+
+import aiohttp
+
+from .resilience import RETRYABLE_STATUSES, CircuitBreaker, DeadlineExceeded, TransientUpstreamError, retrying
+
+logger = logging.getLogger(__name__)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+class KanoonServiceError(Exception):
+    """Indian Kanoon could not answer, after retries"""
+
+
+class KanoonNotFound(KanoonServiceError):
+    """Indian Kanoon has no document with the requested tid"""
+
+
+def html_to_text(markup: str) -> str:
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", markup or ""))).strip()
+
+
+def format_search_result(doc: dict) -> dict:
+    return {
+        'tid': doc.get('tid'),
+        'title': doc.get('title', 'Unknown Case'),
+        'court': doc.get('court', 'Unknown Court'),
+        'date': doc.get('date', 'Unknown Date'),
+        'citation': doc.get('citation', ''),
+        'summary': doc.get('summary', ''),
+        'url': f"https://indiankanoon.org/doc/{doc.get('tid', '')}"
+    }
+
+
+class IndianKanoonClient:
+    """Thin async client for the Indian Kanoon search and document APIs"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str,
+        timeout_s: float = 15.0,
+        retry_attempts: int = 3,
+        breaker: Optional[CircuitBreaker] = None,
+        page_concurrency: int = 3,
+        judgment_concurrency: int = 4,
+        timeout_cap: Optional[Callable[[float], float]] = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.timeout_s = timeout_s
+        self.retry_attempts = retry_attempts
+        self.breaker = breaker or CircuitBreaker("indian_kanoon")
+        self.page_concurrency = page_concurrency
+        self.judgment_concurrency = judgment_concurrency
+        self.timeout_cap = timeout_cap
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout_s))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def warm_up(self, timeout_s: float = 2.0):
+        """Open a pooled connection (DNS + TLS) ahead of the first real request"""
+        try:
+            async with self.session.head(self.base_url, timeout=aiohttp.ClientTimeout(total=timeout_s)):
+                pass
+        except Exception as e:
+            logger.info(f"Indian Kanoon warm-up skipped: {str(e) or type(e).__name__}")
+
+    async def _get_once(self, path: str, params: dict) -> dict:
+        timeout_s = self.timeout_cap(self.timeout_s) if self.timeout_cap else self.timeout_s
+        try:
+            async with self.session.get(
+                f"{self.base_url}{path}", params={**params, 'API_KEY': self.api_key},
+                timeout=aiohttp.ClientTimeout(total=timeout_s)
+            ) as response:
+                if response.status == 200:
+                    return await response.json(content_type=None)
+                if response.status == 404:
+                    raise KanoonNotFound(f"Indian Kanoon has no document at {path}")
+                logger.error(f"Indian Kanoon API error: {response.status} ({path})")
+                if response.status in RETRYABLE_STATUSES:
+                    raise TransientUpstreamError(f"Indian Kanoon returned status {response.status}")
+                raise KanoonServiceError(f"Indian Kanoon returned status {response.status}")
+        except asyncio.TimeoutError:
+            if timeout_s < self.timeout_s:
+                raise DeadlineExceeded(f"Indian Kanoon did not answer within the request deadline ({path})")
+            raise
+
+    async def _get(self, path: str, params: dict) -> dict:
+        """GET with jittered retries under the circuit breaker"""
+        async with self.breaker.guard(ignore=(KanoonNotFound,)):
+            try:
+                async for attempt in retrying(self.retry_attempts):
+                    with attempt:
+                        return await self._get_once(path, params)
+            except (TransientUpstreamError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise KanoonServiceError(f"Indian Kanoon request failed: {str(e) or type(e).__name__}")
+
+    async def search_page(self, query: str, pagenum: int = 0) -> List[dict]:
+        """Raw ``docs`` of one search result page"""
+        data = await self._get("/search/", {'formInput': query, 'pagenum': pagenum})
+        return data.get('docs', [])
+
+    async def fetch_judgment(self, tid: int, query: Optional[str] = None) -> dict:
+        """Full judgment text, plus the fragments matching ``query`` when given"""
+        requests = [asyncio.ensure_future(self._get(f"/doc/{tid}/", {}))]
+        if query:
+            requests.append(asyncio.ensure_future(self._get(f"/docfragment/{tid}/", {'formInput': query})))
+        try:
+            responses = await asyncio.gather(*requests)
+        except BaseException:
+            # Don't leave the other request running when one fails
+            for request in requests:
+                request.cancel()
+            raise
+        doc = responses[0]
+        if doc.get('errmsg') and not doc.get('doc'):
+            raise KanoonNotFound(doc['errmsg'])
+        fragments = responses[1].get('headline', []) if query else []
+        return {
+            'tid': tid,
+            'title': doc.get('title', 'Unknown Case'),
+            'court': doc.get('docsource', doc.get('court', 'Unknown Court')),
+            'citation': doc.get('citation', ''),
+            'date': doc.get('publishdate', doc.get('date', '')),
+            'text': html_to_text(doc.get('doc', '')),
+            'fragments': [html_to_text(fragment) for fragment in fragments],
+        }
+
+    async def stream(self, query: str, pages: int = 1, judgments: int = 0) -> AsyncIterator[dict]:
+        """Yield page and judgment events as they complete.
+
+        Events are ``{"type": "page", "page": n, "results": [...]}``, in page
+        order, with hits de-duplicated by tid toward the lowest page, and
+        ``{"type": "judgment", ...}`` for the first ``judgments`` hits of the
+        first page with results. A page that arrives early is held until the
+        pages before it are in. Raises the last error if no page could be
+        fetched at all.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        page_limit = asyncio.Semaphore(self.page_concurrency)
+        judgment_limit = asyncio.Semaphore(self.judgment_concurrency)
+        tasks = set()
+
+        async def run(kind: str, key, limit: asyncio.Semaphore, fetch):
+            async with limit:
+                try:
+                    await queue.put((kind, key, await fetch(), None))
+                except Exception as e:
+                    # Always report back, or the consumer would wait forever
+                    await queue.put((kind, key, None, e))
+
+        def spawn(kind: str, key, limit: asyncio.Semaphore, fetch):
+            tasks.add(asyncio.create_task(run(kind, key, limit, fetch)))
+
+        for pagenum in range(pages):
+            spawn("page", pagenum, page_limit, functools.partial(self.search_page, query, pagenum))
+
+        outstanding = pages
+        arrived = {}  # pagenum -> docs (None if the page failed), until its turn comes
+        next_page = 0
+        seen = set()
+        page_errors = []
+        judgments_started = judgments <= 0
+        try:
+            while outstanding:
+                kind, key, payload, error = await queue.get()
+                outstanding -= 1
+
+                if kind == "judgment":
+                    yield {"type": "judgment", "tid": key, "error": str(error)} if error else {"type": "judgment", **payload}
+                    continue
+
+                if error:
+                    page_errors.append(error)
+                arrived[key] = None if error else payload
+
+                while next_page in arrived:
+                    docs = arrived.pop(next_page)
+                    pagenum, next_page = next_page, next_page + 1
+                    if docs is None:
+                        continue
+                    results = []
+                    for doc in docs:
+                        tid = doc.get('tid')
+                        if tid is not None:
+                            if tid in seen:
+                                continue
+                            seen.add(tid)
+                        results.append(format_search_result(doc))
+                    yield {"type": "page", "page": pagenum, "results": results}
+
+                    if not judgments_started and results:
+                        judgments_started = True
+                        for result in [r for r in results if r['tid'] is not None][:judgments]:
+                            spawn("judgment", result['tid'], judgment_limit, functools.partial(self.fetch_judgment, result['tid'], query))
+                            outstanding += 1
+
+            if page_errors and len(page_errors) == pages:
+                raise page_errors[-1]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def search(self, query: str, max_results: int = 10, pages: int = 1) -> List[dict]:
+        """Search Indian Kanoon; raises KanoonServiceError or CircuitOpenError on failure"""
+        if pages <= 1:
+            return [format_search_result(doc) for doc in (await self.search_page(query))[:max_results]]
+
+        results = []
+        async for event in self.stream(query, pages=pages):
+            results.extend(event["results"])
+        return results[:max_results]
+
+    def snapshot(self) -> dict:
+        return self.breaker.snapshot()
@@ -0,0 +1,272 @@
+"""Local judgment corpus in front of the Indian Kanoon API.
+
+``CachedIndianKanoonClient`` consults two tiers before going remote: a bounded
+in-process LRU for hot authorities and a persistent Mongo store. Documents are
+keyed by Kanoon ``tid`` and hold metadata, citation, zlib-compressed full text
+and the fetch timestamp. Search pages are cached by normalised query and page.
+
+Entries are served while fresh. Stale documents are re-fetched, and the stale
+copy is served if Kanoon is unavailable or too slow for the request's deadline. Missing documents are cached
+negatively. Fragments for cached judgments are extracted locally, so a warm
+corpus needs no Kanoon calls at all.
+"""
+import hashlib
+import logging
+import re
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Callable, List, Optional
+
+from bson.binary import Binary
+from pymongo import UpdateOne
+
+from .indian_kanoon import IndianKanoonClient, KanoonNotFound, KanoonServiceError
+from .resilience import CircuitOpenError, DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w{3,}")
+
+
+def search_key(query: str, pagenum: int) -> str:
+    normalised = " ".join(query.lower().split())
+    return hashlib.sha1(f"{pagenum}:{normalised}".encode()).hexdigest()
+
+
+def local_fragments(text: str, query: str, limit: int = 3, width: int = 240) -> List[str]:
+    """Snippets of ``text`` around the first occurrences of the query terms"""
+    if not text or not query:
+        return []
+    terms = {word.lower() for word in _WORD_RE.findall(query)}
+    if not terms:
+        return []
+    pattern = re.compile(r"\b(" + "|".join(re.escape(term) for term in sorted(terms)) + r")\b", re.IGNORECASE)
+    fragments = []
+    last_end = -1
+    for match in pattern.finditer(text):
+        if match.start() < last_end:
+            continue
+        start = max(0, match.start() - width // 2)
+        end = min(len(text), match.end() + width // 2)
+        fragments.append(("..." if start else "") + text[start:end].strip() + ("..." if end < len(text) else ""))
+        last_end = end
+        if len(fragments) >= limit:
+            break
+    return fragments
+
+
+class _LRU:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.items: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        value = self.items.get(key)
+        if value is not None:
+            self.items.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.items[key] = value
+        self.items.move_to_end(key)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+
+class CachedIndianKanoonClient(IndianKanoonClient):
+    """IndianKanoonClient that reads through a local judgment corpus"""
+
+    def __init__(
+        self,
+        *args,
+        document_ttl_s: float = 30 * 86400,
+        search_ttl_s: float = 86400,
+        negative_ttl_s: float = 86400,
+        memory_size: int = 256,
+        citation_keys: Optional[Callable[[str], List[str]]] = None,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.document_ttl = timedelta(seconds=document_ttl_s)
+        self.search_ttl = timedelta(seconds=search_ttl_s)
+        self.negative_ttl = timedelta(seconds=negative_ttl_s)
+        self.memory = _LRU(memory_size)
+        # Normalises a Kanoon citation field into lookup keys (see citations.py)
+        self.citation_keys = citation_keys
+        self.documents = None
+        self.searches = None
+        self.stats = {
+            "memory_hits": 0,
+            "store_hits": 0,
+            "negative_hits": 0,
+            "stale_served": 0,
+            "remote_fetches": 0,
+        }
+
+    def attach_store(self, documents, searches):
+        """Attach the Motor collections backing the persistent tier"""
+        self.documents = documents
+        self.searches = searches
+
+    # Search pages
+
+    async def search_page(self, query: str, pagenum: int = 0) -> List[dict]:
+        key = search_key(query, pagenum)
+        now = datetime.utcnow()
+
+        cached = self.memory.get(("search", key))
+        if cached is not None and cached["expire_at"] > now:
+            self.stats["memory_hits"] += 1
+            return cached["docs"]
+
+        if self.searches is not None:
+            stored = await self.searches.find_one({"key": key}, {"_id": 0, "docs": 1, "expire_at": 1})
+            if stored and stored["expire_at"] > now:
+                self.stats["store_hits"] += 1
+                self.memory.put(("search", key), stored)
+                return stored["docs"]
+
+        self.stats["remote_fetches"] += 1
+        docs = await super().search_page(query, pagenum)
+        entry = {"docs": docs, "expire_at": now + self.search_ttl}
+        self.memory.put(("search", key), entry)
+        await self._store_search(key, query, pagenum, docs, now)
+        return docs
+
+    async def _store_search(self, key: str, query: str, pagenum: int, docs: List[dict], now: datetime):
+        if self.searches is None:
+            return
+        try:
+            await self.searches.update_one(
+                {"key": key},
+                {"$set": {"query": query, "pagenum": pagenum, "docs": docs, "fetched_at": now, "expire_at": now + self.search_ttl}},
+                upsert=True
+            )
+            # Search hits seed corpus metadata; full text arrives with the first document fetch
+            updates = [
+                UpdateOne(
+                    {"tid": doc["tid"]},
+                    {
+                        "$set": {
+                            "title": doc.get("title"),
+                            "court": doc.get("docsource", doc.get("court")),
+                            "citation": doc.get("citation", ""),
+                            "date": doc.get("publishdate", doc.get("date", "")),
+                            "citation_keys": self._citation_keys(doc.get("citation", "")),
+                        },
+                        "$setOnInsert": {"tid": doc["tid"], "has_text": False, "metadata_fetched_at": now},
+                    },
+                    upsert=True
+                )
+                for doc in docs if doc.get("tid") is not None
+            ]
+            if updates and self.documents is not None:
+                await self.documents.bulk_write(updates, ordered=False)
+        except Exception as e:
+            logger.error(f"Failed to cache Kanoon search page: {str(e)}")
+
+    def _citation_keys(self, citation: str) -> List[str]:
+        return self.citation_keys(citation) if self.citation_keys and citation else []
+
+    # Judgments
+
+    async def _load_document(self, tid: int) -> Optional[dict]:
+        cached = self.memory.get(("doc", tid))
+        if cached is not None:
+            self.stats["memory_hits"] += 1
+            return cached
+        if self.documents is None:
+            return None
+        stored = await self.documents.find_one({"tid": tid}, {"_id": 0})
+        if stored is None:
+            return None
+        if stored.get("text_z") is not None:
+            stored["text"] = zlib.decompress(stored.pop("text_z")).decode("utf-8")
+        if stored.get("has_text") or stored.get("missing"):
+            # Metadata-only records (seeded from search hits) still need a remote fetch
+            self.stats["store_hits"] += 1
+            self.memory.put(("doc", tid), stored)
+        return stored
+
+    def _judgment_from_record(self, record: dict, query: Optional[str]) -> dict:
+        return {
+            "tid": record["tid"],
+            "title": record.get("title", "Unknown Case"),
+            "court": record.get("court", "Unknown Court"),
+            "citation": record.get("citation", ""),
+            "date": record.get("date", ""),
+            "text": record.get("text", ""),
+            "fragments": local_fragments(record.get("text", ""), query) if query else [],
+        }
+
+    async def _store_document(self, record: dict):
+        self.memory.put(("doc", record["tid"]), record)
+        if self.documents is None:
+            return
+        stored = {key: value for key, value in record.items() if key != "text"}
+        if record.get("text"):
+            stored["text_z"] = Binary(zlib.compress(record["text"].encode("utf-8"), 6))
+        unset = {"expire_at": ""} if not record.get("missing") else {}
+        try:
+            update = {"$set": stored}
+            if unset:
+                update["$unset"] = unset
+            await self.documents.update_one({"tid": record["tid"]}, update, upsert=True)
+        except Exception as e:
+            logger.error(f"Failed to cache Kanoon document {record['tid']}: {str(e)}")
+
+    async def fetch_judgment(self, tid: int, query: Optional[str] = None) -> dict:
+        now = datetime.utcnow()
+        record = await self._load_document(tid)
+
+        if record is not None and record.get("missing"):
+            if record["revalidate_at"] > now:
+                self.stats["negative_hits"] += 1
+                raise KanoonNotFound(f"Indian Kanoon has no document {tid} (cached)")
+        elif record is not None and record.get("has_text") and record["revalidate_at"] > now:
+            return self._judgment_from_record(record, query)
+
+        self.stats["remote_fetches"] += 1
+        try:
+            judgment = await super().fetch_judgment(tid)
+        except KanoonNotFound:
+            await self._store_document({
+                "tid": tid,
+                "missing": True,
+                "has_text": False,
+                "fetched_at": now,
+                "revalidate_at": now + self.negative_ttl,
+                "expire_at": now + self.negative_ttl,
+            })
+            raise
+        except (KanoonServiceError, CircuitOpenError, DeadlineExceeded):
+            if record is not None and record.get("has_text"):
+                self.stats["stale_served"] += 1
+                return self._judgment_from_record(record, query)
+            raise
+
+        fresh = {
+            "tid": tid,
+            "title": judgment["title"],
+            "court": judgment["court"],
+            "citation": judgment["citation"],
+            "date": judgment["date"],
+            "citation_keys": self._citation_keys(judgment["citation"]),
+            "text": judgment["text"],
+            "has_text": True,
+            "missing": False,
+            "fetched_at": now,
+            "revalidate_at": now + self.document_ttl,
+        }
+        await self._store_document(fresh)
+        return self._judgment_from_record(fresh, query)
+
+    def cache_stats(self) -> dict:
+        lookups = self.stats["memory_hits"] + self.stats["store_hits"] + self.stats["remote_fetches"]
+        local = self.stats["memory_hits"] + self.stats["store_hits"]
+        return {
+            **self.stats,
+            "memory_entries": len(self.memory.items),
+            "local_hit_rate": round(local / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,292 @@
+"""OpenRouter chat client with ordered model fallback and hedged requests.
+
+``ModelRouter.complete`` sends the request to the first healthy model in the
+fallback list. If no answer has arrived once the model's recent latency
+percentile has elapsed, a hedged request goes to the next model and whichever
+answers first wins; the loser is cancelled. Failures fall through to the next
+model immediately. Per-model latency and error rate are tracked over a sliding
+window and unhealthy models are pushed to the back of the list.
+
+Completions are paid and not idempotent, so a model is only retried with
+jittered backoff when OpenRouter did no work: the connection failed or it
+answered 429/5xx. Read timeouts are not retried. The provider as a whole sits
+behind a circuit breaker so callers fail fast while OpenRouter is down; requests
+it rejects as invalid (other 4xx) do not count against it. ``timeout_cap`` can shorten each
+call's timeout to the caller's remaining budget. A call cut short that way
+raises DeadlineExceeded and counts against neither the model nor the breaker.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import aiohttp
+
+from .resilience import RETRYABLE_STATUSES, CircuitBreaker, DeadlineExceeded, TransientUpstreamError, retrying
+
+logger = logging.getLogger(__name__)
+
+
+class AIServiceError(Exception):
+    """Raised when no model in the fallback list produced a response"""
+
+
+class AIRequestError(AIServiceError):
+    """OpenRouter rejected the request itself (4xx other than 429); not an outage"""
+
+
+class ModelHealth:
+    """Sliding window of recent call outcomes for one model"""
+
+    def __init__(self, model: str, window_size: int = 100, window_seconds: float = 300.0):
+        self.model = model
+        self.window_seconds = window_seconds
+        self.samples = deque(maxlen=window_size)  # (monotonic timestamp, latency_ms, ok)
+
+    def record(self, latency_ms: float, ok: bool):
+        self.samples.append((time.monotonic(), latency_ms, ok))
+
+    def _recent(self) -> list:
+        cutoff = time.monotonic() - self.window_seconds
+        while self.samples and self.samples[0][0] < cutoff:
+            self.samples.popleft()
+        return list(self.samples)
+
+    def latency_percentile(self, pct: float, min_samples: int = 1) -> Optional[float]:
+        latencies = sorted(latency for _, latency, ok in self._recent() if ok)
+        if len(latencies) < min_samples:
+            return None
+        index = min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))
+        return latencies[index]
+
+    def error_rate(self) -> float:
+        recent = self._recent()
+        if not recent:
+            return 0.0
+        return sum(1 for _, _, ok in recent if not ok) / len(recent)
+
+    def is_healthy(self, min_samples: int, max_error_rate: float) -> bool:
+        recent = self._recent()
+        if len(recent) < min_samples:
+            return True
+        return self.error_rate() < max_error_rate
+
+    def snapshot(self) -> dict:
+        recent = self._recent()
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            "samples": len(recent),
+            "error_rate": round(self.error_rate(), 3),
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+        }
+
+
+class ModelRouter:
+    """Routes chat completions across an ordered list of OpenRouter models"""
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        base_url: str,
+        models: List[str],
+        headers: Optional[Dict[str, str]] = None,
+        timeout_s: float = 60.0,
+        hedge_percentile: float = 90.0,
+        hedge_min_delay_ms: float = 1000.0,
+        hedge_default_delay_ms: float = 10000.0,
+        max_in_flight: int = 2,
+        window_size: int = 100,
+        window_seconds: float = 300.0,
+        min_samples: int = 5,
+        max_error_rate: float = 0.5,
+        retry_attempts: int = 2,
+        breaker: Optional[CircuitBreaker] = None,
+        timeout_cap: Optional[Callable[[float], float]] = None,
+    ):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.models = list(models)
+        self.headers = headers or {}
+        self.timeout_s = timeout_s
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay_ms = hedge_min_delay_ms
+        self.hedge_default_delay_ms = hedge_default_delay_ms
+        self.max_in_flight = max_in_flight
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.retry_attempts = retry_attempts
+        self.breaker = breaker or CircuitBreaker("openrouter")
+        self.timeout_cap = timeout_cap
+        self.health = {model: ModelHealth(model, window_size, window_seconds) for model in self.models}
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout_s))
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def warm_up(self, timeout_s: float = 2.0):
+        """Open a pooled connection (DNS + TLS) ahead of the first real request"""
+        try:
+            async with self.session.head(self.base_url, timeout=aiohttp.ClientTimeout(total=timeout_s)):
+                pass
+        except Exception as e:
+            logger.info(f"OpenRouter warm-up skipped: {str(e) or type(e).__name__}")
+
+    def candidates(self) -> List[str]:
+        """Healthy models in configured order, followed by unhealthy ones as a last resort"""
+        healthy = [m for m in self.models if self.health[m].is_healthy(self.min_samples, self.max_error_rate)]
+        return healthy + [m for m in self.models if m not in healthy]
+
+    def hedge_delay(self, model: str) -> float:
+        """Seconds to wait on ``model`` before sending a hedged request"""
+        observed = self.health[model].latency_percentile(self.hedge_percentile, self.min_samples)
+        delay_ms = observed if observed is not None else self.hedge_default_delay_ms
+        return max(delay_ms, self.hedge_min_delay_ms) / 1000
+
+    async def _post_once(self, model: str, messages: List[dict], max_tokens: int, temperature: float) -> dict:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            **self.headers,
+        }
+        payload = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": temperature,
+        }
+
+        timeout_s = self.timeout_cap(self.timeout_s) if self.timeout_cap else self.timeout_s
+        start = time.perf_counter()
+        try:
+            async with self.session.post(
+                f"{self.base_url}/chat/completions", headers=headers, json=payload,
+                timeout=aiohttp.ClientTimeout(total=timeout_s)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    logger.error(f"OpenRouter API error ({model}): {response.status} - {error_text}")
+                    message = f"OpenRouter API returned status {response.status} for {model}"
+                    if response.status in RETRYABLE_STATUSES:
+                        raise TransientUpstreamError(message)
+                    if 400 <= response.status < 500:
+                        raise AIRequestError(message)
+                    raise AIServiceError(message)
+                data = await response.json()
+                content = data["choices"][0]["message"]["content"]
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            if timeout_s < self.timeout_s:
+                raise DeadlineExceeded(f"{model} did not answer within the request deadline")
+            self.health[model].record((time.perf_counter() - start) * 1000, ok=False)
+            raise
+        except AIRequestError:
+            raise  # The request was at fault, not the model
+        except Exception:
+            self.health[model].record((time.perf_counter() - start) * 1000, ok=False)
+            raise
+
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.health[model].record(latency_ms, ok=True)
+        return {
+            "content": content,
+            "model": data.get("model", model),
+            "usage": data.get("usage") or {},
+            "latency_ms": latency_ms,
+        }
+
+    async def _call_model(self, model: str, messages: List[dict], max_tokens: int, temperature: float) -> dict:
+        try:
+            async for attempt in retrying(self.retry_attempts, idempotent=False):
+                with attempt:
+                    return await self._post_once(model, messages, max_tokens, temperature)
+        except asyncio.TimeoutError:
+            raise AIServiceError(f"{model} timed out after {self.timeout_s:.0f}s")
+        except (TransientUpstreamError, aiohttp.ClientError) as e:
+            raise AIServiceError(str(e) or type(e).__name__)
+
+    async def complete(self, messages: List[dict], max_tokens: int = 2000, temperature: float = 0.7) -> dict:
+        """Return the first successful completion as ``{content, model, usage, latency_ms}``.
+
+        Raises AIServiceError when every model failed, or CircuitOpenError
+        without calling OpenRouter while the provider's breaker is open.
+        """
+        if not self.api_key:
+            raise AIServiceError("OpenRouter API key not configured")
+
+        async with self.breaker.guard(ignore=(AIRequestError,)):
+            return await self._complete(messages, max_tokens, temperature)
+
+    async def _complete(self, messages: List[dict], max_tokens: int, temperature: float) -> dict:
+        loop = asyncio.get_running_loop()
+        candidates = self.candidates()
+        pending: Dict[asyncio.Task, str] = {}
+        errors: List[Tuple[str, Exception]] = []
+        next_index = 0
+        hedge_at = 0.0
+
+        def launch():
+            nonlocal next_index, hedge_at
+            model = candidates[next_index]
+            next_index += 1
+            task = asyncio.create_task(self._call_model(model, messages, max_tokens, temperature))
+            pending[task] = model
+            hedge_at = loop.time() + self.hedge_delay(model)
+
+        launch()
+        try:
+            while pending:
+                can_hedge = next_index < len(candidates) and len(pending) < self.max_in_flight
+                timeout = max(0.0, hedge_at - loop.time()) if can_hedge else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    logger.info(f"Hedging slow request to {list(pending.values())} with {candidates[next_index]}")
+                    launch()
+                    continue
+
+                result = None
+                for task in done:
+                    model = pending.pop(task)
+                    error = task.exception()
+                    if isinstance(error, DeadlineExceeded):
+                        raise error  # No time left for the other models either
+                    if error is not None:
+                        errors.append((model, error))
+                    elif result is None:
+                        result = task.result()
+                if result is not None:
+                    return result
+
+                # Fall back to the next model straight away instead of waiting for the hedge delay
+                if not pending and next_index < len(candidates):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        message = "; ".join(f"{model}: {str(error)}" for model, error in errors)
+        if all(isinstance(error, AIRequestError) for _, error in errors):
+            raise AIRequestError(message)
+        raise AIServiceError(message)
+
+    def snapshot(self) -> dict:
+        return {
+            model: {
+                "healthy": self.health[model].is_healthy(self.min_samples, self.max_error_rate),
+                **self.health[model].snapshot(),
+            }
+            for model in self.models
+        }
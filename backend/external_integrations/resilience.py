@@ -0,0 +1,150 @@
+"""Retry, deadline and circuit-breaker helpers shared by the upstream integrations."""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import aiohttp
+from tenacity import AsyncRetrying, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying: rate limiting and transient server-side failures
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TransientUpstreamError(Exception):
+    """A failure that is safe and worthwhile to retry"""
+
+
+class DeadlineExceeded(Exception):
+    """The caller's time budget ran out; says nothing about the upstream's health"""
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the upstream while its breaker is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} is temporarily unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+# Failures after which the upstream did no work: the connection was never made,
+# or it answered with a retryable status
+UNSENT_ERRORS = (TransientUpstreamError, aiohttp.ClientConnectorError)
+# Idempotent calls may also be repeated after a dropped connection or a read timeout
+IDEMPOTENT_RETRY_ERRORS = (TransientUpstreamError, aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+def retrying(attempts: int = 3, base_delay_s: float = 0.2, max_delay_s: float = 2.0, idempotent: bool = True) -> AsyncRetrying:
+    """Jittered exponential backoff for upstream calls.
+
+    Calls that are not idempotent (paid completions) are only retried when the
+    upstream never did the work; a read timeout may still have been billed.
+    """
+    return AsyncRetrying(
+        stop=stop_after_attempt(attempts),
+        wait=wait_random_exponential(multiplier=base_delay_s, max=max_delay_s),
+        retry=retry_if_exception_type(IDEMPOTENT_RETRY_ERRORS if idempotent else UNSENT_ERRORS),
+        reraise=True,
+    )
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed: calls pass through. After ``failure_threshold`` consecutive
+    failures it opens and rejects calls for ``reset_timeout_s``. It then lets
+    a single trial call through (half-open); success closes it again, failure
+    re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.total_failures = 0
+        self.total_rejected = 0
+        self.times_opened = 0
+
+    def retry_after(self) -> float:
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout_s - time.monotonic())
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call should not reach the upstream"""
+        if self.state == self.OPEN:
+            if self.retry_after() > 0:
+                self.total_rejected += 1
+                raise CircuitOpenError(self.name, self.retry_after())
+            self.state = self.HALF_OPEN
+            self.trial_in_flight = False
+
+        if self.state == self.HALF_OPEN:
+            if self.trial_in_flight:
+                self.total_rejected += 1
+                raise CircuitOpenError(self.name, 1.0)
+            self.trial_in_flight = True
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            logger.info(f"Circuit breaker {self.name} closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        self.trial_in_flight = False
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Circuit breaker {self.name} opened after {self.consecutive_failures} consecutive failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    @asynccontextmanager
+    async def guard(self, ignore: tuple = ()):
+        """Run the enclosed upstream call under the breaker.
+
+        Exceptions in ``ignore`` are answers from a healthy upstream (e.g. not
+        found) and count as successes.
+        """
+        self.before_call()
+        try:
+            yield
+        except (asyncio.CancelledError, DeadlineExceeded):
+            # Cancelled or cut-short calls say nothing about upstream health
+            self.trial_in_flight = False
+            raise
+        except ignore:
+            self.record_success()
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+        else:
+            self.record_success()
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after_s": round(self.retry_after(), 1) if self.state == self.OPEN else None,
+            "times_opened": self.times_opened,
+            "total_failures": self.total_failures,
+            "total_rejected": self.total_rejected,
+        }
@@ -0,0 +1,26 @@
+"""Gunicorn settings for the production serving mode.
+
+Each worker is a separate uvicorn event loop with its own Mongo pool, HTTP
+sessions and LLM scheduler, so LLM_MAX_CONCURRENCY and friends apply per worker.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8001")
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", "0")) or multiprocessing.cpu_count()
+
+# Keep idle connections from nginx's upstream pool open longer than nginx does
+keepalive = int(os.environ.get("KEEPALIVE_S", "75"))
+
+# LLM calls can legitimately take a while; don't kill workers mid-request
+timeout = int(os.environ.get("WORKER_TIMEOUT_S", "120"))
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT_S", "30"))
+
+# Recycle workers periodically to bound memory growth
+max_requests = int(os.environ.get("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", "1000"))
+
+accesslog = None
+errorlog = "-"
+loglevel = os.environ.get("LOG_LEVEL", "info")
@@ -0,0 +1,271 @@
+"""Idempotency-Key support for expensive POST endpoints.
+
+A client sends ``Idempotency-Key`` with a POST to one of the configured paths.
+The first request with a key claims it. It inserts an in-progress record into
+``idempotency_keys`` (unique on path + key), runs normally, and then stores its
+response on the record. Duplicates replay that response with
+``Idempotent-Replayed: true`` instead of executing again, so retries and
+double-clicks create no second record and pay for no second LLM call. A
+duplicate that arrives while the original is still running waits for it. In
+the same worker it is woken by an event; across workers it polls the record.
+
+Only final outcomes are stored: 2xx responses and client errors other than
+408, 409 and 429. Server errors, rejections and crashes release the key, so a
+retry runs afresh. A claim left by a dead worker lapses after ``lock_ttl_s``
+and is taken over. Reusing a key with a different body is rejected with 422.
+Records expire through a TTL index on ``expire_at``.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+from starlette.datastructures import Headers
+
+logger = logging.getLogger(__name__)
+
+# Client errors that are not stored: a retry may well get a different answer
+# (timeout, conflict, rate limit), so these release the key instead
+RETRYABLE_CLIENT_ERRORS = (408, 409, 429)
+MAX_KEY_LENGTH = 255
+# Responses larger than this are not stored (Mongo documents are capped at 16 MB)
+MAX_STORED_BODY_BYTES = 8 * 1024 * 1024
+
+
+def _storable(status_code: int) -> bool:
+    return 200 <= status_code < 300 or (400 <= status_code < 500 and status_code not in RETRYABLE_CLIENT_ERRORS)
+
+
+def request_fingerprint(body: bytes, content_type: str) -> str:
+    """SHA-256 of the body; multipart boundaries are random per attempt, so they are left out"""
+    if content_type.startswith("multipart/"):
+        boundary = content_type.partition("boundary=")[2].split(";", 1)[0].strip().strip('"')
+        if boundary:
+            body = body.replace(boundary.encode("latin-1"), b"")
+    return hashlib.sha256(body).hexdigest()
+
+
+class IdempotencyStore:
+    def __init__(self, ttl_s: float = 24 * 3600, lock_ttl_s: float = 300, wait_timeout_s: float = 300, poll_s: float = 0.25):
+        self.ttl_s = ttl_s
+        self.lock_ttl_s = lock_ttl_s
+        self.wait_timeout_s = wait_timeout_s
+        self.poll_s = poll_s
+        self.collection = None
+        self._done: Dict[str, asyncio.Event] = {}  # Keys claimed in this worker
+        self.executed = 0
+        self.replayed = 0
+        self.waited = 0
+        self.rejected = 0
+        self.errors = 0
+
+    def attach(self, collection):
+        self.collection = collection
+
+    async def acquire(self, key: str, fingerprint: str) -> Tuple[str, Any]:
+        """``("execute", owner)`` when this request owns ``key``; else ``("replay" | "mismatch" | "busy", record)``"""
+        deadline = time.monotonic() + self.wait_timeout_s
+        waited = False
+        while True:
+            now = datetime.utcnow()
+            owner = uuid.uuid4().hex
+            claim = {
+                "status": "in_progress",
+                "fingerprint": fingerprint,
+                "owner": owner,
+                "locked_until": now + timedelta(seconds=self.lock_ttl_s),
+                "expire_at": now + timedelta(seconds=self.lock_ttl_s + self.ttl_s),
+                "created_at": now,
+            }
+            try:
+                await self.collection.insert_one({"key": key, **claim})
+                return self._claimed(key, owner)
+            except DuplicateKeyError:
+                pass
+
+            record = await self.collection.find_one({"key": key}, {"_id": 0})
+            if record is None:
+                continue  # Released or expired in between; claim it again
+            if record["fingerprint"] != fingerprint:
+                self.rejected += 1
+                return "mismatch", record
+            if record["status"] == "completed":
+                self.replayed += 1
+                self.waited += waited
+                return "replay", record
+            if record["locked_until"] < now:
+                # The original's worker died; take over its claim
+                result = await self.collection.update_one(
+                    {"key": key, "owner": record["owner"], "status": "in_progress"}, {"$set": claim}
+                )
+                if result.modified_count:
+                    logger.warning(f"Took over abandoned idempotency key {key}")
+                    return self._claimed(key, owner)
+                continue
+            if time.monotonic() >= deadline:
+                return "busy", record
+
+            waited = True
+            event = self._done.get(key)
+            try:
+                if event is not None:
+                    await asyncio.wait_for(event.wait(), timeout=min(max(self.poll_s, 5.0), deadline - time.monotonic()))
+                else:
+                    await asyncio.sleep(self.poll_s)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claimed(self, key: str, owner: str) -> Tuple[str, str]:
+        self.executed += 1
+        self._done[key] = asyncio.Event()
+        return "execute", owner
+
+    async def complete(self, key: str, owner: str, status_code: int, headers: list, body: bytes):
+        """Store the response for replay, or release the key when it should not be replayed"""
+        try:
+            if _storable(status_code) and len(body) <= MAX_STORED_BODY_BYTES:
+                await self.collection.update_one({"key": key, "owner": owner}, {
+                    "$set": {
+                        "status": "completed",
+                        "status_code": status_code,
+                        "headers": headers,
+                        "body": body,
+                        "expire_at": datetime.utcnow() + timedelta(seconds=self.ttl_s),
+                    },
+                    "$unset": {"locked_until": ""},
+                })
+            else:
+                await self.collection.delete_one({"key": key, "owner": owner})
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Failed to record idempotent response for {key}: {str(e)}")
+        finally:
+            event = self._done.pop(key, None)
+            if event is not None:
+                event.set()
+
+    async def release(self, key: str, owner: str):
+        await self.complete(key, owner, 500, [], b"")
+
+    def snapshot(self) -> dict:
+        return {
+            "in_flight": len(self._done),
+            "executed": self.executed,
+            "replayed": self.replayed,
+            "waited": self.waited,
+            "rejected": self.rejected,
+            "errors": self.errors,
+        }
+
+
+class IdempotencyMiddleware:
+    """ASGI middleware applying an IdempotencyStore to POSTs on ``paths``"""
+
+    def __init__(self, app, store: IdempotencyStore, paths: Iterable[str], max_body_bytes: int = 32 * 1024 * 1024):
+        self.app = app
+        self.store = store
+        self.paths = set(paths)
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths
+            or self.store.collection is None
+        ):
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        key = headers.get("idempotency-key")
+        try:
+            too_large = int(headers.get("content-length") or 0) > self.max_body_bytes
+        except ValueError:
+            too_large = True  # Malformed length; leave the request to the app rather than buffer it
+        if not key or too_large:
+            await self.app(scope, receive, send)
+            return
+        if len(key) > MAX_KEY_LENGTH:
+            await self._send_json(send, 400, {"detail": f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters"})
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        store_key = f"{scope['path']}:{key}"
+        try:
+            outcome, found = await self.store.acquire(store_key, request_fingerprint(body, headers.get("content-type", "")))
+        except Exception as e:
+            # Without the store, run the request rather than fail it
+            self.store.errors += 1
+            logger.error(f"Idempotency store unavailable, executing {scope['path']} without it: {str(e)}")
+            await self.app(scope, replay_receive, send)
+            return
+
+        if outcome == "mismatch":
+            await self._send_json(send, 422, {"detail": "Idempotency-Key was already used with a different request"})
+            return
+        if outcome == "busy":
+            await self._send_json(send, 409, {"detail": "A request with this Idempotency-Key is still in progress"},
+                                  [(b"retry-after", b"5")])
+            return
+        if outcome == "replay":
+            await send({
+                "type": "http.response.start",
+                "status": found["status_code"],
+                "headers": [(name.encode("latin-1"), value.encode("latin-1")) for name, value in found["headers"]]
+                + [(b"idempotent-replayed", b"true")],
+            })
+            await send({"type": "http.response.body", "body": found["body"]})
+            return
+
+        owner = found
+        status_code = 500
+        response_headers = []
+        response_body = []
+
+        async def send_recorded(message):
+            nonlocal status_code, response_headers
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_headers = [(name.decode("latin-1"), value.decode("latin-1")) for name, value in message["headers"]]
+            elif message["type"] == "http.response.body":
+                response_body.append(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, send_recorded)
+        except BaseException:
+            await asyncio.shield(self.store.release(store_key, owner))
+            raise
+        await self.store.complete(store_key, owner, status_code, response_headers, b"".join(response_body))
+
+    @staticmethod
+    async def _send_json(send, status_code: int, content: dict, extra_headers: Optional[list] = None):
+        body = json.dumps(content).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+            + (extra_headers or []),
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,253 @@
+"""Admission control for LLM calls.
+
+``LLMScheduler`` sits in front of the AI client and enforces a global
+concurrency limit, a per-firm concurrency limit and an optional global token
+bucket (requests per second). Callers that cannot run immediately wait in a
+bounded queue. Waiters are served interactive-first and round-robin across
+firms, so one firm's upload burst cannot starve everyone else. When the queue
+is full, or a waiter has queued too long, ``LLMQueueFull`` is raised with a
+Retry-After estimate for the API layer to turn into a 429.
+"""
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Priorities, lower runs first
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class LLMQueueFull(Exception):
+    """The scheduler could not admit the call; retry after ``retry_after`` seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Classic token bucket; ``rate`` tokens per second up to ``capacity``"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def seconds_until_available(self) -> float:
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _Waiter:
+    __slots__ = ("firm_id", "priority", "future", "enqueued_at")
+
+    def __init__(self, firm_id: str, priority: int, future: asyncio.Future):
+        self.firm_id = firm_id
+        self.priority = priority
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Fair, priority-aware concurrency limiter for LLM calls"""
+
+    def __init__(
+        self,
+        global_limit: int = 8,
+        per_firm_limit: int = 2,
+        max_queue: int = 200,
+        max_queue_per_firm: int = 50,
+        max_wait_s: float = 30.0,
+        rate_per_s: Optional[float] = None,
+        burst: Optional[float] = None,
+    ):
+        self.global_limit = global_limit
+        self.per_firm_limit = per_firm_limit
+        self.max_queue = max_queue
+        self.max_queue_per_firm = max_queue_per_firm
+        self.max_wait_s = max_wait_s
+        # A bucket holding less than one token could never admit a call
+        self.bucket = TokenBucket(rate_per_s, max(1.0, burst or rate_per_s)) if rate_per_s else None
+
+        # priority -> firm_id -> FIFO of waiters; OrderedDict order is the round-robin order
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Waiter]]"] = {
+            INTERACTIVE: OrderedDict(),
+            BACKGROUND: OrderedDict(),
+        }
+        self._queued_by_firm: Dict[str, int] = defaultdict(int)
+        self._active_by_firm: Dict[str, int] = defaultdict(int)
+        self._active = 0
+        self._queued = 0
+        self._refill_timer: Optional[asyncio.TimerHandle] = None
+
+        # Metrics
+        self._avg_hold_s = 5.0
+        self._avg_wait_ms = 0.0
+        self.max_queue_depth = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    def retry_after(self) -> int:
+        """Rough seconds until a newly queued call would be admitted"""
+        return max(1, math.ceil(self._avg_hold_s * (self._queued + 1) / self.global_limit))
+
+    @asynccontextmanager
+    async def slot(self, firm_id: Optional[str], priority: int = INTERACTIVE):
+        """Hold a scheduling slot for the duration of one LLM call"""
+        firm_id = firm_id or "_anonymous"
+        await self._acquire(firm_id, priority)
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self._avg_hold_s = 0.9 * self._avg_hold_s + 0.1 * (time.monotonic() - started)
+            self._release(firm_id)
+
+    async def _acquire(self, firm_id: str, priority: int):
+        if self._queued >= self.max_queue or self._queued_by_firm.get(firm_id, 0) >= self.max_queue_per_firm:
+            self.rejected += 1
+            raise LLMQueueFull("AI request queue is full", self.retry_after())
+
+        waiter = _Waiter(firm_id, priority, asyncio.get_running_loop().create_future())
+        self._queues[priority].setdefault(firm_id, deque()).append(waiter)
+        self._queued += 1
+        self._queued_by_firm[firm_id] += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queued)
+        self._dispatch()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait_s)
+        except asyncio.TimeoutError:
+            if self._withdraw(waiter):
+                self.timed_out += 1
+                raise LLMQueueFull("Timed out waiting for an AI request slot", self.retry_after())
+        except asyncio.CancelledError:
+            # A slot granted at the same moment we were cancelled must be handed back
+            if not self._withdraw(waiter):
+                self._release(firm_id)
+            raise
+
+        wait_ms = (time.monotonic() - waiter.enqueued_at) * 1000
+        self._avg_wait_ms = 0.9 * self._avg_wait_ms + 0.1 * wait_ms
+
+    def _withdraw(self, waiter: _Waiter) -> bool:
+        """Remove a waiter that was never granted a slot; False if it already was"""
+        if waiter.future.done():
+            return False
+        waiter.future.cancel()
+        queue = self._queues[waiter.priority].get(waiter.firm_id)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            if not queue:
+                del self._queues[waiter.priority][waiter.firm_id]
+        self._dequeued(waiter.firm_id)
+        return True
+
+    def _dequeued(self, firm_id: str):
+        self._queued -= 1
+        self._queued_by_firm[firm_id] -= 1
+        if self._queued_by_firm[firm_id] <= 0:
+            del self._queued_by_firm[firm_id]
+
+    def _release(self, firm_id: str):
+        self._active -= 1
+        self._active_by_firm[firm_id] -= 1
+        if self._active_by_firm[firm_id] <= 0:
+            del self._active_by_firm[firm_id]
+        self._dispatch()
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """Interactive before background; round-robin across firms within a priority"""
+        for priority in (INTERACTIVE, BACKGROUND):
+            firms = self._queues[priority]
+            for firm_id in list(firms):
+                if self._active_by_firm.get(firm_id, 0) >= self.per_firm_limit:
+                    continue
+                queue = firms[firm_id]
+                waiter = queue.popleft()
+                # Served firm goes to the back of the round-robin order
+                del firms[firm_id]
+                if queue:
+                    firms[firm_id] = queue
+                return waiter
+        return None
+
+    def _dispatch(self):
+        while self._active < self.global_limit and self._queued:
+            if self.bucket is not None and not self.bucket.try_take():
+                self._schedule_refill()
+                return
+            waiter = self._next_waiter()
+            if waiter is None:
+                if self.bucket is not None:
+                    # Nothing eligible, give the token back
+                    self.bucket.tokens = min(self.bucket.capacity, self.bucket.tokens + 1)
+                return
+            self._dequeued(waiter.firm_id)
+            self._active += 1
+            self._active_by_firm[waiter.firm_id] += 1
+            self.admitted += 1
+            waiter.future.set_result(None)
+
+    def _schedule_refill(self):
+        if self._refill_timer is not None:
+            return
+        loop = asyncio.get_running_loop()
+
+        def refill():
+            self._refill_timer = None
+            self._dispatch()
+
+        self._refill_timer = loop.call_later(self.bucket.seconds_until_available(), refill)
+
+    def snapshot(self) -> dict:
+        return {
+            "active": self._active,
+            "queued": self._queued,
+            "queued_by_priority": {
+                PRIORITY_NAMES[priority]: sum(len(queue) for queue in firms.values())
+                for priority, firms in self._queues.items()
+            },
+            "queued_by_firm": dict(self._queued_by_firm),
+            "active_by_firm": dict(self._active_by_firm),
+            "max_queue_depth": self.max_queue_depth,
+            "avg_wait_ms": round(self._avg_wait_ms, 1),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "limits": {
+                "global": self.global_limit,
+                "per_firm": self.per_firm_limit,
+                "max_queue": self.max_queue,
+                "rate_per_s": self.bucket.rate if self.bucket else None,
+            },
+        }
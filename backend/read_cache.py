@@ -0,0 +1,220 @@
+"""In-process read cache for small, hot, rarely-changing records.
+
+``ReadCache`` is a bounded LRU whose entries also expire after a TTL. Keys are
+``(namespace, key)`` pairs such as ``("users", law_firm_id)``. ``get_or_load``
+coalesces concurrent misses into one loader call. A generation counter makes
+sure a load that races with an invalidation never writes its stale result
+back.
+
+Writes invalidate locally right away and publish the key on an
+``InvalidationBus``. The bus is a small capped Mongo collection that every
+worker tails, so the other gunicorn workers drop the entry within moments. If
+a message is missed, the TTL still bounds staleness.
+"""
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from pymongo import CursorType
+from pymongo.errors import CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, Hashable]
+
+
+class ReadCache:
+    """Bounded TTL + LRU cache; values are shared, treat them as read-only"""
+
+    def __init__(self, max_entries: int = 2048, ttl_s: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._entries: "OrderedDict[CacheKey, Tuple[float, object]]" = OrderedDict()
+        self._loading: Dict[CacheKey, asyncio.Future] = {}
+        self._generations: Dict[CacheKey, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, namespace: str, key: Hashable):
+        """Cached value or None"""
+        cache_key = (namespace, key)
+        entry = self._entries.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[cache_key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(cache_key)
+        return value
+
+    def set(self, namespace: str, key: Hashable, value, ttl_s: Optional[float] = None):
+        cache_key = (namespace, key)
+        self._entries[cache_key] = (time.monotonic() + (self.ttl_s if ttl_s is None else ttl_s), value)
+        self._entries.move_to_end(cache_key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_load(self, namespace: str, key: Hashable, loader: Callable[[], Awaitable], ttl_s: Optional[float] = None):
+        """Cached value, or the loader's result (None results are not cached)"""
+        value = self.get(namespace, key)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+
+        cache_key = (namespace, key)
+        in_flight = self._loading.get(cache_key)
+        if in_flight is not None:
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                return await loader()  # The leading request was cancelled; load it ourselves
+
+        generation = self._generations.get(cache_key, 0)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[cache_key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Waiters re-raise it; don't warn when there are none
+            raise
+        else:
+            if value is not None and self._generations.get(cache_key, 0) == generation:
+                self.set(namespace, key, value, ttl_s)
+            future.set_result(value)
+            return value
+        finally:
+            self._loading.pop(cache_key, None)
+
+    def invalidate(self, namespace: str, key: Hashable):
+        cache_key = (namespace, key)
+        self._generations[cache_key] = self._generations.get(cache_key, 0) + 1
+        if len(self._generations) > self.max_entries * 4:
+            # Only in-flight loads compare generations; old counters can go
+            self._generations = {k: v for k, v in self._generations.items() if k in self._loading}
+        if self._entries.pop(cache_key, None) is not None:
+            self.invalidations += 1
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        by_namespace: Dict[str, int] = {}
+        for namespace, _ in self._entries:
+            by_namespace[namespace] = by_namespace.get(namespace, 0) + 1
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "entries_by_namespace": by_namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class InvalidationBus:
+    """Cross-worker invalidation over a tailable capped collection"""
+
+    def __init__(self, cache: ReadCache, collection_name: str = "cache_invalidations", size_bytes: int = 1024 * 1024):
+        self.cache = cache
+        self.collection_name = collection_name
+        self.size_bytes = size_bytes
+        self.instance_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.collection = None
+        self._task: Optional[asyncio.Task] = None
+        self._handlers: Dict[str, List[Callable[[Hashable], None]]] = {}
+        self.published = 0
+        self.received = 0
+        self.errors = 0
+
+    async def start(self, db):
+        try:
+            await db.create_collection(self.collection_name, capped=True, size=self.size_bytes)
+        except CollectionInvalid:
+            pass  # Already exists
+        self.collection = db[self.collection_name]
+        # Only messages published from now on matter; the local cache starts empty
+        latest = await self.collection.find_one({}, sort=[("$natural", -1)], projection={"_id": 1})
+        self._task = asyncio.create_task(self._listen(latest["_id"] if latest else None))
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def subscribe(self, namespace: str, handler: Callable[[Hashable], None]):
+        """Also call ``handler(key)`` for every message in ``namespace``, local or remote"""
+        self._handlers.setdefault(namespace, []).append(handler)
+
+    def _notify(self, namespace: str, key: Hashable):
+        for handler in self._handlers.get(namespace, ()):
+            try:
+                handler(key)
+            except Exception as e:
+                logger.error(f"Invalidation handler for {namespace} failed: {str(e)}")
+
+    async def publish(self, namespace: str, key: Hashable):
+        """Invalidate locally, then tell the other workers"""
+        self.cache.invalidate(namespace, key)
+        self._notify(namespace, key)
+        if self.collection is None:
+            return
+        try:
+            await self.collection.insert_one({"origin": self.instance_id, "namespace": namespace, "key": key})
+            self.published += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Failed to broadcast cache invalidation: {str(e)}")
+
+    async def _listen(self, last_id):
+        delay = 0.5
+        while True:
+            try:
+                query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+                cursor = self.collection.find(query, cursor_type=CursorType.TAILABLE_AWAIT)
+                async for message in cursor:
+                    last_id = message["_id"]
+                    delay = 0.5
+                    if message.get("origin") != self.instance_id:
+                        self.cache.invalidate(message["namespace"], message["key"])
+                        self._notify(message["namespace"], message["key"])
+                        self.received += 1
+                # A tailable cursor on an empty collection dies at once; poll again shortly
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"Cache invalidation listener error, retrying in {delay:.0f}s: {str(e)}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30.0)
+
+    def snapshot(self) -> dict:
+        return {
+            "instance_id": self.instance_id,
+            "listening": self._task is not None and not self._task.done(),
+            "published": self.published,
+            "received": self.received,
+            "errors": self.errors,
+        }
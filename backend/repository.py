@@ -0,0 +1,626 @@
+"""Data access for the API.
+
+``create_client`` owns the Motor client configuration: pool sizes, timeouts,
+wire compression and retryable writes. ``Repository`` holds one method per
+query the routes need, each with an explicit projection. Indexes live next
+to those queries, in ``INDEXES``. Routes never build queries themselves, so
+query shapes can be tuned, indexed and benchmarked here.
+
+Documents are read without ``_id``, so nothing has to convert ObjectIds before
+returning them. Writes stamp ``updated_at``/``last_activity`` here.
+"""
+import asyncio
+import importlib.util
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReturnDocument
+from pymongo.errors import BulkWriteError, CollectionInvalid
+
+from storage_codec import FieldCodec
+
+logger = logging.getLogger(__name__)
+
+# Wire compressors and the package each one needs (zlib is built in)
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+
+
+@dataclass
+class MongoOptions:
+    min_pool_size: int = 4
+    max_pool_size: int = 100
+    max_idle_time_ms: int = 300000
+    server_selection_timeout_ms: int = 5000
+    connect_timeout_ms: int = 5000
+    socket_timeout_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = None
+    compressors: Tuple[str, ...] = ("zstd", "snappy", "zlib")
+    retry_writes: bool = True
+    retry_reads: bool = True
+    app_name: str = "legalsuite-api"
+
+
+def available_compressors(preferred) -> List[str]:
+    """``preferred`` in order, minus those whose package is not installed"""
+    available = []
+    for name in preferred:
+        if name not in _COMPRESSOR_MODULES:
+            logger.warning(f"Unknown MongoDB wire compressor ignored: {name}")
+            continue
+        module = _COMPRESSOR_MODULES[name]
+        if module is None or importlib.util.find_spec(module) is not None:
+            available.append(name)
+    return available
+
+
+def create_client(url: str, options: MongoOptions, event_listeners=None) -> AsyncIOMotorClient:
+    kwargs = {
+        "minPoolSize": options.min_pool_size,
+        "maxPoolSize": options.max_pool_size,
+        "maxIdleTimeMS": options.max_idle_time_ms,
+        "serverSelectionTimeoutMS": options.server_selection_timeout_ms,
+        "connectTimeoutMS": options.connect_timeout_ms,
+        "socketTimeoutMS": options.socket_timeout_ms,
+        "waitQueueTimeoutMS": options.wait_queue_timeout_ms,
+        "retryWrites": options.retry_writes,
+        "retryReads": options.retry_reads,
+        "appname": options.app_name,
+        "event_listeners": event_listeners or [],
+    }
+    compressors = available_compressors(options.compressors)
+    if compressors:
+        # The server picks the first one it also supports
+        kwargs["compressors"] = ",".join(compressors)
+    return AsyncIOMotorClient(url, **{key: value for key, value in kwargs.items() if value is not None})
+
+
+CASE_HEADER_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "law_firm_id": 1,
+    "case_number": 1,
+    "case_title": 1,
+    "case_type": 1,
+    "court_jurisdiction": 1,
+    "stage": 1,
+    "sub_stage": 1,
+    "priority": 1,
+    "assigned_attorney": 1,
+    "client_name": 1,
+}
+
+# Case search: filters (repeat a parameter to match any of several values), date
+# ranges and keyset-paginated sorts, each served by a compound index below
+CASE_FILTER_FIELDS = ("stage", "status", "priority", "case_type", "assigned_attorney", "court_jurisdiction")
+CASE_SORT_FIELDS = ("updated_at", "created_at", "next_hearing_date", "filing_date")
+CASE_DATE_FIELDS = ("updated_at", "created_at", "next_hearing_date", "filing_date", "filing_deadline", "statute_limitations")
+# Case date fields that raise alerts (see deadline_scheduler.py) -> (alert type, label)
+CASE_ALERT_FIELDS = {
+    "next_hearing_date": ("hearing", "Hearing"),
+    "filing_deadline": ("deadline", "Filing deadline"),
+    "statute_limitations": ("deadline", "Limitation period"),
+}
+# A case is closed in one of these statuses or in the closed stage; closed cases
+# get no alerts and are eventually moved to the ``*_archive`` collections
+CLOSED_STATUSES = ("closed", "dropped")
+ARCHIVE_SUFFIX = "_archive"
+CASE_LIST_PROJECTION = {
+    **CASE_HEADER_PROJECTION,
+    "status": 1,
+    "description": 1,
+    "opposing_counsel": 1,
+    "judge_name": 1,
+    "filing_date": 1,
+    "next_hearing_date": 1,
+    "filing_deadline": 1,
+    "statute_limitations": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "last_activity": 1,
+    # Only what the counts need, not whole alert and task lists
+    "alerts.is_read": 1,
+    "tasks.status": 1,
+}
+CASE_ARCHIVE_PROJECTION = {**CASE_HEADER_PROJECTION, "status": 1, "closed_at": 1, "archived_at": 1}
+
+# Research results: fields compressed at rest (see storage_codec.py), and the
+# ai_response preview stored for list views
+RESEARCH_COMPRESSED_FIELDS = ("ai_response", "indian_kanoon_results")
+RESEARCH_PREVIEW_CHARS = 240
+RESEARCH_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "query": 1,
+    "case_id": 1,
+    "user_id": 1,
+    "kanoon_status": 1,
+    "ai_preview": 1,
+    "relevant_cases": {"$slice": 3},
+    "created_at": 1,
+}
+DOCUMENT_LIST_PROJECTION = {"_id": 0, "content": 0}  # Without the large base64 content
+RESEARCH_THREAD_LIST_PROJECTION = {"_id": 0, "recent_turns": 0}
+
+# Raw LLM usage records are kept this long; the daily rollups have no expiry
+LLM_USAGE_RETENTION_S = 180 * 24 * 3600
+
+# Indexes applied at startup, per collection
+INDEXES = {
+    "law_firms": [IndexModel([("id", ASCENDING)], unique=True)],
+    "users": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("law_firm_id", ASCENDING)]),
+    ],
+    # id breaks ties so keyset pages are stable; filters are equality-then-sort
+    "cases": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("law_firm_id", ASCENDING), ("case_number", ASCENDING)]),
+        *[
+            IndexModel([("law_firm_id", ASCENDING), (field, DESCENDING), ("id", DESCENDING)])
+            for field in CASE_SORT_FIELDS
+        ],
+        *[
+            IndexModel([("law_firm_id", ASCENDING), (field, ASCENDING), ("updated_at", DESCENDING), ("id", DESCENDING)])
+            for field in CASE_FILTER_FIELDS
+        ],
+        IndexModel(
+            [("law_firm_id", ASCENDING), ("case_title", TEXT), ("case_number", TEXT), ("client_name", TEXT)],
+            weights={"case_number": 10, "case_title": 5, "client_name": 5},
+            name="case_search_text"
+        ),
+        # Range scans by the deadline scheduler
+        *[IndexModel([(field, ASCENDING)]) for field in CASE_ALERT_FIELDS],
+        # Archival walks closed cases in this order (see case_archive.py); cases
+        # closed before closed_at existed sit under null, ordered by updated_at
+        IndexModel([("closed_at", ASCENDING), ("updated_at", ASCENDING), ("id", ASCENDING)], name="case_archival"),
+    ],
+    "legal_documents": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("case_id", ASCENDING)]),
+        IndexModel([("law_firm_id", ASCENDING), ("created_at", DESCENDING)]),
+    ],
+    # Stored responses for Idempotency-Key retries (see idempotency.py)
+    "idempotency_keys": [
+        IndexModel([("key", ASCENDING)], unique=True),
+        IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    # AI analyses reused across uploads of identical content (see upload_document)
+    "document_analyses": [IndexModel([("key", ASCENDING)], unique=True)],
+    "research_results": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("case_id", ASCENDING)]),
+        IndexModel([("law_firm_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel(
+            [("thread_id", ASCENDING), ("turn", ASCENDING)],
+            partialFilterExpression={"thread_id": {"$type": "string"}}
+        ),
+    ],
+    # Multi-turn research: rolling summary plus the unsummarized recent turns
+    "research_threads": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("case_id", ASCENDING), ("updated_at", DESCENDING)]),
+    ],
+    # Cold tier for closed cases (see case_archive.py); read by id and case only
+    "cases_archive": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("law_firm_id", ASCENDING), ("archived_at", DESCENDING)]),
+    ],
+    "legal_documents_archive": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("case_id", ASCENDING)]),
+    ],
+    "research_results_archive": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("case_id", ASCENDING)]),
+    ],
+    # Only negative (not found) entries carry expire_at; judgments are kept and revalidated
+    "kanoon_documents": [
+        IndexModel([("tid", ASCENDING)], unique=True),
+        IndexModel([("citation_keys", ASCENDING)]),
+        IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    "kanoon_searches": [
+        IndexModel([("key", ASCENDING)], unique=True),
+        IndexModel([("expire_at", ASCENDING)], expireAfterSeconds=0),
+    ],
+    # LLM usage (see usage_ledger.py): raw calls expire, daily rollups are kept
+    "llm_usage": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("law_firm_id", ASCENDING), ("created_at", DESCENDING)]),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=LLM_USAGE_RETENTION_S),
+    ],
+    "llm_usage_daily": [
+        IndexModel(
+            [("law_firm_id", ASCENDING), ("day", ASCENDING), ("feature", ASCENDING), ("model", ASCENDING), ("user_id", ASCENDING)],
+            unique=True
+        ),
+        IndexModel([("day", ASCENDING)]),
+    ],
+}
+
+
+def research_preview(ai_response: Optional[str]) -> str:
+    return (ai_response or "")[:RESEARCH_PREVIEW_CHARS]
+
+
+def archive_name(collection: str) -> str:
+    return collection + ARCHIVE_SUFFIX
+
+
+def is_closed(case: dict) -> bool:
+    return case.get("status") in CLOSED_STATUSES or case.get("stage") == "closed"
+
+
+async def find_by_id(db, collection: str, record_id: str, projection: Optional[dict] = None) -> Tuple[Optional[dict], bool]:
+    """``(document, archived)`` from the hot collection, else from its archive"""
+    projection = projection if projection is not None else {"_id": 0}
+    document = await db[collection].find_one({"id": record_id}, projection)
+    if document is not None:
+        return document, False
+    document = await db[archive_name(collection)].find_one({"id": record_id}, projection)
+    return document, document is not None
+
+
+def firm_stats_pipeline(law_firm_id: str, now: datetime) -> List[dict]:
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    # The negation of is_closed
+    is_open = {"$not": {"$or": [{"$in": ["$status", list(CLOSED_STATUSES)]}, {"$eq": ["$stage", "closed"]}]}}
+    this_month = {
+        "$filter": {"input": {"$ifNull": ["$time_entries", []]}, "cond": {"$gte": ["$$this.date", month_start]}}
+    }
+
+    def count_by(field: str) -> List[dict]:
+        return [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}]
+
+    return [
+        {"$match": {"law_firm_id": law_firm_id}},
+        {"$project": {
+            "_id": 0, "stage": 1, "status": 1, "priority": 1, "case_type": 1, "filing_deadline": 1,
+            "alerts.is_read": 1, "tasks.status": 1, "tasks.due_date": 1,
+            "time_entries.date": 1, "time_entries.hours": 1, "time_entries.billable": 1,
+        }},
+        {"$facet": {
+            "by_stage": count_by("stage"),
+            "by_status": count_by("status"),
+            "by_priority": count_by("priority"),
+            "by_type": count_by("case_type"),
+            "totals": [{"$group": {
+                "_id": None,
+                "cases": {"$sum": 1},
+                "open_cases": {"$sum": {"$cond": [is_open, 1, 0]}},
+                "open_alerts": {"$sum": {"$size": {"$filter": {
+                    "input": {"$ifNull": ["$alerts", []]}, "cond": {"$ne": ["$$this.is_read", True]}
+                }}}},
+                "pending_tasks": {"$sum": {"$size": {"$filter": {
+                    "input": {"$ifNull": ["$tasks", []]}, "cond": {"$ne": ["$$this.status", "completed"]}
+                }}}},
+                "overdue_tasks": {"$sum": {"$size": {"$filter": {
+                    "input": {"$ifNull": ["$tasks", []]},
+                    "cond": {"$and": [
+                        {"$ne": ["$$this.status", "completed"]},
+                        {"$gt": ["$$this.due_date", None]},
+                        {"$lt": ["$$this.due_date", now]},
+                    ]}
+                }}}},
+                "overdue_deadlines": {"$sum": {"$cond": [
+                    {"$and": [is_open, {"$gt": ["$filing_deadline", None]}, {"$lt": ["$filing_deadline", now]}]}, 1, 0
+                ]}},
+                "hours_this_month": {"$sum": {"$sum": {"$map": {"input": this_month, "in": "$$this.hours"}}}},
+                "billable_hours_this_month": {"$sum": {"$sum": {"$map": {
+                    "input": this_month, "in": {"$cond": [{"$ne": ["$$this.billable", False]}, "$$this.hours", 0]}
+                }}}},
+            }}],
+        }},
+    ]
+
+
+def case_search_query(
+    law_firm_id: str,
+    filters: Dict[str, Optional[List[str]]],
+    case_number: Optional[str] = None,
+    date_field: str = "updated_at",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    text: Optional[str] = None,
+) -> dict:
+    query = {"law_firm_id": law_firm_id}
+    for field, values in filters.items():
+        if values:
+            query[field] = values[0] if len(values) == 1 else {"$in": values}
+    if case_number:
+        query["case_number"] = case_number
+    if date_from or date_to:
+        query[date_field] = {
+            **({"$gte": date_from} if date_from else {}),
+            **({"$lte": date_to} if date_to else {}),
+        }
+    if text:
+        query["$text"] = {"$search": text}
+    return query
+
+
+def case_after_filter(sort: str, value: Optional[datetime], last_id: str, descending: bool) -> dict:
+    """Cases strictly after ``(value, last_id)`` in (sort, id) order; nulls sort lowest"""
+    op = "$lt" if descending else "$gt"
+    if value is None:
+        after = [{sort: None, "id": {op: last_id}}]
+        if not descending:
+            after.append({sort: {"$ne": None}})
+    else:
+        after = [{sort: {op: value}}, {sort: value, "id": {op: last_id}}]
+        if descending:
+            after.append({sort: None})
+    return {"$or": after}
+
+
+def usage_query(law_firm_id: Optional[str], date_from: datetime, date_to: datetime, feature: Optional[str] = None) -> dict:
+    """Daily rollups between two dates (inclusive), optionally for one firm and feature"""
+    query = {"day": {"$gte": date_from, "$lte": date_to}}
+    if law_firm_id:
+        query["law_firm_id"] = law_firm_id
+    if feature:
+        query["feature"] = feature
+    return query
+
+
+def _touch(activity: bool = True) -> dict:
+    now = datetime.utcnow()
+    return {"updated_at": now, "last_activity": now} if activity else {"updated_at": now}
+
+
+class Repository:
+    def __init__(self, db, research_codec: FieldCodec):
+        self.db = db
+        self.research_codec = research_codec
+
+    # Housekeeping
+
+    async def ping(self):
+        return await self.db.command("ping")
+
+    async def ensure_indexes(self):
+        await asyncio.gather(*[
+            self.db[collection].create_indexes(indexes) for collection, indexes in INDEXES.items()
+        ])
+
+    async def create_capped_collection(self, name: str, size_bytes: int):
+        try:
+            await self.db.create_collection(name, capped=True, size=size_bytes)
+        except CollectionInvalid:
+            pass  # Already exists
+
+    async def insert_slow_request(self, record: dict):
+        await self.db.slow_requests.insert_one(record)
+
+    # Firms and users
+
+    async def insert_firm(self, firm: dict):
+        await self.db.law_firms.insert_one(firm)
+
+    async def list_firms(self) -> List[dict]:
+        return await self.db.law_firms.find({}, {"_id": 0}).to_list(1000)
+
+    async def insert_user(self, user: dict):
+        await self.db.users.insert_one(user)
+
+    async def list_users(self, law_firm_id: str) -> List[dict]:
+        return await self.db.users.find({"law_firm_id": law_firm_id}, {"_id": 0}).to_list(1000)
+
+    # Cases
+
+    async def insert_case(self, case: dict):
+        await self.db.cases.insert_one(case)
+
+    async def case_header(self, case_id: str) -> Optional[dict]:
+        header, _ = await find_by_id(self.db, "cases", case_id, CASE_HEADER_PROJECTION)
+        return header
+
+    async def get_case(self, case_id: str) -> Tuple[Optional[dict], bool]:
+        """``(case, archived)``, from the archive when it is no longer hot"""
+        return await find_by_id(self.db, "cases", case_id)
+
+    async def list_cases(self, law_firm_id: str, limit: int = 1000) -> List[dict]:
+        return await self.db.cases.find({"law_firm_id": law_firm_id}, {"_id": 0}).sort("updated_at", -1).to_list(limit)
+
+    async def search_cases(self, query: dict, sort: List[tuple], limit: int, with_score: bool = False) -> List[dict]:
+        projection = dict(CASE_LIST_PROJECTION)
+        if with_score:
+            projection["score"] = {"$meta": "textScore"}
+        return await self.db.cases.find(query, projection).sort(sort).limit(limit).to_list(limit)
+
+    async def count_cases(self, query: dict) -> int:
+        return await self.db.cases.count_documents(query)
+
+    async def case_record_counts(self, case_ids: List[str]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """``(documents, research results)`` per case id, one grouped query each"""
+        counts = await asyncio.gather(*[
+            collection.aggregate([
+                {"$match": {"case_id": {"$in": case_ids}}},
+                {"$group": {"_id": "$case_id", "count": {"$sum": 1}}},
+            ]).to_list(None)
+            for collection in (self.db.legal_documents, self.db.research_results)
+        ])
+        return tuple({row["_id"]: row["count"] for row in rows} for rows in counts)
+
+    async def case_records(self, collection: str, case_id: str, projection: dict, include_archive: bool = False, limit: int = 100) -> List[dict]:
+        """A case's documents or research, newest first; with the archive for archived cases"""
+        names = [collection, archive_name(collection)] if include_archive else [collection]
+        found = await asyncio.gather(*[
+            self.db[name].find({"case_id": case_id}, projection).sort("created_at", -1).to_list(limit)
+            for name in names
+        ])
+        records = {record["id"]: record for records in found for record in records}
+        return sorted(records.values(), key=lambda record: record.get("created_at") or datetime.min, reverse=True)
+
+    async def firm_stats(self, law_firm_id: str) -> dict:
+        now = datetime.utcnow()
+        facets = (await self.db.cases.aggregate(firm_stats_pipeline(law_firm_id, now)).to_list(1))[0]
+        totals = facets["totals"][0] if facets["totals"] else {}
+        totals.pop("_id", None)
+        stats = {
+            "cases": 0, "open_cases": 0, "open_alerts": 0, "pending_tasks": 0, "overdue_tasks": 0,
+            "overdue_deadlines": 0, "hours_this_month": 0, "billable_hours_this_month": 0,
+            **totals,
+        }
+        for facet in ("by_stage", "by_status", "by_priority", "by_type"):
+            stats[facet] = {row["_id"] or "unspecified": row["count"] for row in facets[facet]}
+        stats["hours_this_month"] = round(stats["hours_this_month"], 2)
+        stats["billable_hours_this_month"] = round(stats["billable_hours_this_month"], 2)
+        stats["computed_at"] = now
+        return stats
+
+    async def update_case(self, case_id: str, fields: dict) -> bool:
+        """Set ``fields`` and stamp the case; False when it does not exist.
+
+        A change of status or stage also keeps ``closed_at`` (the archival
+        clock) in step: it is set when the case goes from open to closed, kept
+        while it stays closed and cleared when it is reopened.
+        """
+        update = {"$set": {**fields, **_touch()}}
+        if "status" in fields or "stage" in fields:
+            # One pipeline update, so closed_at is decided on the status and
+            # stage it is written with. Values are literals: a client's "$..."
+            # string is text, not a field path.
+            closed = {"$or": [{"$in": ["$status", list(CLOSED_STATUSES)]}, {"$eq": ["$stage", "closed"]}]}
+            update = [
+                {"$set": {key: {"$literal": value} for key, value in update["$set"].items()}},
+                {"$set": {"closed_at": {"$cond": [closed, {"$ifNull": ["$closed_at", datetime.utcnow()]}, None]}}},
+            ]
+        result = await self.db.cases.update_one({"id": case_id}, update)
+        return result.matched_count > 0
+
+    async def push_case_item(self, case_id: str, array: str, item: dict) -> bool:
+        """Append to one of the case's embedded lists (tasks, notes, alerts, time_entries)"""
+        result = await self.db.cases.update_one({"id": case_id}, {"$push": {array: item}, "$set": _touch()})
+        return result.matched_count > 0
+
+    async def update_case_item(self, case_id: str, array: str, item_id: str, fields: dict, activity: bool = True) -> bool:
+        result = await self.db.cases.update_one(
+            {"id": case_id, f"{array}.id": item_id},
+            {"$set": {**{f"{array}.$.{key}": value for key, value in fields.items()}, **_touch(activity)}}
+        )
+        return result.matched_count > 0
+
+    async def archived_cases(self, law_firm_id: str, limit: int, skip: int = 0) -> List[dict]:
+        return await self.db.cases_archive.find(
+            {"law_firm_id": law_firm_id}, CASE_ARCHIVE_PROJECTION
+        ).sort("archived_at", -1).skip(skip).limit(limit).to_list(limit)
+
+    # Research results (large fields compressed at rest)
+
+    async def insert_research(self, record: dict):
+        await self.db.research_results.insert_one(self.research_codec.pack(record))
+
+    async def insert_research_many(self, records: List[dict]) -> List[int]:
+        """Positions of the records that could not be written; ids already stored count as written"""
+        try:
+            await self.db.research_results.insert_many([self.research_codec.pack(record) for record in records], ordered=False)
+        except BulkWriteError as e:
+            return [error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != 11000]
+        return []
+
+    async def research_history(self, law_firm_id: str, limit: int, full: bool = False) -> List[dict]:
+        results = await self.db.research_results.find(
+            {"law_firm_id": law_firm_id},
+            {"_id": 0} if full else RESEARCH_SUMMARY_PROJECTION
+        ).sort("created_at", -1).limit(limit).to_list(limit)
+        return [self.research_codec.unpack(result) for result in results] if full else results
+
+    async def get_research(self, research_id: str) -> Optional[dict]:
+        result, _ = await find_by_id(self.db, "research_results", research_id)
+        return self.research_codec.unpack(result)
+
+    # Research threads
+
+    async def insert_research_thread(self, thread: dict):
+        await self.db.research_threads.insert_one(thread)
+
+    async def get_research_thread(self, thread_id: str) -> Optional[dict]:
+        return await self.db.research_threads.find_one({"id": thread_id}, {"_id": 0})
+
+    async def list_research_threads(self, case_id: str, limit: int = 50) -> List[dict]:
+        return await self.db.research_threads.find(
+            {"case_id": case_id}, RESEARCH_THREAD_LIST_PROJECTION
+        ).sort("updated_at", -1).to_list(limit)
+
+    async def append_research_turn(self, thread_id: str, turn: dict, keep: int) -> Optional[int]:
+        """Number the next turn and keep it among the last ``keep`` recent turns"""
+        thread = await self.db.research_threads.find_one_and_update(
+            {"id": thread_id},
+            {"$inc": {"turn_count": 1}, "$set": _touch(activity=False)},
+            projection={"_id": 0, "turn_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if thread is None:
+            return None
+        number = thread["turn_count"]
+        # Concurrent turns may land out of order; $sort restores it
+        await self.db.research_threads.update_one(
+            {"id": thread_id},
+            {"$push": {"recent_turns": {"$each": [{**turn, "turn": number}], "$sort": {"turn": 1}, "$slice": -keep}}}
+        )
+        return number
+
+    async def compact_research_thread(self, thread_id: str, summarized_turns: int, through_turn: int, summary: str) -> bool:
+        """Replace the summary if no one else compacted since ``summarized_turns``"""
+        result = await self.db.research_threads.update_one(
+            {"id": thread_id, "summarized_turns": summarized_turns},
+            {
+                "$set": {"summary": summary, "summarized_turns": through_turn},
+                "$pull": {"recent_turns": {"turn": {"$lte": through_turn}}},
+            }
+        )
+        return result.modified_count > 0
+
+    async def thread_research(self, thread_id: str, limit: int = 100) -> List[dict]:
+        results = await self.db.research_results.find(
+            {"thread_id": thread_id}, {"_id": 0}
+        ).sort("turn", 1).to_list(limit)
+        return [self.research_codec.unpack(result) for result in results]
+
+    # Documents
+
+    async def insert_document(self, document: dict):
+        await self.db.legal_documents.insert_one(document)
+
+    async def get_document_analysis(self, key: str) -> Optional[dict]:
+        return await self.db.document_analyses.find_one({"key": key}, {"_id": 0})
+
+    async def save_document_analysis(self, analysis: dict):
+        await self.db.document_analyses.replace_one({"key": analysis["key"]}, analysis, upsert=True)
+
+    async def list_documents(self, law_firm_id: str, limit: int = 1000) -> List[dict]:
+        return await self.db.legal_documents.find(
+            {"law_firm_id": law_firm_id}, DOCUMENT_LIST_PROJECTION
+        ).sort("created_at", -1).to_list(limit)
+
+    # LLM usage (written by usage_ledger.py)
+
+    async def usage_rollups(self, query: dict, group_by: List[str]) -> List[dict]:
+        """Daily rollups matching ``query`` summed per ``group_by`` fields, most tokens first"""
+        rows = await self.db.llm_usage_daily.aggregate([
+            {"$match": query},
+            {"$group": {
+                "_id": {field: f"${field}" for field in group_by} if group_by else None,
+                "calls": {"$sum": "$calls"},
+                "prompt_tokens": {"$sum": "$prompt_tokens"},
+                "cached_tokens": {"$sum": "$cached_tokens"},
+                "completion_tokens": {"$sum": "$completion_tokens"},
+                "total_tokens": {"$sum": "$total_tokens"},
+                "latency_ms_total": {"$sum": "$latency_ms_total"},
+                "latency_ms_max": {"$max": "$latency_ms_max"},
+            }},
+            {"$sort": {"total_tokens": -1}},
+        ]).to_list(None)
+        usage = []
+        for row in rows:
+            latency_ms_total = row.pop("latency_ms_total")
+            usage.append({
+                **(row.pop("_id") or {}),
+                **row,
+                "avg_latency_ms": round(latency_ms_total / row["calls"], 1) if row["calls"] else None,
+            })
+        return usage
@@ -0,0 +1,265 @@
+"""End-to-end request deadlines.
+
+``RequestDeadlineMiddleware`` gives every HTTP request a time budget, chosen by
+method and path from ``RequestDeadlines``, and stores it as a
+``RequestDeadline`` in a context variable. Work on the request path reads the
+remaining budget from there:
+
+* upstream HTTP clients cap their per-call timeout with ``capped_timeout``;
+* Mongo operations run under ``pymongo.timeout``, so every command carries a
+  ``maxTimeMS`` no larger than what is left (Motor copies the context into its
+  executor threads).
+
+The endpoint runs as a child task. It is cancelled when the budget runs out,
+and also when the client disconnects, so abandoned requests stop holding
+workers, LLM slots and connections. A request that runs out of budget before
+responding gets a 504 whose body lists the time spent so far per category (db,
+llm, kanoon, ...). That also applies when the endpoint itself turned the
+expiry into a 5xx. Streamed responses that already started are cut off. Once
+the response is complete, post-response work is left to finish.
+
+Work that must outlive the request (final flushes, summaries) is started with
+``detached_task``. It runs without the request's deadline.
+"""
+import asyncio
+import contextvars
+import json
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Dict, Iterable, Optional, Tuple
+
+import pymongo
+from starlette.datastructures import Headers
+
+from external_integrations.resilience import DeadlineExceeded
+from request_timing import current_timing
+
+logger = logging.getLogger(__name__)
+
+
+class RequestDeadline:
+    """Monotonic expiry of the current request's budget"""
+
+    __slots__ = ("budget_s", "started", "expires_at")
+
+    def __init__(self, budget_s: float):
+        self.budget_s = budget_s
+        self.started = time.monotonic()
+        self.expires_at = self.started + budget_s
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cap(self, timeout_s: float) -> float:
+        """``timeout_s`` shortened to the remaining budget; raises DeadlineExceeded when none is left"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.budget_s:g}s exceeded")
+        return min(timeout_s, remaining)
+
+
+_current_deadline: ContextVar[Optional[RequestDeadline]] = ContextVar("request_deadline", default=None)
+
+
+def current_deadline() -> Optional[RequestDeadline]:
+    return _current_deadline.get()
+
+
+def capped_timeout(timeout_s: float) -> float:
+    """Timeout for a downstream call: ``timeout_s``, or less if the request's budget is shorter"""
+    deadline = _current_deadline.get()
+    return timeout_s if deadline is None else deadline.cap(timeout_s)
+
+
+def detached_task(coro) -> asyncio.Task:
+    """Run ``coro`` as a task outside the current request's deadline and timing"""
+    return asyncio.create_task(coro, context=contextvars.Context())
+
+
+class _DisconnectWatch:
+    """Passes the request body through to the app, then listens for the client going away"""
+
+    def __init__(self, receive):
+        self._receive = receive
+        self._held: Optional[dict] = None
+        self._listener: Optional[asyncio.Task] = None
+        self.disconnected = asyncio.Event()
+
+    async def start(self, scope):
+        # Without a body there is nothing for the app to read first; listen right away
+        headers = Headers(scope=scope)
+        try:
+            has_body = int(headers.get("content-length") or 0) > 0
+        except ValueError:
+            has_body = True  # Malformed length; let the app read (and reject) whatever arrives
+        if not has_body and "transfer-encoding" not in headers:
+            self._held = await self._receive()
+            self._received(self._held)
+
+    def _received(self, message: dict):
+        if message["type"] == "http.disconnect":
+            self.disconnected.set()
+        elif not message.get("more_body", False) and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while (await self._receive())["type"] != "http.disconnect":
+            pass
+        self.disconnected.set()
+
+    async def receive(self) -> dict:
+        if self._held is not None:
+            message, self._held = self._held, None
+            return message
+        if self._listener is not None or self.disconnected.is_set():
+            await self.disconnected.wait()
+            return {"type": "http.disconnect"}
+        message = await self._receive()
+        self._received(message)
+        return message
+
+    def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+
+
+class RequestDeadlines:
+    """Per-route budgets and counters of requests cut short.
+
+    ``routes`` lists ``(method, path, budget_s)``; other requests get
+    ``default_s``. A budget of 0 (or None) disables the deadline, but the
+    request is still cancelled if the client disconnects.
+    """
+
+    def __init__(self, default_s: Optional[float] = 30.0, routes: Optional[Iterable[Tuple[str, str, Optional[float]]]] = None):
+        self.default_s = default_s
+        self.routes: Dict[Tuple[str, str], Optional[float]] = {(method, path): budget_s for method, path, budget_s in routes or ()}
+        self.timed_out: Dict[str, int] = defaultdict(int)
+        self.disconnected: Dict[str, int] = defaultdict(int)
+
+    def budget_for(self, method: str, path: str) -> Optional[float]:
+        budget_s = self.routes.get((method, path), self.default_s)
+        return budget_s if budget_s and budget_s > 0 else None
+
+    def snapshot(self) -> dict:
+        return {
+            "default_s": self.default_s,
+            "routes": {f"{method} {path}": budget_s for (method, path), budget_s in self.routes.items()},
+            "timed_out": dict(self.timed_out),
+            "cancelled_on_disconnect": dict(self.disconnected),
+        }
+
+
+class RequestDeadlineMiddleware:
+    """ASGI middleware enforcing RequestDeadlines and cancelling on client disconnect"""
+
+    def __init__(self, app, deadlines: RequestDeadlines):
+        self.app = app
+        self.deadlines = deadlines
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget_s = self.deadlines.budget_for(scope["method"], scope["path"])
+        deadline = RequestDeadline(budget_s) if budget_s else None
+        watch = _DisconnectWatch(receive)
+        response_started = False
+        response_complete = False
+        replaced = False
+
+        async def send_within_deadline(message):
+            nonlocal response_started, response_complete, replaced
+            if replaced:
+                return  # A 504 was already sent in place of this response
+            if message["type"] == "http.response.start":
+                if deadline is not None and deadline.expired and message["status"] >= 500:
+                    # The endpoint turned the expiry into an error of its own; answer 504 instead
+                    replaced = True
+                    self.deadlines.timed_out[scope["path"]] += 1
+                    await self._send_timeout(send, scope, deadline)
+                    return
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        token = _current_deadline.set(deadline)
+        try:
+            await watch.start(scope)
+            if deadline is not None:
+                with pymongo.timeout(budget_s):
+                    app_task = asyncio.create_task(self.app(scope, watch.receive, send_within_deadline))
+            else:
+                app_task = asyncio.create_task(self.app(scope, watch.receive, send_within_deadline))
+        finally:
+            _current_deadline.reset(token)
+
+        disconnected = asyncio.create_task(watch.disconnected.wait())
+        try:
+            await asyncio.wait(
+                {app_task, disconnected},
+                timeout=deadline.remaining() if deadline is not None else None,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if not app_task.done() and (response_complete or replaced):
+                await app_task  # Only post-response work (background tasks) is left
+            elif not app_task.done():
+                app_task.cancel()
+                try:
+                    await app_task
+                except asyncio.CancelledError:
+                    if not app_task.cancelled():
+                        raise  # We were cancelled ourselves while waiting
+                except Exception as e:
+                    logger.error(f"Error while cancelling {scope['method']} {scope['path']}: {str(e)}")
+
+                if watch.disconnected.is_set():
+                    self.deadlines.disconnected[scope["path"]] += 1
+                    logger.info(f"Client disconnected, cancelled {scope['method']} {scope['path']}")
+                else:
+                    self.deadlines.timed_out[scope["path"]] += 1
+                    if not response_started and not replaced:
+                        replaced = True
+                        await self._send_timeout(send, scope, deadline)
+                return
+            try:
+                app_task.result()  # Re-raise the endpoint's exception, if any
+            except Exception:
+                if deadline is not None and deadline.expired and not response_started and not replaced:
+                    self.deadlines.timed_out[scope["path"]] += 1
+                    await self._send_timeout(send, scope, deadline)
+                raise
+        finally:
+            for task in (app_task, disconnected):
+                if not task.done():
+                    task.cancel()
+            watch.close()
+
+    async def _send_timeout(self, send, scope, deadline: RequestDeadline):
+        timing = current_timing()
+        elapsed_ms = (time.monotonic() - deadline.started) * 1000
+        timings_ms = {category: round(duration, 1) for category, duration in timing.totals.items()} if timing else {}
+        logger.warning(
+            f"Deadline of {deadline.budget_s:g}s exceeded: {scope['method']} {scope['path']} "
+            f"after {elapsed_ms:.0f}ms {json.dumps(timings_ms)}"
+        )
+        body = json.dumps({
+            "detail": f"Request did not complete within its {deadline.budget_s:g}s deadline",
+            "deadline_ms": round(deadline.budget_s * 1000),
+            "elapsed_ms": round(elapsed_ms, 1),
+            "timings_ms": timings_ms,
+        }).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 504,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
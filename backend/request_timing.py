@@ -0,0 +1,248 @@
+"""Request-scoped span tracking, Server-Timing headers and the slow-request log.
+
+Every HTTP request gets a ``RequestTiming`` stored in a context variable. Code
+on the request path opens spans with ``span("llm")`` / ``span("kanoon")``,
+Mongo commands are picked up automatically through ``DbTimingListener`` and
+response serialization is measured by ``TimedRoute``. The middleware turns the
+per-category totals into a ``Server-Timing`` header and hands requests slower
+than the configured threshold, with their full span tree, to a sink.
+"""
+import functools
+import inspect
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi.routing import APIRoute
+from pymongo import monitoring
+from starlette.datastructures import MutableHeaders
+
+logger = logging.getLogger(__name__)
+
+# Categories always reported in the Server-Timing header, in this order
+SERVER_TIMING_CATEGORIES = ("db", "llm", "kanoon", "serialize")
+
+
+class Span:
+    """A timed section of a request, possibly with nested child spans"""
+
+    __slots__ = ("name", "category", "start", "end", "children", "meta")
+
+    def __init__(self, name: str, category: str, start: float, meta: Optional[dict] = None):
+        self.name = name
+        self.category = category
+        self.start = start
+        self.end: Optional[float] = None
+        self.children: List["Span"] = []
+        self.meta = meta or {}
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self, origin: float) -> dict:
+        return {
+            "name": self.name,
+            "category": self.category,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "dur_ms": round(self.duration_ms, 3),
+            **self.meta,
+            "children": [child.to_dict(origin) for child in self.children],
+        }
+
+
+class RequestTiming:
+    """Span tree and per-category totals for a single request"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.utcnow()
+        self.root = Span("request", "app", time.perf_counter())
+        self.status_code: Optional[int] = None
+        self.endpoint_done: Optional[float] = None
+        self.totals: Dict[str, float] = defaultdict(float)
+        self._lock = threading.Lock()
+        self._pending_commands: Dict[int, str] = {}
+
+    @property
+    def total_ms(self) -> float:
+        return self.root.duration_ms
+
+    def add_span(self, span: Span, parent: Optional[Span] = None):
+        # Mongo events arrive on Motor's executor threads, hence the lock
+        with self._lock:
+            (parent or self.root).children.append(span)
+            self.totals[span.category] += span.duration_ms
+
+    def finish(self):
+        if self.root.end is None:
+            self.root.end = time.perf_counter()
+
+    def server_timing_header(self) -> str:
+        entries = [f"{category};dur={self.totals.get(category, 0.0):.1f}" for category in SERVER_TIMING_CATEGORIES]
+        entries += [
+            f"{category};dur={duration:.1f}"
+            for category, duration in self.totals.items()
+            if category not in SERVER_TIMING_CATEGORIES
+        ]
+        entries.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(entries)
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "status_code": self.status_code,
+            "started_at": self.started_at,
+            "total_ms": round(self.total_ms, 3),
+            "totals_ms": {category: round(duration, 3) for category, duration in self.totals.items()},
+            "spans": self.root.to_dict(self.root.start)["children"],
+        }
+
+
+_current_timing: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("request_span", default=None)
+
+
+def current_timing() -> Optional[RequestTiming]:
+    return _current_timing.get()
+
+
+@contextmanager
+def span(category: str, name: Optional[str] = None, **meta):
+    """Time the enclosed block as a child of the current span.
+
+    Outside of a request (startup, background jobs) this is a no-op.
+    """
+    timing = _current_timing.get()
+    if timing is None:
+        yield None
+        return
+
+    parent = _current_span.get()
+    current = Span(name or category, category, time.perf_counter(), meta)
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        current.end = time.perf_counter()
+        _current_span.reset(token)
+        timing.add_span(current, parent)
+
+
+class DbTimingListener(monitoring.CommandListener):
+    """pymongo command listener that records every Mongo command as a ``db`` span.
+
+    Motor copies the caller's context into its executor threads, so the
+    request's timing is visible here.
+    """
+
+    def started(self, event):
+        timing = _current_timing.get()
+        if timing is not None:
+            target = event.command.get(event.command_name)
+            timing._pending_commands[event.request_id] = (
+                f"{event.command_name} {target}" if isinstance(target, str) else event.command_name
+            )
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event, failed=True)
+
+    def _record(self, event, failed: bool = False):
+        timing = _current_timing.get()
+        if timing is None:
+            return
+        name = timing._pending_commands.pop(event.request_id, event.command_name)
+        end = time.perf_counter()
+        db_span = Span(name, "db", end - event.duration_micros / 1_000_000, {"failed": True} if failed else None)
+        db_span.end = end
+        timing.add_span(db_span, _current_span.get())
+
+
+def _timed_endpoint(endpoint: Callable) -> Callable:
+    """Wrap an async endpoint so we know when it returned and serialization began"""
+    if not inspect.iscoroutinefunction(endpoint):
+        return endpoint
+
+    @functools.wraps(endpoint)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await endpoint(*args, **kwargs)
+        finally:
+            timing = _current_timing.get()
+            if timing is not None:
+                timing.endpoint_done = time.perf_counter()
+
+    return wrapper
+
+
+class TimedRoute(APIRoute):
+    """APIRoute that records response validation/serialization as a ``serialize`` span"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        super().__init__(path, _timed_endpoint(endpoint), **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def timed_handler(request):
+            response = await handler(request)
+            timing = _current_timing.get()
+            if timing is not None and timing.endpoint_done is not None:
+                serialize_span = Span("serialize", "serialize", timing.endpoint_done)
+                serialize_span.end = time.perf_counter()
+                timing.add_span(serialize_span)
+            return response
+
+        return timed_handler
+
+
+class ServerTimingMiddleware:
+    """ASGI middleware that installs a RequestTiming and emits the Server-Timing header"""
+
+    def __init__(
+        self,
+        app,
+        slow_request_ms: float = 1000.0,
+        slow_request_sink: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ):
+        self.app = app
+        self.slow_request_ms = slow_request_ms
+        self.slow_request_sink = slow_request_sink
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming(scope["method"], scope["path"])
+        token = _current_timing.set(timing)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing.status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", timing.server_timing_header())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timing.finish()
+            _current_timing.reset(token)
+
+        if timing.total_ms >= self.slow_request_ms and self.slow_request_sink is not None:
+            try:
+                await self.slow_request_sink(timing.to_dict())
+            except Exception as e:
+                logger.error(f"Failed to record slow request: {str(e)}")
@@ -1,40 +1,349 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Response, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
-import aiohttp
 import base64
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import hashlib
+from pymongo import ASCENDING, DESCENDING
+from external_integrations.indian_kanoon import KanoonServiceError
+from external_integrations.kanoon_cache import CachedIndianKanoonClient
+from external_integrations.openrouter import AIServiceError, ModelRouter
+from external_integrations.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded
+from case_archive import restore_case
+from compression import CompressionMiddleware
+from idempotency import IdempotencyMiddleware, IdempotencyStore
+from citations import authority_labels, citation_keys, extract_citations, resolve_citations
+from deadline_scheduler import DeadlineScheduler, parse_lead_days
+from llm_scheduler import BACKGROUND, INTERACTIVE, LLMQueueFull, LLMScheduler
+from read_cache import InvalidationBus, ReadCache
+from repository import (
+    CASE_ALERT_FIELDS, CASE_DATE_FIELDS, CASE_SORT_FIELDS, DOCUMENT_LIST_PROJECTION, RESEARCH_COMPRESSED_FIELDS,
+    RESEARCH_SUMMARY_PROJECTION, MongoOptions, Repository, case_after_filter, case_search_query, create_client,
+    is_closed, research_preview, usage_query
+)
+from request_deadline import RequestDeadlineMiddleware, RequestDeadlines, capped_timeout, detached_task
+from request_timing import DbTimingListener, ServerTimingMiddleware, TimedRoute, span
+from storage_codec import FieldCodec
+from token_budget import TokenBudget, cached_prompt_tokens, truncate_to_tokens, usage_counts
+from usage_ledger import UsageLedger
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# MongoDB connection; the client and repository are created during startup (see lifespan)
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+mongo_options = MongoOptions(
+    min_pool_size=int(os.environ.get('MONGO_MIN_POOL_SIZE', '4')),
+    max_pool_size=int(os.environ.get('MONGO_MAX_POOL_SIZE', '100')),
+    server_selection_timeout_ms=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+    connect_timeout_ms=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000')),
+    socket_timeout_ms=int(os.environ['MONGO_SOCKET_TIMEOUT_MS']) if os.environ.get('MONGO_SOCKET_TIMEOUT_MS') else None,
+    compressors=tuple(c.strip() for c in os.environ.get('MONGO_COMPRESSORS', 'zstd,snappy,zlib').split(',') if c.strip()),
+    retry_writes=os.environ.get('MONGO_RETRY_WRITES', 'true').lower() in ('1', 'true', 'yes'),
+)
+client: Optional[AsyncIOMotorClient] = None
+db = None
+repo: Optional[Repository] = None
+
+# Startup: opt-in warm connection to upstream APIs, and per-phase timings (ms)
+WARMUP_UPSTREAMS = os.environ.get('WARMUP_UPSTREAMS', 'false').lower() in ('1', 'true', 'yes')
+STARTUP_PHASE_TIMEOUT_S = float(os.environ.get('STARTUP_PHASE_TIMEOUT_S', '10'))
+startup_timings: Dict[str, float] = {}
 
 # API Keys
 OPENROUTER_API_KEY = os.environ.get('OPENROUTER_API_KEY')
 INDIAN_KANOON_API_KEY = os.environ.get('INDIAN_KANOON_API_KEY')
 
+# Upstream endpoints (overridable so benchmarks can point at local stubs)
+OPENROUTER_BASE_URL = os.environ.get('OPENROUTER_BASE_URL', 'https://openrouter.ai/api/v1')
+INDIAN_KANOON_BASE_URL = os.environ.get('INDIAN_KANOON_BASE_URL', 'https://api.indiankanoon.org')
+
+# AI model routing: ordered fallback list, hedged after the primary's latency percentile
+OPENROUTER_MODELS = [m.strip() for m in os.environ.get('OPENROUTER_MODELS', 'openai/gpt-4o,openai/gpt-4o-mini').split(',') if m.strip()]
+AI_REQUEST_TIMEOUT_S = float(os.environ.get('AI_REQUEST_TIMEOUT_S', '60'))
+AI_HEDGE_PERCENTILE = float(os.environ.get('AI_HEDGE_PERCENTILE', '90'))
+AI_HEDGE_MIN_DELAY_MS = float(os.environ.get('AI_HEDGE_MIN_DELAY_MS', '1000'))
+AI_HEDGE_DEFAULT_DELAY_MS = float(os.environ.get('AI_HEDGE_DEFAULT_DELAY_MS', '10000'))
+
+ai_router = ModelRouter(
+    api_key=OPENROUTER_API_KEY,
+    base_url=OPENROUTER_BASE_URL,
+    models=OPENROUTER_MODELS,
+    headers={
+        "HTTP-Referer": "https://emergent.sh",
+        "X-Title": "Legal AI Research Platform"
+    },
+    timeout_s=AI_REQUEST_TIMEOUT_S,
+    hedge_percentile=AI_HEDGE_PERCENTILE,
+    hedge_min_delay_ms=AI_HEDGE_MIN_DELAY_MS,
+    hedge_default_delay_ms=AI_HEDGE_DEFAULT_DELAY_MS,
+    retry_attempts=int(os.environ.get('AI_RETRY_ATTEMPTS', '2')),
+    breaker=CircuitBreaker(
+        "openrouter",
+        failure_threshold=int(os.environ.get('AI_BREAKER_FAILURES', '5')),
+        reset_timeout_s=float(os.environ.get('AI_BREAKER_RESET_S', '30'))
+    ),
+    timeout_cap=capped_timeout,
+)
+
+# Indian Kanoon: multi-page search and judgment fetches are bounded per request
+KANOON_MAX_PAGES = int(os.environ.get('KANOON_MAX_PAGES', '5'))
+KANOON_MAX_JUDGMENTS = int(os.environ.get('KANOON_MAX_JUDGMENTS', '10'))
+
+# Indian Kanoon client: jittered retries plus a circuit breaker, reading through
+# the local judgment corpus (kanoon_documents / kanoon_searches)
+kanoon_client = CachedIndianKanoonClient(
+    api_key=INDIAN_KANOON_API_KEY,
+    base_url=INDIAN_KANOON_BASE_URL,
+    timeout_s=float(os.environ.get('KANOON_REQUEST_TIMEOUT_S', '15')),
+    retry_attempts=int(os.environ.get('KANOON_RETRY_ATTEMPTS', '3')),
+    breaker=CircuitBreaker(
+        "indian_kanoon",
+        failure_threshold=int(os.environ.get('KANOON_BREAKER_FAILURES', '5')),
+        reset_timeout_s=float(os.environ.get('KANOON_BREAKER_RESET_S', '30'))
+    ),
+    page_concurrency=int(os.environ.get('KANOON_PAGE_CONCURRENCY', '3')),
+    judgment_concurrency=int(os.environ.get('KANOON_JUDGMENT_CONCURRENCY', '4')),
+    document_ttl_s=float(os.environ.get('KANOON_DOCUMENT_TTL_S', str(30 * 86400))),
+    search_ttl_s=float(os.environ.get('KANOON_SEARCH_TTL_S', '86400')),
+    negative_ttl_s=float(os.environ.get('KANOON_NEGATIVE_TTL_S', '86400')),
+    memory_size=int(os.environ.get('KANOON_MEMORY_CACHE_SIZE', '256')),
+    citation_keys=citation_keys,
+    timeout_cap=capped_timeout,
+)
+
+# Prompt token budgets: inputs are trimmed to fit the smallest routed model's window
+token_budget = TokenBudget(
+    OPENROUTER_MODELS,
+    prompt_budget=int(os.environ.get('LLM_PROMPT_BUDGET_TOKENS', '12000'))
+)
+
+# LLM admission control: global and per-firm concurrency, bounded fair queue and an
+# optional request rate (LLM_RATE_PER_S, with bursts of up to LLM_RATE_BURST calls)
+llm_scheduler = LLMScheduler(
+    global_limit=int(os.environ.get('LLM_MAX_CONCURRENCY', '8')),
+    per_firm_limit=int(os.environ.get('LLM_MAX_CONCURRENCY_PER_FIRM', '2')),
+    max_queue=int(os.environ.get('LLM_MAX_QUEUE', '200')),
+    max_queue_per_firm=int(os.environ.get('LLM_MAX_QUEUE_PER_FIRM', '50')),
+    max_wait_s=float(os.environ.get('LLM_MAX_QUEUE_WAIT_S', '30')),
+    rate_per_s=float(os.environ['LLM_RATE_PER_S']) if os.environ.get('LLM_RATE_PER_S') else None,
+    burst=float(os.environ['LLM_RATE_BURST']) if os.environ.get('LLM_RATE_BURST') else None,
+)
+
 # Legacy reference for backward compatibility
 OPENAI_API_KEY = OPENROUTER_API_KEY
 
+# NDJSON streams: tell nginx not to buffer them, so each event reaches the client as it is sent
+STREAM_HEADERS = {"X-Accel-Buffering": "no"}
+
+# Batch research: queries run concurrently per batch; results are saved with one
+# insert_many per flush window (or sooner when the buffer fills). Concurrency is
+# capped at the per-firm LLM limit: extra workers would only queue in the
+# scheduler and come back as 429s once they had waited LLM_MAX_QUEUE_WAIT_S
+RESEARCH_BATCH_MAX_QUERIES = int(os.environ.get('RESEARCH_BATCH_MAX_QUERIES', '50'))
+RESEARCH_BATCH_CONCURRENCY = min(
+    int(os.environ.get('RESEARCH_BATCH_CONCURRENCY', str(llm_scheduler.per_firm_limit))),
+    llm_scheduler.per_firm_limit
+)
+RESEARCH_BATCH_FLUSH_S = float(os.environ.get('RESEARCH_BATCH_FLUSH_S', '2'))
+RESEARCH_BATCH_FLUSH_SIZE = int(os.environ.get('RESEARCH_BATCH_FLUSH_SIZE', '20'))
+RESEARCH_BATCH_SAVE_ATTEMPTS = int(os.environ.get('RESEARCH_BATCH_SAVE_ATTEMPTS', '3'))
+
+# Research results: large fields compressed at rest (zstd, zlib or none), and the
+# projection used by list views instead of whole documents
+research_codec = FieldCodec(
+    RESEARCH_COMPRESSED_FIELDS,
+    algorithm=os.environ.get('RESEARCH_COMPRESSION', 'zlib').lower(),
+    min_bytes=int(os.environ.get('RESEARCH_COMPRESSION_MIN_BYTES', '1024'))
+)
+
+# Hot-read cache for firms, users and case headers; writes invalidate it here and,
+# through the cache_invalidations capped collection, in the other workers
+read_cache = ReadCache(
+    max_entries=int(os.environ.get('READ_CACHE_MAX_ENTRIES', '2048')),
+    ttl_s=float(os.environ.get('READ_CACHE_TTL_S', '60'))
+)
+cache_bus = InvalidationBus(read_cache)
+
+# Case search: filters, date ranges and keyset-paginated sorts (see repository.py)
+CASE_SEARCH_MAX_LIMIT = int(os.environ.get('CASE_SEARCH_MAX_LIMIT', '200'))
+
+# Dashboard statistics: one $facet aggregation per firm, cached briefly and
+# invalidated by case writes
+FIRM_STATS_TTL_S = float(os.environ.get('FIRM_STATS_TTL_S', '30'))
+
+# Deadline alerts: one leader-elected worker turns hearing, filing and limitation
+# dates into case alerts at the configured lead times
+DEADLINE_SCHEDULER_ENABLED = os.environ.get('DEADLINE_SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+deadline_scheduler = DeadlineScheduler(
+    parse_lead_days(os.environ.get('DEADLINE_ALERT_LEAD_DAYS')),
+    lease_ttl_s=float(os.environ.get('DEADLINE_LEASE_TTL_S', '30')),
+    tick_s=float(os.environ.get('DEADLINE_TICK_S', '10')),
+    on_alerts=lambda firms: asyncio.gather(*[invalidate_firm_stats(law_firm_id=firm) for firm in firms]),
+)
+cache_bus.subscribe("case_dates", deadline_scheduler.case_changed)
+
+# LLM usage per firm, user and feature: buffered in memory, flushed in batches to
+# llm_usage plus daily rollups in llm_usage_daily (see usage_ledger.py)
+usage_ledger = UsageLedger(
+    flush_interval_s=float(os.environ.get('LLM_USAGE_FLUSH_S', '5')),
+    flush_size=int(os.environ.get('LLM_USAGE_FLUSH_SIZE', '200')),
+    max_buffer=int(os.environ.get('LLM_USAGE_MAX_BUFFER', '20000'))
+)
+LLM_USAGE_DEFAULT_DAYS = 30
+
+# Response compression: brotli or gzip as negotiated, for bodies of at least
+# COMPRESSION_MIN_BYTES (streamed responses are never compressed)
+COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', '5'))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '4'))
+
+# nginx micro-cache (see nginx.conf), off unless API_MICRO_CACHE_TTL_S > 0: opted-in
+# GETs tell nginx how long it may serve them from cache via X-Accel-Expires
+API_MICRO_CACHE_TTL_S = int(os.environ.get('API_MICRO_CACHE_TTL_S', '0'))
+
+# Document analysis: results are reused for a firm's uploads with identical content,
+# keyed by firm, SHA-256, document type and prompt version (bump it whenever the
+# prompt changes). The prompt names the firm and the file, so analyses are never
+# shared across firms. A copy is kept in the read cache for DOCUMENT_ANALYSIS_CACHE_TTL_S
+DOCUMENT_ANALYSIS_PROMPT_VERSION = "1"
+DOCUMENT_ANALYSIS_CACHE_TTL_S = float(os.environ.get('DOCUMENT_ANALYSIS_CACHE_TTL_S', '300'))
+
+# Research threads: follow-ups send the thread's rolling summary plus the last
+# RESEARCH_THREAD_RECENT_TURNS turns; once RESEARCH_THREAD_SUMMARIZE_BATCH more have
+# accumulated, the older ones are folded into the summary in the background
+RESEARCH_THREAD_RECENT_TURNS = int(os.environ.get('RESEARCH_THREAD_RECENT_TURNS', '2'))
+RESEARCH_THREAD_SUMMARIZE_BATCH = int(os.environ.get('RESEARCH_THREAD_SUMMARIZE_BATCH', '2'))
+RESEARCH_THREAD_ANSWER_TOKENS = int(os.environ.get('RESEARCH_THREAD_ANSWER_TOKENS', '600'))
+# Unsummarized turns kept on the thread if summarization keeps failing
+RESEARCH_THREAD_MAX_RECENT = 4 * (RESEARCH_THREAD_RECENT_TURNS + RESEARCH_THREAD_SUMMARIZE_BATCH)
+RESEARCH_THREAD_SUMMARY_PROMPT = """You maintain the running summary of a legal research conversation about one case, for an AI legal assistant specialized in Indian law.
+Fold the new exchanges into the current summary. Keep the facts of the matter, the questions asked, the conclusions reached and every statute and case cited. Drop pleasantries and repetition.
+Reply with the updated summary only, in at most 300 words."""
+compacting_threads = set()
+
+# Idempotency-Key on expensive POSTs: the first response is stored for
+# IDEMPOTENCY_TTL_S and replayed to duplicates; concurrent duplicates wait up to
+# IDEMPOTENCY_WAIT_S for the original (keep it below the proxy read timeout)
+IDEMPOTENT_PATHS = ("/api/legal-research", "/api/documents/upload", "/api/cases")
+idempotency_store = IdempotencyStore(
+    ttl_s=float(os.environ.get('IDEMPOTENCY_TTL_S', str(24 * 3600))),
+    lock_ttl_s=float(os.environ.get('IDEMPOTENCY_LOCK_TTL_S', '300')),
+    wait_timeout_s=float(os.environ.get('IDEMPOTENCY_WAIT_S', '55'))
+)
+
+# Request deadlines (seconds, 0 disables): the budget caps upstream timeouts and
+# Mongo maxTimeMS, and requests still running when it runs out get a 504. Keep
+# them below the proxy read timeout (nginx.conf) so the backend gives up first;
+# streamed responses only need to keep producing, so they get a long budget
+REQUEST_DEADLINE_S = float(os.environ.get('REQUEST_DEADLINE_S', '15'))
+REQUEST_DEADLINE_AI_S = float(os.environ.get('REQUEST_DEADLINE_AI_S', '55'))
+REQUEST_DEADLINE_STREAM_S = float(os.environ.get('REQUEST_DEADLINE_STREAM_S', '600'))
+request_deadlines = RequestDeadlines(
+    default_s=REQUEST_DEADLINE_S,
+    routes=[
+        ("POST", "/api/legal-research", REQUEST_DEADLINE_AI_S),
+        ("POST", "/api/documents/upload", REQUEST_DEADLINE_AI_S),
+        ("POST", "/api/legal-research/batch", REQUEST_DEADLINE_STREAM_S),
+        ("POST", "/api/kanoon-search/stream", REQUEST_DEADLINE_STREAM_S),
+    ]
+)
+
+# Fire-and-forget tasks (e.g. final flushes), referenced until they finish
+background_tasks = set()
+
+def spawn_background(coro):
+    """Start ``coro`` outside the request's deadline, keeping a reference until it finishes"""
+    task = detached_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+# Readiness probe: how long /api/ready waits on Mongo before reporting not ready
+READINESS_TIMEOUT_S = float(os.environ.get('READINESS_TIMEOUT_S', '2'))
+
+# Request timing: requests slower than this are written to the capped slow_requests collection
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '1000'))
+SLOW_REQUESTS_CAP_BYTES = int(os.environ.get('SLOW_REQUESTS_CAP_BYTES', str(16 * 1024 * 1024)))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Explicit startup: connect and warm Mongo, apply indexes, open HTTP pools"""
+    global client, db, repo
+    startup_started = time.perf_counter()
+    startup_timings["import"] = round((startup_started - _IMPORT_STARTED) * 1000, 1)
+
+    async def phase(name: str, coro):
+        # A failed phase is logged but does not block startup; /api/ready reports the outcome
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(coro, timeout=STARTUP_PHASE_TIMEOUT_S)
+        except Exception as e:
+            logger.error(f"Startup phase {name} failed: {str(e) or type(e).__name__}")
+        finally:
+            startup_timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    # Benchmarks and tests may inject their own client before startup
+    if client is None:
+        client = create_client(mongo_url, mongo_options, event_listeners=[DbTimingListener()])
+        db = client[os.environ['DB_NAME']]
+    repo = Repository(db, research_codec)
+    kanoon_client.attach_store(db.kanoon_documents, db.kanoon_searches)
+    idempotency_store.attach(db.idempotency_keys)
+
+    async def open_http_pools():
+        # Touching the sessions creates them, bound to the serving event loop
+        ai_router.session
+        kanoon_client.session
+        if WARMUP_UPSTREAMS:
+            await asyncio.gather(ai_router.warm_up(), kanoon_client.warm_up())
+
+    # Phases are independent, so run them concurrently
+    await asyncio.gather(
+        phase("mongo_ping", repo.ping()),
+        phase("indexes", repo.ensure_indexes()),
+        phase("slow_requests_collection", repo.create_capped_collection("slow_requests", SLOW_REQUESTS_CAP_BYTES)),
+        phase("http_pools", open_http_pools()),
+        phase("tokenizer", asyncio.to_thread(token_budget.warm_up)),
+        phase("cache_bus", cache_bus.start(db)),
+        phase("usage_ledger", usage_ledger.start(db)),
+        *([phase("deadline_scheduler", deadline_scheduler.start(db))] if DEADLINE_SCHEDULER_ENABLED else []),
+    )
+    startup_timings["total"] = round((time.perf_counter() - startup_started) * 1000, 1)
+    logger.info(f"Startup complete: {json.dumps(startup_timings)}")
+
+    yield
+
+    await deadline_scheduler.stop()
+    await cache_bus.stop()
+    await usage_ledger.stop()
+    client.close()
+    await ai_router.close()
+    await kanoon_client.close()
+
+async def micro_cache(response: Response):
+    """Route dependency: let nginx cache successful responses for a few seconds"""
+    if API_MICRO_CACHE_TTL_S > 0:
+        response.headers["X-Accel-Expires"] = str(API_MICRO_CACHE_TTL_S)
+
 # Create the main app without a prefix
-app = FastAPI(title="AI Legal Research Platform", version="1.0.0")
+app = FastAPI(title="AI Legal Research Platform", version="1.0.0", lifespan=lifespan)
 
 # Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", route_class=TimedRoute)
 
 # Pydantic Models
 class LawFirm(BaseModel):
@@ -62,6 +371,7 @@ class CaseAlert(BaseModel):
     due_date: datetime
     priority: str = "medium"  # low, medium, high, urgent
     is_read: bool = False
+    source_key: Optional[str] = None  # Set on alerts generated from case dates
 
 class CaseTask(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -132,6 +442,7 @@ class Case(BaseModel):
     
     # Status tracking
     status: str = "active"  # active, closed, dropped, on_hold
+    closed_at: Optional[datetime] = None  # Starts the archival clock (case_archive.py)
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
     last_activity: Optional[datetime] = None
@@ -145,6 +456,9 @@ class LegalDocument(BaseModel):
     content: str  # base64 encoded document content
     ai_summary: Optional[str] = None
     key_points: Optional[List[str]] = None
+    analysis_status: str = "completed"  # completed, unavailable
+    analysis_cached: bool = False  # ai_summary reused from an earlier upload of the same content
+    content_sha256: Optional[str] = None
     uploaded_by: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -153,16 +467,54 @@ class ResearchQuery(BaseModel):
     law_firm_id: str
     case_id: Optional[str] = None
     user_id: str
+    kanoon_pages: int = 1  # Indian Kanoon result pages fetched concurrently
+    thread_id: Optional[str] = None  # Follow-up in a research thread
+
+class ResearchThreadCreate(BaseModel):
+    law_firm_id: str
+    case_id: str
+    user_id: str
+    title: Optional[str] = None
+
+class ResearchBatchRequest(BaseModel):
+    queries: List[str]
+    law_firm_id: str
+    case_id: str
+    user_id: str
+    kanoon_pages: int = 1
+    concurrency: Optional[int] = None  # Capped at RESEARCH_BATCH_CONCURRENCY
+
+class KanoonSearchRequest(BaseModel):
+    query: str
+    pages: int = 1
+    judgments: int = 0  # Fetch full text and fragments for this many top hits
 
 class ResearchResult(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     query: str
     ai_response: str
+    kanoon_status: str = "ok"  # ok, unavailable
     indian_kanoon_results: Optional[List[dict]] = None
     relevant_cases: Optional[List[str]] = None
     legal_authorities: Optional[List[str]] = None
+    citations: Optional[List[dict]] = None  # Case and statute citations parsed from ai_response
+    thread_id: Optional[str] = None
+    turn: Optional[int] = None  # Position in the research thread
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ResearchThread(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    law_firm_id: str
+    case_id: str
+    user_id: str
+    title: Optional[str] = None
+    summary: str = ""  # Rolling summary of turns 1..summarized_turns
+    summarized_turns: int = 0
+    turn_count: int = 0
+    recent_turns: List[dict] = []  # Turns not yet summarized, answers trimmed
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
 # Create Models
 class LawFirmCreate(BaseModel):
     name: str
@@ -237,105 +589,95 @@ class TimeEntryCreate(BaseModel):
     billable: bool = True
 
 # AI Legal Assistant with OpenRouter
-async def get_ai_legal_response(query: str, context: str = "", session_id: str = None) -> str:
-    """Get AI response for legal queries using OpenRouter"""
-    try:
-        if not session_id:
-            session_id = str(uuid.uuid4())
-            
-        # Check if API key is available
-        if not OPENROUTER_API_KEY:
-            return "Error: OpenRouter API key not configured"
-            
-        system_message = """You are an expert AI legal assistant specialized in Indian law. 
-        You help legal associates with research, case analysis, and legal reasoning.
-        
-        Key guidelines:
-        1. Provide accurate, well-researched legal analysis
-        2. Cite relevant Indian statutes, case law, and legal principles
-        3. Structure responses with clear headings and bullet points
-        4. Always mention when additional research or professional consultation is needed
-        5. Focus on practical legal implications and strategies
-        6. Use proper legal terminology and citation format
-        
-        Remember: You assist with legal research but cannot provide specific legal advice."""
-        
-        # Use OpenRouter endpoint directly with aiohttp
-        async with aiohttp.ClientSession() as session:
-            headers = {
-                "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-                "Content-Type": "application/json",
-                "HTTP-Referer": "https://emergent.sh",
-                "X-Title": "Legal AI Research Platform"
-            }
-            
-            payload = {
-                "model": "openai/gpt-4o",
-                "messages": [
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": f"Legal Research Query: {query}" + (f"\n\nAdditional Context: {context}" if context else "")}
-                ],
-                "max_tokens": 2000,
-                "temperature": 0.7
-            }
-            
-            async with session.post(
-                "https://openrouter.ai/api/v1/chat/completions",
-                headers=headers,
-                json=payload
-            ) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data["choices"][0]["message"]["content"]
-                else:
-                    error_text = await response.text()
-                    logger.error(f"OpenRouter API error: {response.status} - {error_text}")
-                    return f"AI Service Error: OpenRouter API returned status {response.status}. Please check your API key and credits."
-        
-    except Exception as e:
-        logger.error(f"Error getting AI response from OpenRouter: {str(e)}")
-        error_msg = str(e)
-        if "authentication" in error_msg.lower() or "api_key" in error_msg.lower():
-            return f"AI Service Authentication Error: Please verify the OpenRouter API key is valid and has sufficient credits. Error: {error_msg}"
-        return f"AI Service Error: {error_msg}"
+async def get_ai_legal_response(
+    query: str,
+    context: str = "",
+    session_id: str = None,
+    law_firm_id: Optional[str] = None,
+    priority: int = INTERACTIVE,
+    request_type: str = "research",
+    user_id: Optional[str] = None,
+    case_id: Optional[str] = None,
+    history: Optional[List[dict]] = None,
+    system_message: Optional[str] = None
+) -> str:
+    """Get AI response for legal queries using OpenRouter.
 
-# Indian Kanoon Search Integration
-async def search_indian_kanoon(query: str, max_results: int = 10) -> List[dict]:
-    """Search Indian Kanoon database for relevant cases"""
-    try:
-        # Indian Kanoon API endpoint
-        url = "https://api.indiankanoon.org/search/"
+    Calls are admitted through the LLM scheduler; when it is saturated a 429
+    with Retry-After is raised instead of piling more load onto OpenRouter.
+    Upstream failures raise AIServiceError, or CircuitOpenError while the
+    OpenRouter breaker is open, so error text never masquerades as an answer.
+    The prompt is trimmed to the token budget and ``max_tokens`` follows
+    ``request_type``. Token usage and latency go to the usage ledger, attributed
+    to the firm, user and ``request_type``. ``history`` holds earlier turns of a
+    research thread; the system prompt stays first and unchanged so providers
+    can reuse their cached prefix.
+    """
+    if not session_id:
+        session_id = str(uuid.uuid4())
         
-        params = {
-            'formInput': query,
-            'pagenum': 0,
-            'API_KEY': INDIAN_KANOON_API_KEY
-        }
+    # Check if API key is available
+    if not OPENROUTER_API_KEY:
+        raise AIServiceError("OpenRouter API key not configured")
         
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    # Process and format the results
-                    results = []
-                    if 'docs' in data:
-                        for doc in data['docs'][:max_results]:
-                            results.append({
-                                'title': doc.get('title', 'Unknown Case'),
-                                'court': doc.get('court', 'Unknown Court'),
-                                'date': doc.get('date', 'Unknown Date'),
-                                'citation': doc.get('citation', ''),
-                                'summary': doc.get('summary', ''),
-                                'url': f"https://indiankanoon.org/doc/{doc.get('tid', '')}"
-                            })
-                    return results
-                else:
-                    logger.error(f"Indian Kanoon API error: {response.status}")
-                    return []
-                    
-    except Exception as e:
-        logger.error(f"Error searching Indian Kanoon: {str(e)}")
-        return []
+    system_message = system_message or """You are an expert AI legal assistant specialized in Indian law. 
+    You help legal associates with research, case analysis, and legal reasoning.
+    
+    Key guidelines:
+    1. Provide accurate, well-researched legal analysis
+    2. Cite relevant Indian statutes, case law, and legal principles
+    3. Structure responses with clear headings and bullet points
+    4. Always mention when additional research or professional consultation is needed
+    5. Focus on practical legal implications and strategies
+    6. Use proper legal terminology and citation format
+    
+    Remember: You assist with legal research but cannot provide specific legal advice."""
+    
+    messages, max_tokens, prompt_tokens = token_budget.build_messages(system_message, query, context, request_type, history)
+    
+    try:
+        # Wait for a scheduler slot, then route through the model fallback list
+        async with llm_scheduler.slot(law_firm_id, priority):
+            with span("llm") as llm_span:
+                completion = await ai_router.complete(messages, max_tokens=max_tokens, temperature=0.7)
+                prompt_tokens, completion_tokens = usage_counts(completion, prompt_tokens)
+                token_budget.record(request_type, completion["model"], prompt_tokens, completion_tokens)
+                usage_ledger.record(
+                    law_firm_id, request_type, completion["model"], prompt_tokens, completion_tokens,
+                    completion["latency_ms"], user_id=user_id, case_id=case_id,
+                    cached_tokens=cached_prompt_tokens(completion)
+                )
+                if llm_span is not None:
+                    llm_span.meta.update(model=completion["model"], prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    except LLMQueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{str(e)}. Please retry shortly.",
+            headers={"Retry-After": str(int(e.retry_after))}
+        )
+    except AIServiceError as e:
+        logger.error(f"OpenRouter request failed on all models: {str(e)}")
+        raise
+    return completion["content"]
+
+def ai_unavailable_error(error: Exception) -> HTTPException:
+    """503 for a failed or short-circuited AI call, with Retry-After when known"""
+    headers = None
+    if isinstance(error, CircuitOpenError):
+        headers = {"Retry-After": str(max(1, int(error.retry_after)))}
+    return HTTPException(status_code=503, detail=f"AI service unavailable: {str(error)}", headers=headers)
+
+# Indian Kanoon Search Integration
+async def search_indian_kanoon(query: str, max_results: int = 10, pages: int = 1) -> List[dict]:
+    """Search Indian Kanoon database for relevant cases.
+
+    With ``pages`` > 1 the pages are fetched concurrently and de-duplicated.
+    Transient failures are retried; a persistent failure raises
+    KanoonServiceError and an open breaker raises CircuitOpenError.
+    """
+    pages = max(1, min(pages, KANOON_MAX_PAGES))
+    with span("kanoon", name="kanoon search", pages=pages):
+        return await kanoon_client.search(query, max_results=max_results * pages, pages=pages)
 
 # API Routes
 
@@ -344,12 +686,13 @@ async def search_indian_kanoon(query: str, max_results: int = 10) -> List[dict]:
 async def create_law_firm(firm: LawFirmCreate):
     firm_dict = firm.dict()
     firm_obj = LawFirm(**firm_dict)
-    await db.law_firms.insert_one(firm_obj.dict())
+    await repo.insert_firm(firm_obj.dict())
+    await cache_bus.publish("law_firms", "all")
     return firm_obj
 
 @api_router.get("/law-firms", response_model=List[LawFirm])
 async def get_law_firms():
-    firms = await db.law_firms.find().to_list(1000)
+    firms = await read_cache.get_or_load("law_firms", "all", repo.list_firms)
     return [LawFirm(**firm) for firm in firms]
 
 # User Management
@@ -357,81 +700,172 @@ async def get_law_firms():
 async def create_user(user: UserCreate):
     user_dict = user.dict()
     user_obj = User(**user_dict)
-    await db.users.insert_one(user_obj.dict())
+    await repo.insert_user(user_obj.dict())
+    await cache_bus.publish("users", user_obj.law_firm_id)
     return user_obj
 
 @api_router.get("/users/{law_firm_id}", response_model=List[User])
 async def get_users_by_firm(law_firm_id: str):
-    users = await db.users.find({"law_firm_id": law_firm_id}).to_list(1000)
+    users = await read_cache.get_or_load("users", law_firm_id, lambda: repo.list_users(law_firm_id))
     return [User(**user) for user in users]
 
+async def get_case_header(case_id: str) -> Optional[dict]:
+    """Identifying fields of a case (firm, number, title, stage...), cached; archived cases too"""
+    return await read_cache.get_or_load("case_header", case_id, lambda: repo.case_header(case_id))
+
 # Enhanced Case Management APIs
 
 @api_router.post("/cases", response_model=Case)
 async def create_case(case: CaseCreate):
     case_dict = case.dict()
     case_obj = Case(**case_dict)
-    await db.cases.insert_one(case_obj.dict())
+    await repo.insert_case(case_obj.dict())
+    await invalidate_firm_stats(law_firm_id=case_obj.law_firm_id)
+    if any(getattr(case_obj, field) for field in CASE_ALERT_FIELDS):
+        await cache_bus.publish("case_dates", case_obj.id)
     return case_obj
 
-@api_router.get("/cases/{law_firm_id}")
+async def invalidate_firm_stats(case_id: Optional[str] = None, law_firm_id: Optional[str] = None):
+    """Drop a firm's cached dashboard stats after a case write"""
+    if law_firm_id is None:
+        header = await get_case_header(case_id)
+        law_firm_id = header["law_firm_id"] if header else None
+    if law_firm_id:
+        await cache_bus.publish("firm_stats", law_firm_id)
+
+@api_router.get("/cases/{law_firm_id}/stats", dependencies=[Depends(micro_cache)])
+async def get_firm_stats(law_firm_id: str):
+    """Dashboard tiles for a firm, from one aggregation and cached for FIRM_STATS_TTL_S"""
+    try:
+        return await read_cache.get_or_load(
+            "firm_stats", law_firm_id, lambda: repo.firm_stats(law_firm_id), ttl_s=FIRM_STATS_TTL_S
+        )
+    except Exception as e:
+        logger.error(f"Error computing firm stats: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute firm stats: {str(e)}")
+
+async def attach_case_counts(cases: List[dict]):
+    """Fill document, research, alert and task counts for a page of cases"""
+    doc_counts, research_counts = await repo.case_record_counts([case["id"] for case in cases])
+
+    for case in cases:
+        case["documents_count"] = doc_counts.get(case["id"], 0)
+        case["research_count"] = research_counts.get(case["id"], 0)
+        case["active_alerts_count"] = len([alert for alert in case.get("alerts") or [] if not alert.get("is_read", False)])
+        case["pending_tasks_count"] = len([task for task in case.get("tasks") or [] if task.get("status") != "completed"])
+
+def encode_case_cursor(case: dict, sort: str) -> str:
+    value = case.get(sort)
+    payload = [value.isoformat() if value is not None else None, case["id"]]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+def case_cursor_filter(cursor: str, sort: str, descending: bool) -> dict:
+    """Cases strictly after ``cursor`` in (sort, id) order; nulls sort lowest"""
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        value = datetime.fromisoformat(value) if value is not None else None
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return case_after_filter(sort, value, last_id, descending)
+
+@api_router.get("/cases/{law_firm_id}", dependencies=[Depends(micro_cache)])
 async def get_cases_by_firm(law_firm_id: str):
     try:
-        cases = await db.cases.find({"law_firm_id": law_firm_id}).sort("updated_at", -1).to_list(1000)
-        
-        # Update counts for each case
-        for case in cases:
-            if "_id" in case:
-                case["_id"] = str(case["_id"])
-            
-            # Count documents
-            doc_count = await db.legal_documents.count_documents({"case_id": case["id"]})
-            case["documents_count"] = doc_count
-            
-            # Count research
-            research_count = await db.research_results.count_documents({"case_id": case["id"]})
-            case["research_count"] = research_count
-            
-            # Count active alerts
-            if "alerts" in case and case["alerts"]:
-                active_alerts = len([alert for alert in case["alerts"] if not alert.get("is_read", False)])
-                case["active_alerts_count"] = active_alerts
-            else:
-                case["active_alerts_count"] = 0
-            
-            # Count pending tasks
-            if "tasks" in case and case["tasks"]:
-                pending_tasks = len([task for task in case["tasks"] if task.get("status") != "completed"])
-                case["pending_tasks_count"] = pending_tasks
-            else:
-                case["pending_tasks_count"] = 0
+        cases = await repo.list_cases(law_firm_id)
+        await attach_case_counts(cases)
         
         return cases
     except Exception as e:
         logger.error(f"Error fetching cases: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch cases: {str(e)}")
 
+@api_router.get("/cases/{law_firm_id}/search", dependencies=[Depends(micro_cache)])
+async def search_cases(
+    law_firm_id: str,
+    q: Optional[str] = None,
+    case_number: Optional[str] = None,
+    stage: Optional[List[str]] = Query(None),
+    status: Optional[List[str]] = Query(None),
+    priority: Optional[List[str]] = Query(None),
+    case_type: Optional[List[str]] = Query(None),
+    assigned_attorney: Optional[List[str]] = Query(None),
+    court_jurisdiction: Optional[List[str]] = Query(None),
+    date_field: str = "updated_at",
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    sort: Optional[str] = None,
+    order: str = "desc",
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+):
+    """Filtered, sorted page of a firm's cases.
+
+    ``q`` is a full-text search over title, case number and client name.
+    Pages follow ``next_cursor``; ``sort=relevance`` (the default with ``q``)
+    returns only the best ``limit`` matches.
+    """
+    try:
+        sort = sort or ("relevance" if q else "updated_at")
+        if sort not in CASE_SORT_FIELDS and not (sort == "relevance" and q):
+            raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(CASE_SORT_FIELDS)}, or relevance with q")
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail="order must be 'asc' or 'desc'")
+        if date_field not in CASE_DATE_FIELDS:
+            raise HTTPException(status_code=400, detail=f"date_field must be one of {', '.join(CASE_DATE_FIELDS)}")
+        limit = max(1, min(limit, CASE_SEARCH_MAX_LIMIT))
+
+        filters = {
+            "stage": stage, "status": status, "priority": priority, "case_type": case_type,
+            "assigned_attorney": assigned_attorney, "court_jurisdiction": court_jurisdiction,
+        }
+        query = case_search_query(law_firm_id, filters, case_number, date_field, date_from, date_to, text=q)
+        total = await repo.count_cases(query) if include_total else None
+
+        if sort == "relevance":
+            sort_spec = [("score", {"$meta": "textScore"})]
+        else:
+            direction = DESCENDING if order == "desc" else ASCENDING
+            sort_spec = [(sort, direction), ("id", direction)]
+            if cursor:
+                query.update(case_cursor_filter(cursor, sort, order == "desc"))
+
+        # One extra row tells us whether there is another page
+        cases = await repo.search_cases(query, sort_spec, limit + 1, with_score=sort == "relevance")
+        has_more = len(cases) > limit
+        cases = cases[:limit]
+        await attach_case_counts(cases)
+        for case in cases:
+            case.pop("alerts", None)
+            case.pop("tasks", None)
+
+        next_cursor = None
+        if has_more and sort != "relevance":
+            next_cursor = encode_case_cursor(cases[-1], sort)
+        response = {"cases": cases, "next_cursor": next_cursor}
+        if include_total:
+            response["total"] = total
+        return response
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching cases: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to search cases: {str(e)}")
+
 @api_router.get("/cases/detail/{case_id}")
 async def get_case_detail(case_id: str):
     try:
-        case = await db.cases.find_one({"id": case_id})
+        case, archived = await repo.get_case(case_id)
         if not case:
             raise HTTPException(status_code=404, detail="Case not found")
         
-        if "_id" in case:
-            case["_id"] = str(case["_id"])
-        
-        # Get related documents
-        documents = await db.legal_documents.find(
-            {"case_id": case_id}, 
-            {"content": 0}  # Exclude large content
-        ).to_list(100)
-        
-        # Get related research
-        research = await db.research_results.find({"case_id": case_id}).to_list(100)
-        
-        case["documents"] = documents
-        case["research_history"] = research
+        # Documents without their large content; research as summaries (full results via /research/{id}).
+        # Archived cases keep their records in the cold collections, newer ones may still be hot
+        case["documents"], case["research_history"] = await asyncio.gather(
+            repo.case_records("legal_documents", case_id, DOCUMENT_LIST_PROJECTION, include_archive=archived),
+            repo.case_records("research_results", case_id, RESEARCH_SUMMARY_PROJECTION, include_archive=archived),
+        )
+        case["archived"] = archived
         
         return case
     except HTTPException:
@@ -444,12 +878,13 @@ async def get_case_detail(case_id: str):
 async def update_case(case_id: str, case_update: CaseUpdate):
     try:
         update_data = {k: v for k, v in case_update.dict().items() if v is not None}
-        update_data['updated_at'] = datetime.utcnow()
-        update_data['last_activity'] = datetime.utcnow()
         
-        result = await db.cases.update_one({"id": case_id}, {"$set": update_data})
-        if result.matched_count == 0:
+        if not await repo.update_case(case_id, update_data):
             raise HTTPException(status_code=404, detail="Case not found")
+        await cache_bus.publish("case_header", case_id)
+        await invalidate_firm_stats(case_id)
+        if any(field in update_data for field in CASE_ALERT_FIELDS) or is_closed(update_data):
+            await cache_bus.publish("case_dates", case_id)
         return {"message": "Case updated successfully"}
     except HTTPException:
         raise
@@ -462,36 +897,56 @@ async def update_case_stage(case_id: str, stage_data: dict):
     try:
         update_data = {
             "stage": stage_data.get("stage"),
-            "sub_stage": stage_data.get("sub_stage"),
-            "updated_at": datetime.utcnow(),
-            "last_activity": datetime.utcnow()
+            "sub_stage": stage_data.get("sub_stage")
         }
         
-        result = await db.cases.update_one({"id": case_id}, {"$set": update_data})
-        if result.matched_count == 0:
+        if not await repo.update_case(case_id, update_data):
             raise HTTPException(status_code=404, detail="Case not found")
+        await cache_bus.publish("case_header", case_id)
+        await invalidate_firm_stats(case_id)
         return {"message": "Case stage updated successfully"}
     except Exception as e:
         logger.error(f"Error updating case stage: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update case stage: {str(e)}")
 
+# Archived Cases
+@api_router.get("/cases/{law_firm_id}/archived", dependencies=[Depends(micro_cache)])
+async def get_archived_cases(law_firm_id: str, limit: int = 50, skip: int = 0):
+    """Archived cases of a firm, most recently archived first"""
+    try:
+        limit = max(1, min(limit, CASE_SEARCH_MAX_LIMIT))
+        return await repo.archived_cases(law_firm_id, limit, skip=max(0, skip))
+    except Exception as e:
+        logger.error(f"Error fetching archived cases: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch archived cases: {str(e)}")
+
+@api_router.post("/cases/{case_id}/restore")
+async def restore_archived_case(case_id: str):
+    """Move an archived case, its research and documents back to the working set"""
+    try:
+        case = await restore_case(repo.db, case_id)
+        if case is None:
+            raise HTTPException(status_code=404, detail="Archived case not found")
+        await cache_bus.publish("case_header", case_id)
+        await cache_bus.publish("case_dates", case_id)
+        await invalidate_firm_stats(law_firm_id=case["law_firm_id"])
+        return {"message": "Case restored successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error restoring case: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to restore case: {str(e)}")
+
 # Task Management
 @api_router.post("/cases/{case_id}/tasks")
 async def add_case_task(case_id: str, task: TaskCreate):
     try:
         task_obj = CaseTask(**task.dict())
         
-        result = await db.cases.update_one(
-            {"id": case_id},
-            {
-                "$push": {"tasks": task_obj.dict()},
-                "$set": {"updated_at": datetime.utcnow(), "last_activity": datetime.utcnow()}
-            }
-        )
-        
-        if result.matched_count == 0:
+        if not await repo.push_case_item(case_id, "tasks", task_obj.dict()):
             raise HTTPException(status_code=404, detail="Case not found")
         
+        await invalidate_firm_stats(case_id)
         return {"message": "Task added successfully", "task_id": task_obj.id}
     except Exception as e:
         logger.error(f"Error adding task: {str(e)}")
@@ -500,20 +955,10 @@ async def add_case_task(case_id: str, task: TaskCreate):
 @api_router.put("/cases/{case_id}/tasks/{task_id}")
 async def update_case_task(case_id: str, task_id: str, status: str):
     try:
-        result = await db.cases.update_one(
-            {"id": case_id, "tasks.id": task_id},
-            {
-                "$set": {
-                    "tasks.$.status": status,
-                    "updated_at": datetime.utcnow(),
-                    "last_activity": datetime.utcnow()
-                }
-            }
-        )
-        
-        if result.matched_count == 0:
+        if not await repo.update_case_item(case_id, "tasks", task_id, {"status": status}):
             raise HTTPException(status_code=404, detail="Case or task not found")
         
+        await invalidate_firm_stats(case_id)
         return {"message": "Task updated successfully"}
     except Exception as e:
         logger.error(f"Error updating task: {str(e)}")
@@ -525,15 +970,7 @@ async def add_case_note(case_id: str, note: NoteCreate):
     try:
         note_obj = CaseNote(**note.dict())
         
-        result = await db.cases.update_one(
-            {"id": case_id},
-            {
-                "$push": {"notes": note_obj.dict()},
-                "$set": {"updated_at": datetime.utcnow(), "last_activity": datetime.utcnow()}
-            }
-        )
-        
-        if result.matched_count == 0:
+        if not await repo.push_case_item(case_id, "notes", note_obj.dict()):
             raise HTTPException(status_code=404, detail="Case not found")
         
         return {"message": "Note added successfully", "note_id": note_obj.id}
@@ -547,17 +984,10 @@ async def add_case_alert(case_id: str, alert: AlertCreate):
     try:
         alert_obj = CaseAlert(**alert.dict())
         
-        result = await db.cases.update_one(
-            {"id": case_id},
-            {
-                "$push": {"alerts": alert_obj.dict()},
-                "$set": {"updated_at": datetime.utcnow(), "last_activity": datetime.utcnow()}
-            }
-        )
-        
-        if result.matched_count == 0:
+        if not await repo.push_case_item(case_id, "alerts", alert_obj.dict()):
             raise HTTPException(status_code=404, detail="Case not found")
         
+        await invalidate_firm_stats(case_id)
         return {"message": "Alert added successfully", "alert_id": alert_obj.id}
     except Exception as e:
         logger.error(f"Error adding alert: {str(e)}")
@@ -566,19 +996,10 @@ async def add_case_alert(case_id: str, alert: AlertCreate):
 @api_router.put("/cases/{case_id}/alerts/{alert_id}/read")
 async def mark_alert_read(case_id: str, alert_id: str):
     try:
-        result = await db.cases.update_one(
-            {"id": case_id, "alerts.id": alert_id},
-            {
-                "$set": {
-                    "alerts.$.is_read": True,
-                    "updated_at": datetime.utcnow()
-                }
-            }
-        )
-        
-        if result.matched_count == 0:
+        if not await repo.update_case_item(case_id, "alerts", alert_id, {"is_read": True}, activity=False):
             raise HTTPException(status_code=404, detail="Case or alert not found")
         
+        await invalidate_firm_stats(case_id)
         return {"message": "Alert marked as read"}
     except Exception as e:
         logger.error(f"Error marking alert as read: {str(e)}")
@@ -590,60 +1011,290 @@ async def add_time_entry(case_id: str, time_entry: TimeEntryCreate):
     try:
         time_obj = CaseTimeEntry(**time_entry.dict())
         
-        result = await db.cases.update_one(
-            {"id": case_id},
-            {
-                "$push": {"time_entries": time_obj.dict()},
-                "$set": {"updated_at": datetime.utcnow(), "last_activity": datetime.utcnow()}
-            }
-        )
-        
-        if result.matched_count == 0:
+        if not await repo.push_case_item(case_id, "time_entries", time_obj.dict()):
             raise HTTPException(status_code=404, detail="Case not found")
         
+        await invalidate_firm_stats(case_id)
         return {"message": "Time entry added successfully", "entry_id": time_obj.id}
     except Exception as e:
         logger.error(f"Error adding time entry: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to add time entry: {str(e)}")
 
 # Legal Research - The Core AI Feature
+async def run_legal_research(research: ResearchQuery, priority: int = INTERACTIVE, history: Optional[List[dict]] = None) -> ResearchResult:
+    """AI analysis plus Kanoon search and citations for one query, not yet saved.
+
+    ``history`` carries the earlier turns of a research thread (see thread_history).
+
+    Raises AIServiceError or CircuitOpenError when the AI is unavailable, and
+    HTTPException(429) when the LLM scheduler is saturated.
+    """
+    # Get AI analysis; without it there is no research result to return
+    session_id = f"legal_research_{research.law_firm_id}_{uuid.uuid4()}"
+    ai_response = await get_ai_legal_response(
+        research.query, 
+        context=f"Law firm context for legal research",
+        session_id=session_id,
+        law_firm_id=research.law_firm_id,
+        priority=priority,
+        user_id=research.user_id,
+        case_id=research.case_id,
+        history=history
+    )
+    
+    # Search Indian Kanoon for relevant cases, degrading to AI-only results
+    kanoon_status = "ok"
+    try:
+        kanoon_results = await search_indian_kanoon(research.query, pages=research.kanoon_pages)
+    except (KanoonServiceError, CircuitOpenError) as e:
+        logger.error(f"Indian Kanoon unavailable for research: {str(e)}")
+        kanoon_results = []
+        kanoon_status = "unavailable"
+    
+    # Create research result
+    result = ResearchResult(
+        query=research.query,
+        ai_response=ai_response,
+        kanoon_status=kanoon_status,
+        indian_kanoon_results=kanoon_results,
+        relevant_cases=[case.get('title', '') for case in kanoon_results[:5]],
+        legal_authorities=[case.get('citation', '') for case in kanoon_results[:5] if case.get('citation')]
+    )
+    
+    # Authorities cited in the answer itself, resolved against the Kanoon hits and corpus
+    try:
+        [citations] = await resolve_citations(
+            [extract_citations(ai_response)], repo.db.kanoon_documents, local_results=kanoon_results
+        )
+        result.citations = citations
+        result.legal_authorities = list(dict.fromkeys(result.legal_authorities + authority_labels(citations)))
+    except Exception as e:
+        logger.error(f"Citation resolution failed: {str(e)}")
+    
+    return result
+
+def research_record(result: ResearchResult, law_firm_id: str, user_id: str, case_id: Optional[str]) -> dict:
+    """Document stored for a research result, with a preview for list views"""
+    return {
+        **result.dict(),
+        "ai_preview": research_preview(result.ai_response),
+        "law_firm_id": law_firm_id,
+        "user_id": user_id,
+        "case_id": case_id
+    }
+
+def thread_history(thread: dict) -> List[dict]:
+    """The thread's summary and unsummarized turns as chat messages, oldest first"""
+    history = []
+    if thread.get("summary"):
+        history.append({"role": "system", "content": f"Summary of the earlier research in this thread:\n{thread['summary']}"})
+    for turn in thread.get("recent_turns", []):
+        if turn["turn"] > thread.get("summarized_turns", 0):
+            history.append({"role": "user", "content": turn["query"]})
+            history.append({"role": "assistant", "content": turn["answer"]})
+    return history
+
+async def record_thread_turn(thread: dict, result: ResearchResult) -> Optional[int]:
+    """Append a turn (answer trimmed) and compact the thread once enough turns piled up"""
+    answer = truncate_to_tokens(result.ai_response, RESEARCH_THREAD_ANSWER_TOKENS, token_budget.count_model)
+    turn = await repo.append_research_turn(
+        thread["id"],
+        {"research_id": result.id, "query": result.query, "answer": answer, "created_at": result.created_at},
+        keep=RESEARCH_THREAD_MAX_RECENT
+    )
+    if turn is not None and turn - thread.get("summarized_turns", 0) >= RESEARCH_THREAD_RECENT_TURNS + RESEARCH_THREAD_SUMMARIZE_BATCH:
+        if thread["id"] not in compacting_threads:
+            compacting_threads.add(thread["id"])
+            spawn_background(compact_research_thread(thread["id"]))
+    return turn
+
+async def compact_research_thread(thread_id: str):
+    """Fold the turns before the last RESEARCH_THREAD_RECENT_TURNS into the rolling summary"""
+    try:
+        thread = await repo.get_research_thread(thread_id)
+        if thread is None:
+            return
+        summarized = thread.get("summarized_turns", 0)
+        through = thread["turn_count"] - RESEARCH_THREAD_RECENT_TURNS
+        turns = [turn for turn in thread.get("recent_turns", []) if summarized < turn["turn"] <= through]
+        if not turns:
+            return
+        exchanges = "\n\n".join(f"Q{turn['turn']}: {turn['query']}\nA{turn['turn']}: {turn['answer']}" for turn in turns)
+        summary = await get_ai_legal_response(
+            f"Current summary:\n{thread.get('summary') or '(none yet)'}\n\nNew exchanges:\n{exchanges}",
+            law_firm_id=thread["law_firm_id"],
+            priority=BACKGROUND,
+            request_type="summary",
+            user_id=thread["user_id"],
+            case_id=thread["case_id"],
+            system_message=RESEARCH_THREAD_SUMMARY_PROMPT
+        )
+        if not await repo.compact_research_thread(thread_id, summarized, turns[-1]["turn"], summary):
+            logger.info(f"Research thread {thread_id} was compacted concurrently; summary discarded")
+    except Exception as e:
+        # The thread keeps working from its older summary; the next turn retries
+        logger.error(f"Research thread compaction failed: {str(e)}")
+    finally:
+        compacting_threads.discard(thread_id)
+
 @api_router.post("/legal-research")
 async def conduct_legal_research(research: ResearchQuery):
+    """Research one query; with ``thread_id`` it is a follow-up in that thread"""
     try:
-        # Get AI analysis
-        session_id = f"legal_research_{research.law_firm_id}_{uuid.uuid4()}"
-        ai_response = await get_ai_legal_response(
-            research.query, 
-            context=f"Law firm context for legal research",
-            session_id=session_id
-        )
+        thread = None
+        if research.thread_id:
+            thread = await repo.get_research_thread(research.thread_id)
+            if not thread or thread["law_firm_id"] != research.law_firm_id:
+                raise HTTPException(status_code=404, detail="Research thread not found")
+            research.case_id = thread["case_id"]
         
-        # Search Indian Kanoon for relevant cases
-        kanoon_results = await search_indian_kanoon(research.query)
+        try:
+            result = await run_legal_research(
+                research, priority=INTERACTIVE, history=thread_history(thread) if thread else None
+            )
+        except (AIServiceError, CircuitOpenError) as e:
+            raise ai_unavailable_error(e)
         
-        # Create research result
-        result = ResearchResult(
-            query=research.query,
-            ai_response=ai_response,
-            indian_kanoon_results=kanoon_results,
-            relevant_cases=[case.get('title', '') for case in kanoon_results[:5]],
-            legal_authorities=[case.get('citation', '') for case in kanoon_results[:5] if case.get('citation')]
-        )
+        if thread:
+            result.thread_id = thread["id"]
+            result.turn = await record_thread_turn(thread, result)
         
         # Save research to database
-        await db.research_results.insert_one({
-            **result.dict(),
-            "law_firm_id": research.law_firm_id,
-            "user_id": research.user_id,
-            "case_id": research.case_id
-        })
+        await repo.insert_research(
+            research_record(result, research.law_firm_id, research.user_id, research.case_id)
+        )
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Legal research error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Research failed: {str(e)}")
 
+# Batch research: many questions for one case, streamed back as NDJSON as each completes
+@api_router.post("/legal-research/batch")
+async def conduct_batch_research(batch: ResearchBatchRequest):
+    queries = [query.strip() for query in batch.queries if query.strip()]
+    if not queries:
+        raise HTTPException(status_code=400, detail="At least one query is required")
+    if len(queries) > RESEARCH_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {RESEARCH_BATCH_MAX_QUERIES} queries per batch")
+    case = await get_case_header(batch.case_id)
+    if not case or case.get("law_firm_id") != batch.law_firm_id:
+        raise HTTPException(status_code=404, detail="Case not found")
+    
+    concurrency = max(1, min(batch.concurrency or RESEARCH_BATCH_CONCURRENCY, RESEARCH_BATCH_CONCURRENCY))
+    limit = asyncio.Semaphore(concurrency)
+    
+    async def run_one(index: int, query: str) -> dict:
+        async with limit:
+            research = ResearchQuery(
+                query=query,
+                law_firm_id=batch.law_firm_id,
+                case_id=batch.case_id,
+                user_id=batch.user_id,
+                kanoon_pages=batch.kanoon_pages
+            )
+            try:
+                # Background priority keeps the firm's interactive research responsive
+                result = await run_legal_research(research, priority=BACKGROUND)
+            except (AIServiceError, CircuitOpenError) as e:
+                error = ai_unavailable_error(e)
+                return {"type": "error", "index": index, "query": query, "status": error.status_code, "detail": error.detail}
+            except HTTPException as e:
+                return {"type": "error", "index": index, "query": query, "status": e.status_code, "detail": e.detail}
+            except DeadlineExceeded as e:
+                return {"type": "error", "index": index, "query": query, "status": 504, "detail": str(e)}
+            except Exception as e:
+                logger.error(f"Batch research error: {str(e)}")
+                return {"type": "error", "index": index, "query": query, "status": 500, "detail": f"Research failed: {str(e)}"}
+            return {"type": "result", "index": index, "result": result}
+    
+    async def flush(entries: List[tuple]) -> List[tuple]:
+        """Save buffered ``(index, query, record)`` entries, retrying failures; returns those never saved"""
+        unsaved = entries
+        for attempt in range(RESEARCH_BATCH_SAVE_ATTEMPTS):
+            if attempt:
+                await asyncio.sleep(0.2 * 2 ** (attempt - 1))
+            try:
+                failed = await repo.insert_research_many([record for _, _, record in unsaved])
+                unsaved = [unsaved[position] for position in failed]
+            except Exception as e:
+                logger.error(f"Failed to save {len(unsaved)} batch research results (attempt {attempt + 1}): {str(e)}")
+            if not unsaved:
+                return []
+        logger.error(f"Gave up saving {len(unsaved)} batch research results for case {batch.case_id}")
+        return unsaved
+    
+    async def events():
+        tasks = {asyncio.create_task(run_one(index, query)) for index, query in enumerate(queries)}
+        pending = set(tasks)
+        buffered: List[tuple] = []
+        window_started = time.monotonic()
+        completed = failed = 0
+        try:
+            yield json.dumps({"type": "accepted", "case_id": batch.case_id, "queries": len(queries), "concurrency": concurrency}) + "\n"
+            while pending:
+                timeout = max(0.0, RESEARCH_BATCH_FLUSH_S - (time.monotonic() - window_started)) if buffered else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    event = task.result()
+                    if event["type"] == "result":
+                        completed += 1
+                        if not buffered:
+                            window_started = time.monotonic()
+                        buffered.append((
+                            event["index"], event["result"].query,
+                            research_record(event["result"], batch.law_firm_id, batch.user_id, batch.case_id)
+                        ))
+                        event = {**event, "result": event["result"].dict()}
+                    else:
+                        failed += 1
+                    yield json.dumps(event, default=str) + "\n"
+                # One insert_many per flush window, or sooner once the buffer is full
+                if buffered and (not pending or len(buffered) >= RESEARCH_BATCH_FLUSH_SIZE
+                                 or time.monotonic() - window_started >= RESEARCH_BATCH_FLUSH_S):
+                    entries, buffered = buffered, []
+                    # Results already streamed but never saved are reported again as failures
+                    for index, query, _ in await flush(entries):
+                        completed -= 1
+                        failed += 1
+                        yield json.dumps({
+                            "type": "error", "index": index, "query": query, "status": 500,
+                            "detail": "Research completed but could not be saved"
+                        }) + "\n"
+            yield json.dumps({"type": "done", "completed": completed, "failed": failed}) + "\n"
+        finally:
+            for task in pending:
+                task.cancel()
+            if buffered:
+                # Client went away mid-window; results already paid for are still saved
+                spawn_background(flush(buffered))
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers=STREAM_HEADERS)
+
+# Streaming Indian Kanoon search: pages and judgments are sent as NDJSON as they arrive
+@api_router.post("/kanoon-search/stream")
+async def stream_kanoon_search(search: KanoonSearchRequest):
+    pages = max(1, min(search.pages, KANOON_MAX_PAGES))
+    judgments = max(0, min(search.judgments, KANOON_MAX_JUDGMENTS))
+    
+    async def events():
+        total = 0
+        try:
+            async for event in kanoon_client.stream(search.query, pages=pages, judgments=judgments):
+                if event["type"] == "page":
+                    total += len(event["results"])
+                yield json.dumps(event, default=str) + "\n"
+        except (KanoonServiceError, CircuitOpenError, DeadlineExceeded) as e:
+            logger.error(f"Streaming Kanoon search failed: {str(e)}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+            return
+        yield json.dumps({"type": "done", "total_results": total}) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson", headers=STREAM_HEADERS)
+
 # Document Upload and Analysis
 @api_router.post("/documents/upload")
 async def upload_document(
@@ -651,8 +1302,14 @@ async def upload_document(
     law_firm_id: str = Form(None),
     case_id: Optional[str] = Form(None),
     document_type: str = Form("general"),
-    uploaded_by: str = Form(None)
+    uploaded_by: str = Form(None),
+    reanalyze: bool = Form(False)
 ):
+    """Store a document with its AI analysis.
+
+    Content already analyzed as the same document type reuses that analysis
+    without calling the LLM; ``reanalyze`` forces a fresh one.
+    """
     try:
         # Validate required parameters
         if not law_firm_id:
@@ -667,6 +1324,8 @@ async def upload_document(
             
         # Encode content for storage
         encoded_content = base64.b64encode(content).decode('utf-8')
+        content_sha256 = await asyncio.to_thread(lambda: hashlib.sha256(content).hexdigest())
+        analysis_key = f"{law_firm_id}:{content_sha256}:{document_type}:v{DOCUMENT_ANALYSIS_PROMPT_VERSION}"
         
         # Get AI analysis of the document
         session_id = f"doc_analysis_{law_firm_id}_{uuid.uuid4()}"
@@ -683,18 +1342,67 @@ async def upload_document(
         
         Note: This is a document analysis based on metadata. In a full implementation, document text would be extracted and analyzed."""
         
-        ai_summary = await get_ai_legal_response(
-            analysis_query,
-            context=f"Document analysis for law firm {law_firm_id}",
-            session_id=session_id
-        )
+        async def analyze() -> str:
+            ai_summary = await get_ai_legal_response(
+                analysis_query,
+                context=f"Document analysis for law firm {law_firm_id}",
+                session_id=session_id,
+                law_firm_id=law_firm_id,
+                priority=BACKGROUND,
+                request_type="document_analysis",
+                user_id=uploaded_by,
+                case_id=case_id
+            )
+            try:
+                await repo.save_document_analysis({
+                    "key": analysis_key,
+                    "law_firm_id": law_firm_id,
+                    "content_sha256": content_sha256,
+                    "document_type": document_type,
+                    "prompt_version": DOCUMENT_ANALYSIS_PROMPT_VERSION,
+                    "ai_summary": ai_summary,
+                    "created_at": datetime.utcnow()
+                })
+            except Exception as e:
+                logger.error(f"Failed to save document analysis: {str(e)}")
+            return ai_summary
+        
+        analyzed_here = False
+        
+        async def load_analysis() -> str:
+            nonlocal analyzed_here
+            stored = await repo.get_document_analysis(analysis_key)
+            if stored is not None:
+                return stored["ai_summary"]
+            analyzed_here = True
+            return await analyze()
+        
+        # The upload is kept even when the AI is down; the analysis is marked unavailable
+        analysis_status = "completed"
+        try:
+            if reanalyze:
+                analyzed_here = True
+                ai_summary = await analyze()
+                await cache_bus.publish("document_analysis", analysis_key)
+                read_cache.set("document_analysis", analysis_key, ai_summary, DOCUMENT_ANALYSIS_CACHE_TTL_S)
+            else:
+                # Concurrent uploads of the same content share one lookup and LLM call
+                ai_summary = await read_cache.get_or_load(
+                    "document_analysis", analysis_key, load_analysis, DOCUMENT_ANALYSIS_CACHE_TTL_S
+                )
+        except (AIServiceError, CircuitOpenError) as e:
+            logger.error(f"Document analysis unavailable: {str(e)}")
+            ai_summary = None
+            analysis_status = "unavailable"
+        analysis_cached = analysis_status == "completed" and not analyzed_here
         
         # Extract key points (simplified for MVP)
         key_points = [
             f"Document type: {document_type}",
             f"File size: {len(content)} bytes",
             f"Upload date: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')}",
-            "AI analysis completed"
+            ("AI analysis reused from an identical earlier upload" if analysis_cached else "AI analysis completed")
+                if analysis_status == "completed" else "AI analysis unavailable"
         ]
         
         # Create document record
@@ -706,11 +1414,14 @@ async def upload_document(
             content=encoded_content,
             ai_summary=ai_summary,
             key_points=key_points,
+            analysis_status=analysis_status,
+            analysis_cached=analysis_cached,
+            content_sha256=content_sha256,
             uploaded_by=uploaded_by
         )
         
         # Save to database
-        await db.legal_documents.insert_one(document.dict())
+        await repo.insert_document(document.dict())
         
         return {
             "document_id": document.id,
@@ -718,7 +1429,10 @@ async def upload_document(
             "size": len(content),
             "ai_summary": ai_summary,
             "key_points": key_points,
-            "message": "Document uploaded and analyzed successfully"
+            "analysis_status": analysis_status,
+            "analysis_cached": analysis_cached,
+            "message": "Document uploaded and analyzed successfully" if analysis_status == "completed"
+                else "Document uploaded; AI analysis is temporarily unavailable"
         }
         
     except HTTPException:
@@ -727,47 +1441,197 @@ async def upload_document(
         logger.error(f"Document upload error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Document upload failed: {str(e)}")
 
-@api_router.get("/documents/{law_firm_id}")
+@api_router.get("/documents/{law_firm_id}", dependencies=[Depends(micro_cache)])
 async def get_documents_by_firm(law_firm_id: str):
     try:
-        documents = await db.legal_documents.find(
-            {"law_firm_id": law_firm_id},
-            {"content": 0}  # Exclude large content field
-        ).sort("created_at", -1).to_list(1000)
-        
-        # Convert MongoDB ObjectId to string for JSON serialization
-        for doc in documents:
-            if "_id" in doc:
-                doc["_id"] = str(doc["_id"])
-                
-        return documents
+        return await repo.list_documents(law_firm_id)
     except Exception as e:
         logger.error(f"Error fetching documents: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch documents: {str(e)}")
 
+# Research threads
+@api_router.post("/research-threads", response_model=ResearchThread)
+async def create_research_thread(thread_data: ResearchThreadCreate):
+    try:
+        case = await get_case_header(thread_data.case_id)
+        if not case or case.get("law_firm_id") != thread_data.law_firm_id:
+            raise HTTPException(status_code=404, detail="Case not found")
+        thread = ResearchThread(**thread_data.dict())
+        await repo.insert_research_thread(thread.dict())
+        return thread
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating research thread: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to create research thread: {str(e)}")
+
+@api_router.get("/cases/{case_id}/research-threads")
+async def get_case_research_threads(case_id: str, limit: int = 50):
+    try:
+        return await repo.list_research_threads(case_id, max(1, min(limit, 100)))
+    except Exception as e:
+        logger.error(f"Error fetching research threads: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch research threads: {str(e)}")
+
+@api_router.get("/research-threads/{thread_id}")
+async def get_research_thread(thread_id: str):
+    """A thread with its summary and every turn's full research result"""
+    try:
+        thread = await repo.get_research_thread(thread_id)
+        if not thread:
+            raise HTTPException(status_code=404, detail="Research thread not found")
+        thread.pop("recent_turns", None)
+        thread["turns"] = await repo.thread_research(thread_id)
+        return thread
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching research thread: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch research thread: {str(e)}")
+
 # Research History
-@api_router.get("/research-history/{law_firm_id}")
-async def get_research_history(law_firm_id: str):
+@api_router.get("/research-history/{law_firm_id}", dependencies=[Depends(micro_cache)])
+async def get_research_history(law_firm_id: str, view: str = "summary", limit: int = 100):
+    """Recent research for a firm; summaries by default, ``view=full`` for whole results"""
     try:
-        results = await db.research_results.find(
-            {"law_firm_id": law_firm_id}
-        ).sort("created_at", -1).limit(100).to_list(100)
-        
-        # Convert MongoDB ObjectId to string for JSON serialization
-        for result in results:
-            if "_id" in result:
-                result["_id"] = str(result["_id"])
-        
-        return results
+        if view not in ("summary", "full"):
+            raise HTTPException(status_code=400, detail="view must be 'summary' or 'full'")
+        limit = max(1, min(limit, 100))
+        return await repo.research_history(law_firm_id, limit, full=view == "full")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching research history: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch research history: {str(e)}")
 
+@api_router.get("/research/{research_id}", dependencies=[Depends(micro_cache)])
+async def get_research_detail(research_id: str):
+    try:
+        result = await repo.get_research(research_id)
+        if not result:
+            raise HTTPException(status_code=404, detail="Research result not found")
+        return result
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching research result: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch research result: {str(e)}")
+
+# LLM usage, read from the daily rollups (up to one flush interval behind)
+def usage_window(date_from: Optional[datetime], date_to: Optional[datetime]):
+    """Whole UTC days; the last LLM_USAGE_DEFAULT_DAYS by default"""
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    date_to = (date_to or today).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+    date_from = (date_from or date_to - timedelta(days=LLM_USAGE_DEFAULT_DAYS - 1)).replace(
+        hour=0, minute=0, second=0, microsecond=0, tzinfo=None
+    )
+    if date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to")
+    return date_from, date_to
+
+@api_router.get("/usage/firms", dependencies=[Depends(micro_cache)])
+async def get_usage_by_firm(date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """LLM calls, tokens and latency per firm"""
+    try:
+        date_from, date_to = usage_window(date_from, date_to)
+        firms = await repo.usage_rollups(usage_query(None, date_from, date_to), ["law_firm_id"])
+        return {"date_from": date_from, "date_to": date_to, "firms": firms}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching LLM usage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch LLM usage: {str(e)}")
+
+@api_router.get("/usage/{law_firm_id}", dependencies=[Depends(micro_cache)])
+async def get_firm_usage(law_firm_id: str, date_from: Optional[datetime] = None, date_to: Optional[datetime] = None):
+    """A firm's LLM usage in total and by feature, model and user"""
+    try:
+        date_from, date_to = usage_window(date_from, date_to)
+        query = usage_query(law_firm_id, date_from, date_to)
+        totals, by_feature, by_model, by_user = await asyncio.gather(
+            repo.usage_rollups(query, []),
+            repo.usage_rollups(query, ["feature"]),
+            repo.usage_rollups(query, ["model"]),
+            repo.usage_rollups(query, ["user_id"]),
+        )
+        return {
+            "law_firm_id": law_firm_id,
+            "date_from": date_from,
+            "date_to": date_to,
+            "totals": totals[0] if totals else {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            "by_feature": by_feature,
+            "by_model": by_model,
+            "by_user": by_user,
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching LLM usage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch LLM usage: {str(e)}")
+
+@api_router.get("/usage/{law_firm_id}/daily", dependencies=[Depends(micro_cache)])
+async def get_firm_daily_usage(
+    law_firm_id: str,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    feature: Optional[str] = None,
+    by_feature: bool = False
+):
+    """A firm's LLM usage per day, oldest first; ``by_feature`` splits each day"""
+    try:
+        date_from, date_to = usage_window(date_from, date_to)
+        days = await repo.usage_rollups(
+            usage_query(law_firm_id, date_from, date_to, feature), ["day", "feature"] if by_feature else ["day"]
+        )
+        days.sort(key=lambda row: (row["day"], row.get("feature") or ""))
+        return {"law_firm_id": law_firm_id, "date_from": date_from, "date_to": date_to, "days": days}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching LLM usage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch LLM usage: {str(e)}")
+
 # Health check
 @api_router.get("/")
 async def root():
     return {"message": "AI Legal Research Platform API", "status": "active"}
 
+def upstream_status(configured: bool, breaker: CircuitBreaker, ready_label: str = "ready") -> str:
+    if not configured:
+        return "not configured"
+    if breaker.state == CircuitBreaker.OPEN:
+        return "unavailable (circuit open)"
+    if breaker.state == CircuitBreaker.HALF_OPEN:
+        return "recovering (circuit half-open)"
+    return ready_label
+
+@api_router.get("/ready")
+async def readiness_check():
+    """Readiness probe: Mongo must answer a ping; upstream problems only degrade"""
+    checks = {}
+    ready = True
+    
+    try:
+        await asyncio.wait_for(repo.ping(), timeout=READINESS_TIMEOUT_S)
+        checks["database"] = "ok"
+    except Exception as e:
+        checks["database"] = f"unavailable: {str(e) or type(e).__name__}"
+        ready = False
+    
+    checks["ai"] = upstream_status(bool(OPENROUTER_API_KEY), ai_router.breaker, "ok")
+    checks["indian_kanoon"] = upstream_status(bool(INDIAN_KANOON_API_KEY), kanoon_client.breaker, "ok")
+    
+    if not ready:
+        status = "not ready"
+    elif checks["ai"] != "ok" or checks["indian_kanoon"] != "ok":
+        status = "degraded"
+    else:
+        status = "ready"
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": status, "pid": os.getpid(), "checks": checks}
+    )
+
 @api_router.get("/health")
 async def health_check():
     return {
@@ -775,20 +1639,60 @@ async def health_check():
         "timestamp": datetime.utcnow(),
         "services": {
             "database": "connected",
-            "ai": "ready (OpenRouter)" if OPENROUTER_API_KEY else "not configured",
-            "indian_kanoon": "ready" if INDIAN_KANOON_API_KEY else "not configured"
-        }
+            "ai": upstream_status(bool(OPENROUTER_API_KEY), ai_router.breaker, "ready (OpenRouter)"),
+            "indian_kanoon": upstream_status(bool(INDIAN_KANOON_API_KEY), kanoon_client.breaker)
+        },
+        "circuit_breakers": {
+            "openrouter": ai_router.breaker.snapshot(),
+            "indian_kanoon": kanoon_client.breaker.snapshot()
+        },
+        "ai_models": ai_router.snapshot(),
+        "llm_scheduler": llm_scheduler.snapshot(),
+        "token_budget": token_budget.snapshot(),
+        "kanoon_cache": kanoon_client.cache_stats(),
+        "read_cache": {**read_cache.snapshot(), "invalidation_bus": cache_bus.snapshot()},
+        "deadline_scheduler": deadline_scheduler.snapshot(),
+        "llm_usage": usage_ledger.snapshot(),
+        "idempotency": idempotency_store.snapshot(),
+        "request_deadlines": request_deadlines.snapshot(),
+        "startup_ms": startup_timings
     }
 
+# Slow request log
+async def record_slow_request(record: dict):
+    logger.warning(f"Slow request: {json.dumps(record, default=str)}")
+    await repo.insert_slow_request(record)
+
 # Include the router in the main app
 app.include_router(api_router)
 
+# Innermost: deadlines cover only the endpoint, so the idempotency store can still
+# release a key after a 504 or disconnect
+app.add_middleware(RequestDeadlineMiddleware, deadlines=request_deadlines)
+
+# Replayed responses still get CORS headers and compression
+app.add_middleware(IdempotencyMiddleware, store=idempotency_store, paths=IDEMPOTENT_PATHS)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Idempotent-Replayed"],
+)
+
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_BYTES,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+)
+
+app.add_middleware(
+    ServerTimingMiddleware,
+    slow_request_ms=SLOW_REQUEST_MS,
+    slow_request_sink=record_slow_request,
 )
 
 # Configure logging
@@ -797,7 +1701,3 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -0,0 +1,92 @@
+"""Transparent compression of large fields at rest.
+
+``FieldCodec.pack`` moves each large field into a compressed ``<field>_z``
+binary and records the algorithm on the document. ``unpack`` reverses that
+for documents written either way, so reads stay correct when the setting
+changes. Strings are stored as UTF-8; other values as JSON.
+
+zstd needs the optional ``zstandard`` package. Without it, zlib from the
+standard library is used.
+"""
+import json
+import logging
+import zlib
+from typing import Iterable, Optional
+
+from bson.binary import Binary
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ("zstd", "zlib")
+# ``compression`` of documents that were checked and left plain (every field under min_bytes)
+UNCOMPRESSED = "none"
+
+
+def _json_default(value):
+    return value.isoformat() if hasattr(value, "isoformat") else str(value)
+
+
+class FieldCodec:
+    def __init__(self, fields: Iterable[str], algorithm: Optional[str] = "zlib", min_bytes: int = 1024, level: Optional[int] = None):
+        self.fields = tuple(fields)
+        if algorithm == "zstd" and zstandard is None:
+            logger.warning("zstandard is not installed; compressing with zlib instead")
+            algorithm = "zlib"
+        self.algorithm = algorithm if algorithm in ALGORITHMS else None
+        self.min_bytes = min_bytes
+        self.level = level
+        self._zstd_compressor = zstandard.ZstdCompressor(level=level or 6) if self.algorithm == "zstd" else None
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.algorithm == "zstd":
+            return self._zstd_compressor.compress(data)
+        return zlib.compress(data, self.level or 6)
+
+    @staticmethod
+    def _decompress(algorithm: str, data: bytes) -> bytes:
+        if algorithm == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Document was compressed with zstd but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return zlib.decompress(data)
+
+    def pack(self, record: dict) -> dict:
+        """Copy of ``record`` with its large fields compressed"""
+        if self.algorithm is None:
+            return record
+        packed = dict(record)
+        compressed = False
+        for field in self.fields:
+            value = packed.get(field)
+            if value is None:
+                continue
+            is_text = isinstance(value, str)
+            raw = (value if is_text else json.dumps(value, default=_json_default)).encode("utf-8")
+            if len(raw) < self.min_bytes:
+                continue
+            packed[f"{field}_z"] = Binary(self._compress(raw))
+            packed[f"{field}_json"] = not is_text
+            del packed[field]
+            compressed = True
+        if compressed:
+            packed["compression"] = self.algorithm
+        return packed
+
+    def unpack(self, document: Optional[dict]) -> Optional[dict]:
+        """Restore compressed fields in place; plain documents pass through"""
+        if not document or "compression" not in document:
+            return document
+        algorithm = document.pop("compression")
+        for field in self.fields:
+            blob = document.pop(f"{field}_z", None)
+            is_json = document.pop(f"{field}_json", False)
+            if blob is None:
+                continue
+            raw = self._decompress(algorithm, bytes(blob)).decode("utf-8")
+            document[field] = json.loads(raw) if is_json else raw
+        return document
@@ -0,0 +1,244 @@
+"""Token budgets for prompts sent to OpenRouter.
+
+``TokenBudget`` counts tokens locally and builds the chat messages for one
+call. When the query and context would not fit the prompt budget, it trims the
+context (keeping its head and tail), and then the query. The budget is the
+smallest context window among the routed models, less the completion
+reservation, capped at ``prompt_budget``. Earlier turns of a conversation
+(``history``) sit between the system prompt and the query, and the oldest of
+them are dropped before anything else is trimmed. ``max_tokens`` is chosen per
+request type instead of a flat 2000. Prompt and completion token counts are recorded
+per request type and model.
+
+Counting uses tiktoken when it is installed. Encoders are cached per model,
+and so are the counts for repeated strings such as the system prompt. Without
+tiktoken, or while its encodings cannot be loaded, a character-based estimate
+is used, which is deliberately conservative. A failed load is retried after
+``ENCODER_RETRY_S``.
+"""
+import logging
+import time
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional, falls back to estimates
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Context windows of the models we route to; unknown models get the default
+MODEL_CONTEXT_WINDOWS = {
+    "openai/gpt-4o": 128000,
+    "openai/gpt-4o-mini": 128000,
+    "openai/gpt-4-turbo": 128000,
+    "openai/gpt-3.5-turbo": 16385,
+    "anthropic/claude-3.5-sonnet": 200000,
+    "anthropic/claude-3-haiku": 200000,
+    "meta-llama/llama-3.1-70b-instruct": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+
+# Completion tokens reserved per request type
+MAX_TOKENS_BY_REQUEST_TYPE = {
+    "research": 2000,
+    "document_analysis": 1200,
+    "summary": 600,
+}
+DEFAULT_MAX_TOKENS = 1000
+
+# How the query is introduced in the user message, per request type
+QUERY_PREFIX_BY_REQUEST_TYPE = {"summary": ""}
+DEFAULT_QUERY_PREFIX = "Legal Research Query: "
+
+# Chat framing: tokens per message plus the reply primer (OpenAI's accounting)
+_TOKENS_PER_MESSAGE = 4
+_REPLY_PRIMER_TOKENS = 3
+# Heuristic when tiktoken is unavailable; over-counts English prose slightly
+_CHARS_PER_TOKEN = 3.5
+
+TRUNCATION_MARKER = "\n\n[... truncated to fit the model's context budget ...]\n\n"
+
+# Seconds before loading a tokenizer is tried again after a failure
+ENCODER_RETRY_S = 300.0
+
+_encoders: Dict[str, object] = {}  # Only successfully loaded encoders
+_encoder_failed_at: Dict[str, float] = {}
+
+
+def _encoder(model: str):
+    """tiktoken encoder for ``model``, loading it on first use; None while unavailable"""
+    encoder = _encoders.get(model)
+    if encoder is not None or tiktoken is None:
+        return encoder
+    failed_at = _encoder_failed_at.get(model)
+    if failed_at is not None and time.monotonic() - failed_at < ENCODER_RETRY_S:
+        return None
+    name = model.split("/", 1)[-1]
+    try:
+        try:
+            encoder = tiktoken.encoding_for_model(name)
+        except KeyError:
+            encoder = tiktoken.get_encoding("o200k_base" if name.startswith("gpt-4o") else "cl100k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use; offline hosts estimate until a retry succeeds
+        _encoder_failed_at[model] = time.monotonic()
+        logger.warning(
+            f"Tokenizer for {model} unavailable, estimating token counts for {ENCODER_RETRY_S:g}s: "
+            f"{str(e) or type(e).__name__}"
+        )
+        return None
+    _encoders[model] = encoder
+    _encoder_failed_at.pop(model, None)
+    return encoder
+
+
+@lru_cache(maxsize=1024)
+def _cached_count(model: str, text: str) -> int:
+    return count_tokens(text, model, cache=False)
+
+
+def count_tokens(text: str, model: str = "openai/gpt-4o", cache: bool = True) -> int:
+    """Tokens in ``text`` for ``model``; estimated when tiktoken is not available"""
+    if not text:
+        return 0
+    encoder = _encoder(model)
+    if encoder is None:
+        return int(len(text) / _CHARS_PER_TOKEN) + 1
+    if cache and len(text) <= 4096:
+        return _cached_count(model, text)  # Exact counts only; estimates are not kept
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str = "openai/gpt-4o", head_ratio: float = 0.7) -> str:
+    """Trim ``text`` to about ``max_tokens``, keeping its head and tail"""
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text, model, cache=False) <= max_tokens:
+        return text
+    budget = max(0, max_tokens - count_tokens(TRUNCATION_MARKER, model))
+    head_tokens = int(budget * head_ratio)
+    tail_tokens = budget - head_tokens
+
+    encoder = _encoder(model)
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        head = encoder.decode(tokens[:head_tokens])
+        tail = encoder.decode(tokens[len(tokens) - tail_tokens:]) if tail_tokens else ""
+    else:
+        head = text[:int(head_tokens * _CHARS_PER_TOKEN)]
+        tail = text[len(text) - int(tail_tokens * _CHARS_PER_TOKEN):] if tail_tokens else ""
+    return head + TRUNCATION_MARKER + tail
+
+
+class TokenBudget:
+    """Fits prompts to the routed models and keeps token usage counters"""
+
+    def __init__(self, models: List[str], prompt_budget: int = 12000, safety_margin: int = 256):
+        self.models = models
+        self.prompt_budget = prompt_budget
+        self.safety_margin = safety_margin
+        self.context_window = min(MODEL_CONTEXT_WINDOWS.get(m, DEFAULT_CONTEXT_WINDOW) for m in models) if models else DEFAULT_CONTEXT_WINDOW
+        # Any routed model may answer, so count with the primary's tokenizer
+        self.count_model = models[0] if models else "openai/gpt-4o"
+        self.usage: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.truncated = 0
+
+    def warm_up(self):
+        """Load the tokenizer (may download encodings); run off the event loop"""
+        _encoder(self.count_model)
+
+    def max_tokens_for(self, request_type: str) -> int:
+        return MAX_TOKENS_BY_REQUEST_TYPE.get(request_type, DEFAULT_MAX_TOKENS)
+
+    def input_budget(self, max_tokens: int) -> int:
+        return min(self.prompt_budget, self.context_window - max_tokens - self.safety_margin)
+
+    def count_messages(self, messages: List[dict]) -> int:
+        return sum(count_tokens(m["content"], self.count_model) + _TOKENS_PER_MESSAGE for m in messages) + _REPLY_PRIMER_TOKENS
+
+    def build_messages(
+        self,
+        system: str,
+        query: str,
+        context: str = "",
+        request_type: str = "research",
+        history: Optional[List[dict]] = None,
+    ) -> Tuple[List[dict], int, int]:
+        """Return ``(messages, max_tokens, prompt_tokens)`` that fit the budget"""
+        max_tokens = self.max_tokens_for(request_type)
+        budget = self.input_budget(max_tokens)
+        query_prefix = QUERY_PREFIX_BY_REQUEST_TYPE.get(request_type, DEFAULT_QUERY_PREFIX)
+        context_prefix = "\n\nAdditional Context: "
+
+        fixed = (
+            count_tokens(system, self.count_model)
+            + count_tokens(query_prefix, self.count_model)
+            + 2 * _TOKENS_PER_MESSAGE + _REPLY_PRIMER_TOKENS
+        )
+        query_tokens = count_tokens(query, self.count_model)
+        context_tokens = count_tokens(context, self.count_model) + count_tokens(context_prefix, self.count_model) if context else 0
+
+        available = budget - fixed
+        history = list(history or [])
+        history_tokens = [count_tokens(m["content"], self.count_model) + _TOKENS_PER_MESSAGE for m in history]
+        if history and sum(history_tokens) + query_tokens + context_tokens > available:
+            self.truncated += 1
+            # Oldest turns go first; the query and its context matter more
+            while history and sum(history_tokens) + query_tokens + context_tokens > available:
+                history.pop(0)
+                history_tokens.pop(0)
+            logger.info(f"Conversation history trimmed to fit {budget} input tokens ({request_type})")
+        available -= sum(history_tokens)
+        if query_tokens + context_tokens > available:
+            self.truncated += 1
+            # Context gives way first; the query keeps at least half of the budget
+            query = truncate_to_tokens(query, max(available // 2, available - context_tokens), self.count_model)
+            query_tokens = count_tokens(query, self.count_model)
+            if context:
+                context = truncate_to_tokens(context, available - query_tokens - count_tokens(context_prefix, self.count_model), self.count_model)
+            logger.info(f"Prompt trimmed to fit {budget} input tokens ({request_type})")
+
+        messages = [
+            {"role": "system", "content": system},
+            *history,
+            {"role": "user", "content": query_prefix + query + (context_prefix + context if context else "")},
+        ]
+        return messages, max_tokens, self.count_messages(messages)
+
+    def record(self, request_type: str, model: str, prompt_tokens: int, completion_tokens: int):
+        totals = self.usage[(request_type, model)]
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+
+    def snapshot(self) -> dict:
+        return {
+            # Reports what is loaded; a health check never loads or downloads encodings
+            "tokenizer": "tiktoken" if _encoders.get(self.count_model) is not None else "estimate",
+            "context_window": self.context_window,
+            "prompt_budget": self.input_budget(DEFAULT_MAX_TOKENS),
+            "truncated": self.truncated,
+            "usage": [
+                {"request_type": request_type, "model": model, **totals}
+                for (request_type, model), totals in sorted(self.usage.items())
+            ],
+        }
+
+
+def cached_prompt_tokens(completion: dict) -> int:
+    """Prompt tokens the provider reported as served from its prompt cache"""
+    details = (completion.get("usage") or {}).get("prompt_tokens_details") or {}
+    return details.get("cached_tokens") or 0
+
+
+def usage_counts(completion: dict, prompt_tokens: int) -> Tuple[int, int]:
+    """Prompt/completion tokens from the provider's usage, else local counts"""
+    usage = completion.get("usage") or {}
+    prompt = usage.get("prompt_tokens") or prompt_tokens
+    completion_tokens = usage.get("completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = count_tokens(completion.get("content") or "", completion.get("model") or "openai/gpt-4o", cache=False)
+    return prompt, completion_tokens
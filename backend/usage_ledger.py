@@ -0,0 +1,206 @@
+"""LLM usage accounting per firm, user and feature.
+
+``UsageLedger.record`` only appends to an in-memory buffer, so the request path
+never waits on a write. A background task flushes the buffer every
+``flush_interval_s``, or sooner once ``flush_size`` records are queued. Each
+flush does two writes:
+
+* the raw records go to ``llm_usage`` with one unordered insert_many;
+* the batch is folded into daily rollups in ``llm_usage_daily``, one ``$inc``
+  upsert per (firm, day, feature, model, user).
+
+The usage endpoints read only the rollups. Raw records are kept for audits and
+expire through a TTL index.
+
+Both writes are retried independently on the next tick if they fail. Raw
+records carry a unique ``id``, so a retried insert never duplicates them.
+Rollup increments stay in memory until they are written; when a bulk write
+fails part-way, only the failed upserts are kept. Past ``max_buffer`` the
+oldest raw records are dropped and counted, so a Mongo outage cannot grow
+memory without bound. Shutdown flushes whatever is left.
+"""
+import asyncio
+import logging
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+# Counters summed into each daily rollup
+ROLLUP_COUNTERS = ("calls", "prompt_tokens", "cached_tokens", "completion_tokens", "total_tokens", "latency_ms_total")
+# (law_firm_id, day, feature, model, user_id)
+RollupKey = Tuple[str, datetime, str, str, Optional[str]]
+
+
+class UsageLedger:
+    def __init__(self, flush_interval_s: float = 5.0, flush_size: int = 200, max_buffer: int = 20000):
+        self.flush_interval_s = flush_interval_s
+        self.flush_size = flush_size
+        self.max_buffer = max_buffer
+        self.db = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._buffer: Deque[dict] = deque()
+        self._unsaved: Deque[dict] = deque()  # Raw records folded into rollups but not yet inserted
+        self._rollups: Dict[RollupKey, dict] = {}
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    async def start(self, db):
+        self.db = db
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except (asyncio.CancelledError, Exception):
+            pass
+        self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Final LLM usage flush failed: {str(e)}")
+
+    def record(
+        self,
+        law_firm_id: Optional[str],
+        feature: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_ms: float,
+        user_id: Optional[str] = None,
+        case_id: Optional[str] = None,
+        cached_tokens: int = 0,
+    ):
+        """Queue one completed call; never blocks. ``cached_tokens`` are prompt tokens the provider served from its cache"""
+        self._buffer.append({
+            "id": str(uuid.uuid4()),
+            "law_firm_id": law_firm_id,
+            "user_id": user_id,
+            "case_id": case_id,
+            "feature": feature,
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "latency_ms": round(latency_ms, 1),
+            "created_at": datetime.utcnow(),
+        })
+        self.recorded += 1
+        if len(self._buffer) > self.max_buffer:
+            self._buffer.popleft()
+            self.dropped += 1
+        if len(self._buffer) >= self.flush_size:
+            self._wake.set()
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval_s)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"LLM usage flush failed: {str(e)}")
+
+    def _fold(self, records: List[dict]):
+        for record in records:
+            created_at = record["created_at"]
+            day = datetime(created_at.year, created_at.month, created_at.day)
+            key = (record["law_firm_id"], day, record["feature"], record["model"], record["user_id"])
+            rollup = self._rollups.get(key)
+            if rollup is None:
+                rollup = self._rollups[key] = {**{counter: 0 for counter in ROLLUP_COUNTERS}, "latency_ms_max": 0.0}
+            rollup["calls"] += 1
+            rollup["prompt_tokens"] += record["prompt_tokens"]
+            rollup["cached_tokens"] += record["cached_tokens"]
+            rollup["completion_tokens"] += record["completion_tokens"]
+            rollup["total_tokens"] += record["total_tokens"]
+            rollup["latency_ms_total"] += record["latency_ms"]
+            rollup["latency_ms_max"] = max(rollup["latency_ms_max"], record["latency_ms"])
+
+    async def flush(self):
+        """Write everything buffered so far"""
+        if self.db is None:
+            return
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.flush_size, len(self._buffer)))]
+            self._fold(batch)
+            self._unsaved.extend(batch)
+        while len(self._unsaved) > self.max_buffer:
+            # Only raw records are lost; their tokens are already in the rollups
+            self._unsaved.popleft()
+            self.dropped += 1
+        try:
+            await self._insert_raw()
+        finally:
+            await self._write_rollups()
+
+    async def _insert_raw(self):
+        while self._unsaved:
+            batch = list(self._unsaved)[:self.flush_size]
+            try:
+                await self.db.llm_usage.insert_many(batch, ordered=False)
+            except BulkWriteError as e:
+                # Duplicates are records a failed earlier attempt already inserted
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+            for _ in batch:
+                self._unsaved.popleft()
+            self.flushed += len(batch)
+
+    async def _write_rollups(self):
+        if not self._rollups:
+            return
+        keys = list(self._rollups)
+        now = datetime.utcnow()
+        updates = []
+        for key in keys:
+            firm, day, feature, model, user = key
+            rollup = self._rollups[key]
+            updates.append(UpdateOne(
+                {"law_firm_id": firm, "day": day, "feature": feature, "model": model, "user_id": user},
+                {
+                    "$inc": {counter: rollup[counter] for counter in ROLLUP_COUNTERS},
+                    "$max": {"latency_ms_max": rollup["latency_ms_max"]},
+                    "$set": {"updated_at": now},
+                },
+                upsert=True,
+            ))
+        try:
+            await self.db.llm_usage_daily.bulk_write(updates, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            for index, key in enumerate(keys):
+                if index not in failed:
+                    del self._rollups[key]
+            raise
+        for key in keys:
+            del self._rollups[key]
+
+    def snapshot(self) -> dict:
+        return {
+            "buffered": len(self._buffer) + len(self._unsaved),
+            "pending_rollups": len(self._rollups),
+            "recorded": self.recorded,
+            "flushed": self.flushed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
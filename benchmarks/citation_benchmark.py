@@ -0,0 +1,65 @@
+"""Micro-benchmark for citation extraction.
+
+Builds a roughly 2000-token research answer with a realistic mix of case and
+statute citations and reports the per-call extraction time in microseconds.
+
+Example:
+    python benchmarks/citation_benchmark.py --iterations 5000
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from citations import extract_citations  # noqa: E402
+
+CITED = (
+    "In Kesavananda Bharati v. State of Kerala, AIR 1973 SC 1461 : (1973) 4 SCC 225, the Court held that "
+    "Article 368 does not permit amendment of the basic structure. See also [1978] 2 SCR 621 and 2023 INSC 512. "
+    "The offence under Section 138 of the Negotiable Instruments Act, 1881 is compoundable; ss. 420 and 468 IPC "
+    "and s. 482 Cr.P.C. were also invoked (2005 Cri LJ 1234; 2023 SCC OnLine SC 1001; 2024:DHC:1234). "
+)
+PROSE = (
+    "The petitioner contends that the impugned order is arbitrary, was passed without hearing the affected "
+    "parties and therefore violates the principles of natural justice recognised by the courts. "
+)
+
+
+def build_answer(tokens: int = 2000) -> str:
+    # About four characters per token, one citation-heavy passage per ~2000 characters
+    paragraphs = []
+    while sum(len(p) for p in paragraphs) < tokens * 4:
+        paragraphs.append(PROSE * 8 + CITED)
+    return "\n\n".join(paragraphs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--tokens", type=int, default=2000)
+    args = parser.parse_args()
+
+    answer = build_answer(args.tokens)
+    found = extract_citations(answer)
+    timings = []
+    for _ in range(args.iterations):
+        started = time.perf_counter()
+        extract_citations(answer)
+        timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    print(json.dumps({
+        "chars": len(answer),
+        "citations": len(found),
+        "us": {
+            "p50": round(statistics.median(timings), 1),
+            "p99": round(timings[int(len(timings) * 0.99) - 1], 1),
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
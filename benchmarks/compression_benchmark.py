@@ -0,0 +1,146 @@
+"""Bytes on the wire and throughput of the case list under each encoding.
+
+Boots serve.py (unless ``--base-url`` points at a running deployment), seeds a
+firm with cases and then drives GET /api/cases/{firm} with a fixed number of
+concurrent clients, once per Accept-Encoding: identity, gzip and br. Bodies are
+not decompressed, so the reported sizes are what crossed the wire. Against
+nginx (``--base-url http://127.0.0.1:8080``) with API_MICRO_CACHE_TTL_S set,
+the X-Cache-Status counts show how many requests the micro-cache answered.
+Results are printed as JSON.
+
+Examples:
+    python benchmarks/compression_benchmark.py --cases 500 --duration 10
+    python benchmarks/compression_benchmark.py --base-url http://127.0.0.1:8080 --concurrency 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+
+from run_benchmark import Workload, _round, percentile, wait_until_healthy
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+ENCODINGS = ("identity", "gzip", "br")
+
+
+async def drive_encoding(session: aiohttp.ClientSession, url: str, encoding: str, concurrency: int, duration_s: float) -> dict:
+    latencies: List[float] = []
+    sizes: List[int] = []
+    served_as: Dict[str, int] = {}
+    cache_status: Dict[str, int] = {}
+    errors = 0
+    deadline = time.perf_counter() + duration_s
+
+    async def client():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                async with session.get(url, headers={"Accept-Encoding": encoding}) as response:
+                    body = await response.read()
+                    if response.status != 200:
+                        errors += 1
+                        continue
+                    content_encoding = response.headers.get("Content-Encoding", "identity")
+                    served_as[content_encoding] = served_as.get(content_encoding, 0) + 1
+                    status = response.headers.get("X-Cache-Status")
+                    if status:
+                        cache_status[status] = cache_status.get(status, 0) + 1
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - started) * 1000)
+            sizes.append(len(body))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[client() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "served_as": served_as,
+        **({"cache_status": cache_status} if cache_status else {}),
+        "bytes_per_response": round(sum(sizes) / len(sizes)) if sizes else None,
+        "wire_mb": round(sum(sizes) / 1024 / 1024, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": _round(percentile(latencies, 50)),
+        "p95_ms": _round(percentile(latencies, 95)),
+    }
+
+
+async def run(args) -> dict:
+    process = None
+    base_url = args.base_url
+    if not base_url:
+        env = dict(os.environ)
+        env["COMPRESSION_MIN_BYTES"] = str(args.min_bytes)
+        command = [sys.executable, str(BENCH_DIR / "serve.py"), "--port", str(args.port)]
+        if args.mongo_url:
+            command += ["--mongo-url", args.mongo_url]
+        process = subprocess.Popen(command, env=env)
+        base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        if process is not None:
+            await wait_until_healthy(base_url, process)
+        workload = Workload(base_url, random.Random(args.seed), upload_kb=1)
+        async with aiohttp.ClientSession() as session:
+            await workload.seed(session, args.cases)
+        # Bodies stay compressed so their sizes are the bytes on the wire
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector, auto_decompress=False) as session:
+            url = f"{base_url}/api/cases/{workload.firm_id}"
+            # One warm-up pass so the first encoding doesn't pay for cold caches
+            await drive_encoding(session, url, "identity", args.concurrency, 1.0)
+            results = {
+                encoding: await drive_encoding(session, url, encoding, args.concurrency, args.duration)
+                for encoding in args.encodings
+            }
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    identity = results.get("identity", {}).get("bytes_per_response")
+    for result in results.values():
+        if identity and result["bytes_per_response"]:
+            result["ratio_vs_identity"] = round(result["bytes_per_response"] / identity, 3)
+    return {
+        "config": {
+            "base_url": args.base_url or "serve.py",
+            "cases": args.cases,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "min_bytes": args.min_bytes,
+        },
+        "case_list": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=None, help="Benchmark a running deployment instead of serve.py")
+    parser.add_argument("--port", type=int, default=8103)
+    parser.add_argument("--mongo-url", default=None, help="Local mongod; defaults to the in-memory stand-in")
+    parser.add_argument("--cases", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds per encoding")
+    parser.add_argument("--encodings", nargs="+", default=list(ENCODINGS), choices=ENCODINGS)
+    parser.add_argument("--min-bytes", type=int, default=1024, help="COMPRESSION_MIN_BYTES for serve.py")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""Offline end-to-end load test for the legal platform API.
+
+Starts the OpenRouter/Kanoon stubs in-process, boots ``server:app`` in a
+subprocess (see serve.py), seeds a firm with cases and drives a mixed workload
+of case board loads, case detail views, research history, document uploads and
+research bursts at a target request rate. Each endpoint is then also driven in
+isolation. Latency percentiles, throughput and server RSS are reported as JSON.
+
+Examples:
+    python benchmarks/run_benchmark.py --rps 50 --duration 30
+    python benchmarks/run_benchmark.py --mongo-url mongodb://127.0.0.1:27017 --llm-latency-ms 2000 --llm-error-rate 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+from stubs import add_profile_arguments, build_kanoon_app, build_openrouter_app, profiles_from_args, start_stub
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+RESEARCH_QUERIES = [
+    "Remedies for breach of a software development agreement under the Indian Contract Act",
+    "Limitation period for filing a commercial suit for recovery of money",
+    "Anticipatory bail under Section 438 CrPC for economic offences",
+    "Maintainability of a writ petition against a private university",
+    "Liquidated damages versus penalty clauses in construction contracts",
+]
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def read_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+@dataclass
+class EndpointStats:
+    latencies_ms: List[float] = field(default_factory=list)
+    errors: int = 0
+    status_codes: Dict[int, int] = field(default_factory=dict)
+
+    def record(self, status: Optional[int], latency_ms: float):
+        self.latencies_ms.append(latency_ms)
+        key = status if status is not None else 0
+        self.status_codes[key] = self.status_codes.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors += 1
+
+    def summary(self, elapsed_s: float) -> dict:
+        values = sorted(self.latencies_ms)
+        ok = len(values) - self.errors
+        return {
+            "requests": len(values),
+            "errors": self.errors,
+            "status_codes": {str(code): count for code, count in sorted(self.status_codes.items())},
+            "throughput_rps": round(ok / elapsed_s, 2) if elapsed_s else None,
+            "p50_ms": _round(percentile(values, 50)),
+            "p95_ms": _round(percentile(values, 95)),
+            "p99_ms": _round(percentile(values, 99)),
+            "max_ms": _round(values[-1] if values else None),
+        }
+
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return round(value, 2) if value is not None else None
+
+
+class RssSampler:
+    """Samples the server process RSS in the background"""
+
+    def __init__(self, pid: int, interval_s: float = 0.25):
+        self.pid = pid
+        self.interval_s = interval_s
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            rss = read_rss_mb(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            await asyncio.sleep(self.interval_s)
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        if not self.samples:
+            return {"rss_start_mb": None, "rss_peak_mb": None, "rss_end_mb": None}
+        return {
+            "rss_start_mb": round(self.samples[0], 1),
+            "rss_peak_mb": round(max(self.samples), 1),
+            "rss_end_mb": round(self.samples[-1], 1),
+        }
+
+
+class Workload:
+    """The request mix, built around a seeded firm"""
+
+    def __init__(self, base_url: str, rng: random.Random, upload_kb: int):
+        self.base_url = base_url
+        self.rng = rng
+        self.upload_body = os.urandom(upload_kb * 1024)
+        self.firm_id: Optional[str] = None
+        self.user_id: Optional[str] = None
+        self.case_ids: List[str] = []
+
+    async def seed(self, session: aiohttp.ClientSession, cases: int):
+        async with session.post(f"{self.base_url}/api/law-firms", json={
+            "name": "Benchmark & Associates",
+            "address": "1 Bench Road, Mumbai",
+            "contact_email": "bench@example.com",
+            "contact_phone": "+91 9000000000",
+        }) as response:
+            self.firm_id = (await response.json())["id"]
+
+        async with session.post(f"{self.base_url}/api/users", json={
+            "law_firm_id": self.firm_id,
+            "name": "Bench Advocate",
+            "email": "advocate@example.com",
+            "role": "associate",
+        }) as response:
+            self.user_id = (await response.json())["id"]
+
+        stages = ["intake", "ongoing", "hearing", "judgment", "closed"]
+        case_types = ["criminal", "civil", "family", "corporate", "constitutional", "labor"]
+        for i in range(cases):
+            async with session.post(f"{self.base_url}/api/cases", json={
+                "law_firm_id": self.firm_id,
+                "case_number": f"BENCH-{i:05d}",
+                "case_title": f"Bench Client {i} vs Respondent {i}",
+                "case_type": case_types[i % len(case_types)],
+                "court_jurisdiction": "Bombay High Court",
+                "assigned_attorney": self.user_id,
+                "client_name": f"Bench Client {i}",
+                "description": "Seeded benchmark matter " * 10,
+                "priority": ["low", "medium", "high", "urgent"][i % 4],
+            }) as response:
+                case_id = (await response.json())["id"]
+                self.case_ids.append(case_id)
+            await session.put(f"{self.base_url}/api/cases/{case_id}/stage", json={"stage": stages[i % len(stages)]})
+            await session.post(f"{self.base_url}/api/cases/{case_id}/notes", json={
+                "case_id": case_id, "content": "Initial client meeting notes " * 20, "author": self.user_id,
+            })
+
+    def requests(self) -> Dict[str, Callable]:
+        return {
+            "case_board": self.case_board,
+            "case_detail": self.case_detail,
+            "research_history": self.research_history,
+            "document_upload": self.document_upload,
+            "legal_research": self.legal_research,
+        }
+
+    def case_board(self, session):
+        return session.get(f"{self.base_url}/api/cases/{self.firm_id}")
+
+    def case_detail(self, session):
+        return session.get(f"{self.base_url}/api/cases/detail/{self.rng.choice(self.case_ids)}")
+
+    def research_history(self, session):
+        return session.get(f"{self.base_url}/api/research-history/{self.firm_id}")
+
+    def document_upload(self, session):
+        form = aiohttp.FormData()
+        form.add_field("file", self.upload_body, filename="agreement.pdf", content_type="application/pdf")
+        form.add_field("law_firm_id", self.firm_id)
+        form.add_field("case_id", self.rng.choice(self.case_ids))
+        form.add_field("document_type", "contract")
+        form.add_field("uploaded_by", self.user_id)
+        return session.post(f"{self.base_url}/api/documents/upload", data=form)
+
+    def legal_research(self, session):
+        return session.post(f"{self.base_url}/api/legal-research", json={
+            "query": self.rng.choice(RESEARCH_QUERIES),
+            "law_firm_id": self.firm_id,
+            "case_id": self.rng.choice(self.case_ids),
+            "user_id": self.user_id,
+        })
+
+
+async def _timed(name: str, make_request: Callable, session, stats: Dict[str, EndpointStats]):
+    start = time.perf_counter()
+    status = None
+    try:
+        async with make_request(session) as response:
+            await response.read()
+            status = response.status
+    except Exception:
+        status = None
+    stats.setdefault(name, EndpointStats()).record(status, (time.perf_counter() - start) * 1000)
+
+
+async def drive(
+    session: aiohttp.ClientSession,
+    workload: Workload,
+    weights: Dict[str, float],
+    rps: float,
+    duration_s: float,
+    rng: random.Random,
+    burst_size: int = 0,
+    burst_interval_s: float = 0.0,
+) -> tuple:
+    """Open-loop load: requests are issued on schedule regardless of response times"""
+    stats: Dict[str, EndpointStats] = {}
+    calls = workload.requests()
+    names = [name for name in weights if weights[name] > 0]
+    cumulative = [weights[name] for name in names]
+    tasks = []
+
+    start = time.perf_counter()
+    next_burst = start + burst_interval_s if burst_size and burst_interval_s else None
+    total = int(rps * duration_s)
+    for i in range(total):
+        target = start + i / rps
+        delay = target - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if next_burst is not None and time.perf_counter() >= next_burst:
+            for _ in range(burst_size):
+                tasks.append(asyncio.create_task(_timed("legal_research", calls["legal_research"], session, stats)))
+            next_burst += burst_interval_s
+        name = rng.choices(names, weights=cumulative)[0]
+        tasks.append(asyncio.create_task(_timed(name, calls[name], session, stats)))
+
+    await asyncio.gather(*tasks)
+    return stats, time.perf_counter() - start
+
+
+async def wait_until_healthy(base_url: str, process: subprocess.Popen, timeout_s: float = 60.0) -> float:
+    start = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        while time.perf_counter() - start < timeout_s:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            try:
+                async with session.get(f"{base_url}/api/health") as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except aiohttp.ClientError:
+                pass
+            await asyncio.sleep(0.05)
+    raise RuntimeError("server did not become healthy in time")
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    weights = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    llm_profile, kanoon_profile = profiles_from_args(args)
+    stub_runners = [
+        await start_stub(build_openrouter_app(llm_profile, args.seed), "127.0.0.1", args.openrouter_port),
+        await start_stub(build_kanoon_app(kanoon_profile, args.seed), "127.0.0.1", args.kanoon_port),
+    ]
+
+    env = dict(os.environ)
+    env.update({
+        "OPENROUTER_API_KEY": "bench-key",
+        "INDIAN_KANOON_API_KEY": "bench-key",
+        "OPENROUTER_BASE_URL": f"http://127.0.0.1:{args.openrouter_port}",
+        "INDIAN_KANOON_BASE_URL": f"http://127.0.0.1:{args.kanoon_port}",
+    })
+    command = [sys.executable, str(BENCH_DIR / "serve.py"), "--port", str(args.port)]
+    if args.mongo_url:
+        command += ["--mongo-url", args.mongo_url, "--db-name", args.db_name]
+    process = subprocess.Popen(command, env=env)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    try:
+        startup_s = await wait_until_healthy(base_url, process)
+        weights = parse_weights(args.mix)
+        connector = aiohttp.TCPConnector(limit=args.max_connections)
+        timeout = aiohttp.ClientTimeout(total=args.request_timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            workload = Workload(base_url, rng, args.upload_kb)
+            await workload.seed(session, args.cases)
+
+            sampler = RssSampler(process.pid)
+            sampler.start()
+            stats, elapsed = await drive(
+                session, workload, weights, args.rps, args.duration, rng,
+                burst_size=args.research_burst_size, burst_interval_s=args.research_burst_interval,
+            )
+            mixed = {
+                "elapsed_s": round(elapsed, 2),
+                "throughput_rps": round(sum(len(s.latencies_ms) - s.errors for s in stats.values()) / elapsed, 2),
+                **await sampler.stop(),
+                "endpoints": {name: endpoint.summary(elapsed) for name, endpoint in sorted(stats.items())},
+            }
+
+            isolated = {}
+            if args.phase_duration > 0:
+                for name in weights:
+                    sampler.start()
+                    stats, elapsed = await drive(session, workload, {name: 1.0}, args.rps, args.phase_duration, rng)
+                    isolated[name] = {**stats[name].summary(elapsed), **await sampler.stop()}
+
+        return {
+            "config": {
+                "rps": args.rps,
+                "duration_s": args.duration,
+                "mix": weights,
+                "cases": args.cases,
+                "mongo": args.mongo_url or "in-memory (mongomock_motor)",
+                "llm": vars(llm_profile),
+                "kanoon": vars(kanoon_profile),
+            },
+            "startup_s": round(startup_s, 3),
+            "mixed": mixed,
+            "isolated": isolated,
+        }
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+        for runner in stub_runners:
+            await runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=20.0, help="Target request rate")
+    parser.add_argument("--duration", type=float, default=20.0, help="Mixed workload duration in seconds")
+    parser.add_argument("--phase-duration", type=float, default=5.0, help="Per-endpoint isolated phase duration (0 to skip)")
+    parser.add_argument("--mix", default="case_board=40,case_detail=20,research_history=10,document_upload=10,legal_research=20")
+    parser.add_argument("--research-burst-size", type=int, default=10)
+    parser.add_argument("--research-burst-interval", type=float, default=5.0)
+    parser.add_argument("--cases", type=int, default=200, help="Cases seeded into the benchmark firm")
+    parser.add_argument("--upload-kb", type=int, default=64)
+    parser.add_argument("--max-connections", type=int, default=200)
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--openrouter-port", type=int, default=9101)
+    parser.add_argument("--kanoon-port", type=int, default=9102)
+    parser.add_argument("--mongo-url", default=None, help="Local mongod; defaults to the in-memory stand-in")
+    parser.add_argument("--db-name", default="legal_platform_bench")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Boot ``server:app`` for benchmarking.
+
+With ``--mongo-url`` the app talks to a real (local) mongod; without it the
+Motor client is replaced by ``mongomock_motor``'s in-memory stand-in, so the
+suite runs with no external services at all. Upstream URLs are taken from
+OPENROUTER_BASE_URL / INDIAN_KANOON_BASE_URL, normally pointing at stubs.py.
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+
+def load_app(mongo_url: str = None, db_name: str = "legal_platform_bench"):
+    os.environ["MONGO_URL"] = mongo_url or "mongodb://127.0.0.1:27017"
+    os.environ["DB_NAME"] = db_name
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    import server
+
+    if not mongo_url:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            sys.exit("mongomock-motor is required without --mongo-url (pip install mongomock-motor)")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[db_name]
+
+    return server.app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8101)
+    parser.add_argument("--mongo-url", default=None, help="Use a real mongod instead of the in-memory stand-in")
+    parser.add_argument("--db-name", default="legal_platform_bench")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = load_app(args.mongo_url, args.db_name)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
@@ -0,0 +1,80 @@
+"""Time-to-ready benchmark for the backend.
+
+Boots serve.py repeatedly and measures wall time from process spawn until
+/api/ready first answers 200, together with the per-phase startup timings the
+server reports in /api/health. Results are printed as JSON.
+
+Example:
+    python benchmarks/startup_benchmark.py --runs 5
+    python benchmarks/startup_benchmark.py --mongo-url mongodb://127.0.0.1:27017
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+
+def _get_json(url: str):
+    with urllib.request.urlopen(url, timeout=1) as response:
+        return response.status, json.loads(response.read())
+
+
+def measure_once(args) -> dict:
+    command = [sys.executable, str(BENCH_DIR / "serve.py"), "--port", str(args.port)]
+    if args.mongo_url:
+        command += ["--mongo-url", args.mongo_url]
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    started = time.perf_counter()
+    process = subprocess.Popen(command, env=dict(os.environ), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"server exited with code {process.returncode}")
+            if time.perf_counter() - started > args.timeout:
+                raise RuntimeError("server did not become ready in time")
+            try:
+                status, _ = _get_json(f"{base_url}/api/ready")
+                if status == 200:
+                    break
+            except (urllib.error.URLError, ConnectionError, OSError):
+                pass
+            time.sleep(0.01)
+        ready_s = time.perf_counter() - started
+        _, health = _get_json(f"{base_url}/api/health")
+        return {"ready_s": round(ready_s, 3), "phases_ms": health.get("startup_ms", {})}
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8102)
+    parser.add_argument("--mongo-url", default=None, help="Local mongod; defaults to the in-memory stand-in")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    runs = [measure_once(args) for _ in range(args.runs)]
+    ready = sorted(run["ready_s"] for run in runs)
+    print(json.dumps({
+        "runs": runs,
+        "ready_s": {
+            "min": ready[0],
+            "median": round(statistics.median(ready), 3),
+            "max": ready[-1],
+        },
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
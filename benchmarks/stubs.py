@@ -0,0 +1,164 @@
+"""Local stand-ins for the OpenRouter and Indian Kanoon APIs.
+
+Both stubs are aiohttp.web apps with configurable latency, jitter and error
+rate so benchmarks can reproduce slow or flaky upstreams without the network.
+
+Run standalone:
+    python benchmarks/stubs.py --openrouter-port 9101 --kanoon-port 9102 --llm-latency-ms 800
+"""
+import argparse
+import asyncio
+import random
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+from aiohttp import web
+
+LOREM_ANSWER = (
+    "## Legal Analysis\n\n"
+    "Under Section 73 of the Indian Contract Act, 1872 the aggrieved party is entitled to "
+    "compensation for loss naturally arising from the breach. See Hadley v Baxendale as applied in "
+    "Karsandas H. Thacker v. Saran Engineering Co. Ltd., AIR 1965 SC 1981, and "
+    "Kailash Nath Associates v. DDA, (2015) 4 SCC 136.\n\n"
+)
+
+
+@dataclass
+class UpstreamProfile:
+    """Latency/error behaviour of one stubbed upstream"""
+
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+    async def delay(self, rng: random.Random):
+        latency = self.latency_ms + rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            await asyncio.sleep(latency / 1000)
+
+    def should_fail(self, rng: random.Random) -> bool:
+        return self.error_rate > 0 and rng.random() < self.error_rate
+
+
+def build_openrouter_app(profile: UpstreamProfile, seed: Optional[int] = None) -> web.Application:
+    rng = random.Random(seed)
+
+    async def chat_completions(request: web.Request) -> web.Response:
+        payload = await request.json()
+        await profile.delay(rng)
+        if profile.should_fail(rng):
+            return web.json_response({"error": {"message": "stubbed upstream failure"}}, status=profile.error_status)
+
+        prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+        completion = LOREM_ANSWER * 6
+        return web.json_response({
+            "id": f"gen-{rng.getrandbits(48):012x}",
+            "model": payload.get("model", "openai/gpt-4o"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": completion}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(completion) // 4,
+                "total_tokens": prompt_chars // 4 + len(completion) // 4,
+            },
+        })
+
+    app = web.Application()
+    app.router.add_post("/chat/completions", chat_completions)
+    app.router.add_post("/api/v1/chat/completions", chat_completions)
+    return app
+
+
+def _kanoon_doc(tid: int) -> dict:
+    return {
+        "tid": tid,
+        "title": f"Stub Petitioner {tid} vs State Of Maharashtra",
+        "headline": "held that compensation under <b>Section 73</b> is limited to foreseeable loss",
+        "docsource": "Supreme Court of India",
+        "court": "Supreme Court of India",
+        "publishdate": "2015-03-27",
+        "date": "27 March, 2015",
+        "citation": f"({2000 + tid % 24}) {tid % 12 + 1} SCC {tid % 900 + 1}",
+        "summary": "Stubbed judgment summary.",
+    }
+
+
+def build_kanoon_app(profile: UpstreamProfile, seed: Optional[int] = None, page_size: int = 10) -> web.Application:
+    rng = random.Random(seed)
+
+    async def search(request: web.Request) -> web.Response:
+        params = dict(request.query)
+        if request.method == "POST":
+            params.update(await request.post())
+        await profile.delay(rng)
+        if profile.should_fail(rng):
+            return web.json_response({"errmsg": "stubbed upstream failure"}, status=profile.error_status)
+
+        page = int(params.get("pagenum", 0) or 0)
+        base = zlib.crc32(params.get("formInput", "").encode()) % 100000
+        docs = [_kanoon_doc(base + page * page_size + i) for i in range(page_size)]
+        return web.json_response({"docs": docs, "found": f"1 - {page_size} of 1000"})
+
+    async def document(request: web.Request) -> web.Response:
+        await profile.delay(rng)
+        if profile.should_fail(rng):
+            return web.json_response({"errmsg": "stubbed upstream failure"}, status=profile.error_status)
+        tid = int(request.match_info["tid"])
+        doc = _kanoon_doc(tid)
+        doc["doc"] = "<p>" + " ".join([LOREM_ANSWER] * 40) + "</p>"
+        return web.json_response(doc)
+
+    async def fragment(request: web.Request) -> web.Response:
+        await profile.delay(rng)
+        if profile.should_fail(rng):
+            return web.json_response({"errmsg": "stubbed upstream failure"}, status=profile.error_status)
+        tid = int(request.match_info["tid"])
+        return web.json_response({"tid": tid, "headline": [_kanoon_doc(tid)["headline"]]})
+
+    app = web.Application()
+    app.router.add_route("*", "/search/", search)
+    app.router.add_route("*", "/doc/{tid}/", document)
+    app.router.add_route("*", "/docfragment/{tid}/", fragment)
+    return app
+
+
+async def start_stub(app: web.Application, host: str, port: int) -> web.AppRunner:
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=300.0)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--kanoon-latency-ms", type=float, default=250.0)
+    parser.add_argument("--kanoon-jitter-ms", type=float, default=100.0)
+    parser.add_argument("--kanoon-error-rate", type=float, default=0.0)
+
+
+def profiles_from_args(args) -> tuple:
+    return (
+        UpstreamProfile(args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate),
+        UpstreamProfile(args.kanoon_latency_ms, args.kanoon_jitter_ms, args.kanoon_error_rate),
+    )
+
+
+async def _serve_forever(args):
+    llm_profile, kanoon_profile = profiles_from_args(args)
+    await start_stub(build_openrouter_app(llm_profile, args.seed), args.host, args.openrouter_port)
+    await start_stub(build_kanoon_app(kanoon_profile, args.seed), args.host, args.kanoon_port)
+    print(f"OpenRouter stub on http://{args.host}:{args.openrouter_port}, Kanoon stub on http://{args.host}:{args.kanoon_port}")
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--openrouter-port", type=int, default=9101)
+    parser.add_argument("--kanoon-port", type=int, default=9102)
+    parser.add_argument("--seed", type=int, default=None)
+    add_profile_arguments(parser)
+    asyncio.run(_serve_forever(parser.parse_args()))
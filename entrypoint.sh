@@ -4,18 +4,37 @@ set -e
 # Start the FastAPI backend
 cd /backend || { echo "Backend directory not found"; exit 1; }
 
-echo "Starting FastAPI backend"
-# Start Uvicorn with proper host binding
-uvicorn server:app --host 0.0.0.0 --port 8001 &
+# SERVE_MODE=production runs gunicorn with WEB_CONCURRENCY uvicorn workers
+# (defaults to one per core); SERVE_MODE=single keeps a single uvicorn process.
+SERVE_MODE="${SERVE_MODE:-production}"
+READY_URL="http://127.0.0.1:8001/api/ready"
+READY_TIMEOUT="${READY_TIMEOUT:-60}"
+
+if [ "$SERVE_MODE" = "single" ]; then
+    echo "Starting FastAPI backend (single uvicorn process)"
+    uvicorn server:app --host 0.0.0.0 --port 8001 --timeout-keep-alive 75 &
+else
+    echo "Starting FastAPI backend (gunicorn, ${WEB_CONCURRENCY:-one per core} workers)"
+    gunicorn server:app -c gunicorn.conf.py &
+fi
 BACKEND_PID=$!
 
-echo "Waiting for backend to start..."
-sleep 30
-
-if ! kill -0 $BACKEND_PID 2>/dev/null; then
-    echo "Backend failed to start at initialization, exiting"
-    exit 1
-fi
+echo "Waiting for backend readiness at $READY_URL..."
+elapsed=0
+until python3 -c "import sys, urllib.request; sys.exit(0 if urllib.request.urlopen('$READY_URL', timeout=2).status == 200 else 1)" 2>/dev/null; do
+    if ! kill -0 $BACKEND_PID 2>/dev/null; then
+        echo "Backend failed to start at initialization, exiting"
+        exit 1
+    fi
+    if [ "$elapsed" -ge "$((READY_TIMEOUT * 2))" ]; then
+        echo "Backend not ready after ${READY_TIMEOUT}s, exiting"
+        kill $BACKEND_PID
+        exit 1
+    fi
+    sleep 0.5
+    elapsed=$((elapsed + 1))
+done
+echo "Backend ready"
 
 # Start Nginx
 nginx -g 'daemon off;' &
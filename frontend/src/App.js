@@ -5,6 +5,39 @@ import axios from "axios";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
+// For a few seconds after this client writes, its reads skip the API micro-cache
+// (nginx) so it always sees its own changes; keep API_MICRO_CACHE_TTL_S below this
+const READ_YOUR_WRITES_MS = 10000;
+let lastWriteAt = 0;
+axios.interceptors.request.use((config) => {
+  if ((config.method || 'get').toLowerCase() === 'get') {
+    if (Date.now() - lastWriteAt < READ_YOUR_WRITES_MS) {
+      config.headers['Cache-Control'] = 'no-cache';
+    }
+  } else {
+    lastWriteAt = Date.now();
+  }
+  return config;
+});
+
+// Idempotency keys for expensive submissions: repeating the same submission (a
+// double-click, or a retry after an error) reuses its key until it succeeds, so
+// the backend replays the first response instead of running it again
+const pendingSubmissions = {};
+const idempotencyKey = (action, payload) => {
+  const signature = JSON.stringify(payload);
+  const pending = pendingSubmissions[action];
+  if (pending && pending.signature === signature) {
+    return pending.key;
+  }
+  const key = `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+  pendingSubmissions[action] = { signature, key };
+  return key;
+};
+const settleSubmission = (action) => {
+  delete pendingSubmissions[action];
+};
+
 // Main App Component
 function App() {
   const [currentPage, setCurrentPage] = useState('dashboard');
@@ -90,13 +123,8 @@ const Dashboard = ({ lawFirmId }) => {
 
   const fetchDashboardData = async () => {
     try {
-      // Mock data for now - in real implementation would fetch from API
-      setStats({
-        totalCases: 24,
-        activeResearch: 8,
-        documentsProcessed: 156,
-        aiQueries: 342
-      });
+      const response = await axios.get(`${API}/cases/${lawFirmId}/stats`);
+      setStats(response.data); // Computed server-side in one aggregation
       
       setRecentActivity([
         { type: 'research', title: 'Contract Law Research - Breach of Agreement', time: '2 hours ago' },
@@ -123,8 +151,8 @@ const Dashboard = ({ lawFirmId }) => {
                 </div>
                 <div className="ml-5 w-0 flex-1">
                   <dl>
-                    <dt className="text-sm font-medium text-gray-500 truncate">Total Cases</dt>
-                    <dd className="text-lg font-medium text-gray-900">{stats?.totalCases || 0}</dd>
+                    <dt className="text-sm font-medium text-gray-500 truncate">Open Cases</dt>
+                    <dd className="text-lg font-medium text-gray-900">{stats?.open_cases || 0}</dd>
                   </dl>
                 </div>
               </div>
@@ -135,12 +163,12 @@ const Dashboard = ({ lawFirmId }) => {
             <div className="p-5">
               <div className="flex items-center">
                 <div className="flex-shrink-0">
-                  <div className="text-2xl">🔍</div>
+                  <div className="text-2xl">🔔</div>
                 </div>
                 <div className="ml-5 w-0 flex-1">
                   <dl>
-                    <dt className="text-sm font-medium text-gray-500 truncate">Active Research</dt>
-                    <dd className="text-lg font-medium text-gray-900">{stats?.activeResearch || 0}</dd>
+                    <dt className="text-sm font-medium text-gray-500 truncate">Open Alerts</dt>
+                    <dd className="text-lg font-medium text-gray-900">{stats?.open_alerts || 0}</dd>
                   </dl>
                 </div>
               </div>
@@ -151,12 +179,12 @@ const Dashboard = ({ lawFirmId }) => {
             <div className="p-5">
               <div className="flex items-center">
                 <div className="flex-shrink-0">
-                  <div className="text-2xl">📄</div>
+                  <div className="text-2xl">✅</div>
                 </div>
                 <div className="ml-5 w-0 flex-1">
                   <dl>
-                    <dt className="text-sm font-medium text-gray-500 truncate">Documents</dt>
-                    <dd className="text-lg font-medium text-gray-900">{stats?.documentsProcessed || 0}</dd>
+                    <dt className="text-sm font-medium text-gray-500 truncate">Pending Tasks</dt>
+                    <dd className="text-lg font-medium text-gray-900">{stats?.pending_tasks || 0} ({stats?.overdue_deadlines || 0} overdue deadlines)</dd>
                   </dl>
                 </div>
               </div>
@@ -167,12 +195,12 @@ const Dashboard = ({ lawFirmId }) => {
             <div className="p-5">
               <div className="flex items-center">
                 <div className="flex-shrink-0">
-                  <div className="text-2xl">🤖</div>
+                  <div className="text-2xl">⏱️</div>
                 </div>
                 <div className="ml-5 w-0 flex-1">
                   <dl>
-                    <dt className="text-sm font-medium text-gray-500 truncate">AI Queries</dt>
-                    <dd className="text-lg font-medium text-gray-900">{stats?.aiQueries || 0}</dd>
+                    <dt className="text-sm font-medium text-gray-500 truncate">Hours This Month</dt>
+                    <dd className="text-lg font-medium text-gray-900">{stats?.hours_this_month || 0}</dd>
                   </dl>
                 </div>
               </div>
@@ -231,8 +259,8 @@ const AIResearch = ({ lawFirmId, userId }) => {
 
   const fetchResearchHistory = async () => {
     try {
-      const response = await axios.get(`${API}/research-history/${lawFirmId}`);
-      setResearchHistory(response.data.slice(0, 5)); // Show last 5 queries
+      const response = await axios.get(`${API}/research-history/${lawFirmId}?limit=5`);
+      setResearchHistory(response.data); // Last 5 queries, as summaries
     } catch (error) {
       console.error('Error fetching research history:', error);
     }
@@ -244,12 +272,16 @@ const AIResearch = ({ lawFirmId, userId }) => {
 
     setIsLoading(true);
     try {
-      const response = await axios.post(`${API}/legal-research`, {
+      const payload = {
         query: query,
         law_firm_id: lawFirmId,
         user_id: userId,
         case_id: null
+      };
+      const response = await axios.post(`${API}/legal-research`, payload, {
+        headers: { 'Idempotency-Key': idempotencyKey('legal-research', payload) }
       });
+      settleSubmission('legal-research');
       
       setResult(response.data);
       fetchResearchHistory(); // Refresh history
@@ -374,13 +406,15 @@ const AIResearch = ({ lawFirmId, userId }) => {
                       </p>
                     </div>
                     <button 
-                      onClick={() => {
+                      onClick={async () => {
                         setQuery(item.query);
-                        setResult({
-                          ai_response: item.ai_response,
-                          indian_kanoon_results: item.indian_kanoon_results,
-                          relevant_cases: item.relevant_cases
-                        });
+                        try {
+                          // History holds summaries; load the full result on demand
+                          const response = await axios.get(`${API}/research/${item.id}`);
+                          setResult(response.data);
+                        } catch (error) {
+                          console.error('Error fetching research result:', error);
+                        }
                       }}
                       className="ml-4 text-blue-600 hover:text-blue-500 text-sm"
                     >
@@ -573,11 +607,15 @@ const CaseManagement = ({ lawFirmId }) => {
   const handleAddCase = async (e) => {
     e.preventDefault();
     try {
-      await axios.post(`${API}/cases`, {
+      const payload = {
         ...newCase,
         law_firm_id: lawFirmId,
         stage: 'intake'
+      };
+      await axios.post(`${API}/cases`, payload, {
+        headers: { 'Idempotency-Key': idempotencyKey('add-case', payload) }
       });
+      settleSubmission('add-case');
       
       setNewCase({
         case_number: '',
@@ -926,11 +964,14 @@ const DocumentManagement = ({ lawFirmId, userId }) => {
       formData.append('document_type', 'contract'); // Default type
       formData.append('uploaded_by', userId);
 
+      const submission = { name: file.name, size: file.size, lastModified: file.lastModified, lawFirmId };
       const response = await axios.post(`${API}/documents/upload`, formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
+          'Idempotency-Key': idempotencyKey('document-upload', submission),
         },
       });
+      settleSubmission('document-upload');
 
       console.log('Document uploaded:', response.data);
       fetchDocuments(); // Refresh the list
@@ -0,0 +1,17 @@
+import os
+import sys
+from pathlib import Path
+
+# Backend modules import each other by bare name (as when run from backend/)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+# server.py reads these at import time; tests swap in mongomock-motor before startup
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "legalsuite_test")
+
+import pytest
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
@@ -0,0 +1,123 @@
+import json
+
+import httpx
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+CASE = {
+    "law_firm_id": "firm-1",
+    "case_number": "CS/1/2026",
+    "case_title": "Sharma v. Verma",
+    "case_type": "civil",
+    "court_jurisdiction": "Delhi High Court",
+    "assigned_attorney": "A. Rao",
+    "client_name": "Sharma",
+    "description": "Recovery suit",
+}
+
+
+@pytest.fixture
+async def api(monkeypatch):
+    monkeypatch.setattr(server, "client", mongomock_motor.AsyncMongoMockClient())
+    monkeypatch.setattr(server, "db", server.client["legalsuite_test"])
+    monkeypatch.setattr(server, "OPENROUTER_API_KEY", "test-key")
+
+    async def complete(messages, max_tokens, temperature):
+        return {"content": f"Answer to: {messages[-1]['content'][-20:]}", "model": "test-model", "usage": {}, "latency_ms": 1.0}
+
+    async def no_kanoon(*args, **kwargs):
+        return []
+
+    monkeypatch.setattr(server.ai_router, "complete", complete)
+    monkeypatch.setattr(server, "search_indian_kanoon", no_kanoon)
+    async with server.lifespan(server.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            yield client
+
+
+async def stream_batch(api, queries):
+    case = (await api.post("/api/cases", json=CASE)).json()
+    response = await api.post("/api/legal-research/batch", json={
+        "queries": queries, "law_firm_id": "firm-1", "case_id": case["id"], "user_id": "user-1",
+    })
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return case, [json.loads(line) for line in response.text.splitlines()]
+
+
+async def test_batch_streams_results_and_saves_them_in_flush_batches(api, monkeypatch):
+    monkeypatch.setattr(server, "RESEARCH_BATCH_FLUSH_SIZE", 2)
+    monkeypatch.setattr(server, "RESEARCH_BATCH_FLUSH_S", 60)
+    flushed = []
+    insert_many = server.repo.insert_research_many
+
+    async def recording_insert(records):
+        flushed.append(len(records))
+        return await insert_many(records)
+
+    monkeypatch.setattr(server.repo, "insert_research_many", recording_insert)
+    queries = [f"question {n}" for n in range(5)]
+    case, events = await stream_batch(api, queries)
+
+    assert events[0] == {"type": "accepted", "case_id": case["id"], "queries": 5, "concurrency": server.RESEARCH_BATCH_CONCURRENCY}
+    results = [event for event in events if event["type"] == "result"]
+    assert sorted(event["index"] for event in results) == list(range(5))
+    assert all(event["result"]["query"] == queries[event["index"]] for event in results)
+    assert events[-1] == {"type": "done", "completed": 5, "failed": 0}
+
+    # Full buffers flush at once; the remainder when the batch ends
+    assert flushed == [2, 2, 1]
+    saved = await server.db.research_results.find({"case_id": case["id"]}, {"_id": 0, "query": 1, "user_id": 1}).to_list(10)
+    assert sorted(record["query"] for record in saved) == queries
+    assert {record["user_id"] for record in saved} == {"user-1"}
+
+
+async def test_failed_save_is_retried(api, monkeypatch):
+    attempts = []
+    insert_many = server.repo.insert_research_many
+
+    async def flaky_insert(records):
+        attempts.append(len(records))
+        if len(attempts) == 1:
+            raise ConnectionError("primary stepped down")
+        return await insert_many(records)
+
+    monkeypatch.setattr(server.repo, "insert_research_many", flaky_insert)
+    case, events = await stream_batch(api, ["question a", "question b"])
+
+    assert events[-1] == {"type": "done", "completed": 2, "failed": 0}
+    assert attempts == [2, 2]
+    assert await server.db.research_results.count_documents({"case_id": case["id"]}) == 2
+
+
+async def test_unsaved_results_are_reported_as_failed(api, monkeypatch):
+    monkeypatch.setattr(server, "RESEARCH_BATCH_SAVE_ATTEMPTS", 2)
+
+    async def partial_insert(records):
+        # Only the first record of each call is written
+        await server.db.research_results.insert_one(dict(records[0]))
+        return list(range(1, len(records)))
+
+    monkeypatch.setattr(server.repo, "insert_research_many", partial_insert)
+    case, events = await stream_batch(api, ["question a", "question b", "question c"])
+
+    unsaved = [event for event in events if event["type"] == "error"]
+    assert len(unsaved) == 1 and unsaved[0]["status"] == 500
+    assert unsaved[0]["detail"] == "Research completed but could not be saved"
+    results = {event["index"]: event for event in events if event["type"] == "result"}
+    assert unsaved[0]["query"] == results[unsaved[0]["index"]]["result"]["query"]
+    assert events[-1] == {"type": "done", "completed": 2, "failed": 1}
+    assert await server.db.research_results.count_documents({"case_id": case["id"]}) == 2
+
+
+async def test_insert_research_many_counts_stored_ids_as_written(api):
+    existing = {"id": "r-1", "query": "q", "law_firm_id": "firm-1", "ai_response": "a", "indian_kanoon_results": []}
+    assert await server.repo.insert_research_many([existing]) == []
+    fresh = {**existing, "id": "r-2"}
+    assert await server.repo.insert_research_many([dict(existing), fresh]) == []
+    assert await server.db.research_results.count_documents({}) == 2
@@ -0,0 +1,141 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import case_archive  # noqa: E402
+from case_archive import archivable_filter, archive_batch, archive_closed_cases, restore_case  # noqa: E402
+from repository import Repository, find_by_id  # noqa: E402
+from storage_codec import FieldCodec  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+NOW = datetime.utcnow()
+OLD = NOW - timedelta(days=365)
+RECENT = NOW - timedelta(days=10)
+CUTOFF = NOW - timedelta(days=180)
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["legalsuite_test"]
+
+
+def case(case_id, status="active", stage="filing", closed_at=None, updated_at=OLD):
+    return {
+        "id": case_id, "law_firm_id": "firm-1", "case_title": case_id, "status": status, "stage": stage,
+        "closed_at": closed_at, "updated_at": updated_at,
+    }
+
+
+async def seed(db, *cases):
+    await db.cases.insert_many([dict(c) for c in cases])
+    for c in cases:
+        await db.research_results.insert_one({"id": f"r-{c['id']}", "case_id": c["id"]})
+        await db.legal_documents.insert_one({"id": f"d-{c['id']}", "case_id": c["id"]})
+
+
+async def ids(collection, query=None):
+    return sorted(doc["id"] for doc in await collection.find(query or {}, {"_id": 0, "id": 1}).to_list(None))
+
+
+async def test_archivable_filter_selects_cases_closed_before_the_cutoff(db):
+    await seed(
+        db,
+        case("closed-long-ago", status="closed", closed_at=OLD, updated_at=RECENT),
+        case("closed-recently", status="closed", closed_at=RECENT, updated_at=RECENT),
+        case("dropped-legacy", status="dropped"),  # No closed_at; falls back to updated_at
+        case("dropped-legacy-touched", status="dropped", updated_at=RECENT),
+        case("closed-stage", stage="closed", closed_at=OLD),
+        case("open", updated_at=OLD),
+    )
+    assert await ids(db.cases, archivable_filter(CUTOFF)) == ["closed-long-ago", "closed-stage", "dropped-legacy"]
+
+
+async def test_archive_batch_moves_cases_and_records_but_skips_reopened_ones(db):
+    await seed(db, case("a", status="closed", closed_at=OLD), case("b", status="closed", closed_at=OLD))
+    batch = await db.cases.find(archivable_filter(CUTOFF), {"_id": 0}).to_list(None)
+    # Reopened after the batch was read
+    await db.cases.update_one({"id": "b"}, {"$set": {"status": "active", "closed_at": None, "updated_at": NOW}})
+
+    assert await archive_batch(db, batch) == ["a"]
+    assert await ids(db.cases) == ["b"]
+    assert await ids(db.cases_archive) == ["a"]
+    assert await ids(db.research_results) == ["r-b"] and await ids(db.research_results_archive) == ["r-a"]
+    assert await ids(db.legal_documents) == ["d-b"] and await ids(db.legal_documents_archive) == ["d-a"]
+    assert (await db.cases_archive.find_one({"id": "a"}))["archived_at"] is not None
+
+
+async def test_archive_closed_cases_runs_in_batches(db):
+    await seed(db, *[case(f"c{i}", status="closed", closed_at=OLD) for i in range(5)], case("open"))
+    result = await archive_closed_cases(db, older_than_days=180, batch_size=2)
+    assert result["archived"] == 5 and result["firms"] == 1
+    assert await ids(db.cases) == ["open"]
+
+
+async def test_archive_closed_cases_walks_ties_and_legacy_cases_once(db, monkeypatch):
+    await seed(
+        db,
+        *[case(f"tie{i}", status="closed", closed_at=OLD) for i in range(5)],
+        *[case(f"legacy{i}", status="dropped", updated_at=OLD - timedelta(days=i)) for i in range(3)],
+        case("recent", status="closed", closed_at=RECENT),
+    )
+    seen = []
+
+    async def skip_all(db, cases):
+        seen.extend(c["id"] for c in cases)
+        return []  # As if every case changed under the run
+
+    monkeypatch.setattr(case_archive, "archive_batch", skip_all)
+    result = await archive_closed_cases(db, older_than_days=180, batch_size=2)
+    assert result["archived"] == 0
+    assert sorted(seen) == sorted([f"tie{i}" for i in range(5)] + [f"legacy{i}" for i in range(3)])
+
+
+async def test_restore_case_moves_it_back_and_restarts_the_clock(db):
+    await seed(db, case("a", status="closed", closed_at=OLD))
+    await archive_batch(db, await db.cases.find({}, {"_id": 0}).to_list(None))
+
+    restored = await restore_case(db, "a")
+    assert restored["id"] == "a" and restored["closed_at"] is None and "archived_at" not in restored
+    stored = await db.cases.find_one({"id": "a"}, {"_id": 0})
+    assert stored["closed_at"] is None and stored["updated_at"] > RECENT
+    assert await ids(db.cases_archive) == []
+    assert await ids(db.research_results) == ["r-a"] and await ids(db.legal_documents) == ["d-a"]
+    assert await ids(db.cases, archivable_filter(CUTOFF)) == []
+    assert await restore_case(db, "missing") is None
+
+
+async def test_find_by_id_falls_back_to_the_archive(db):
+    await db.cases.insert_one(case("hot"))
+    await db.cases_archive.insert_one(case("cold"))
+    hot, archived = await find_by_id(db, "cases", "hot")
+    assert hot["id"] == "hot" and "_id" not in hot and archived is False
+    cold, archived = await find_by_id(db, "cases", "cold", {"_id": 0, "id": 1})
+    assert cold == {"id": "cold"} and archived is True
+    assert await find_by_id(db, "cases", "missing") == (None, False)
+
+
+async def test_update_case_sets_closed_at_only_when_the_case_closes(db):
+    repo = Repository(db, FieldCodec([]))
+    await db.cases.insert_one(case("a"))
+
+    async def closed_at():
+        return (await db.cases.find_one({"id": "a"}))["closed_at"]
+
+    await repo.update_case("a", {"status": "closed"})
+    first_closed = await closed_at()
+    assert first_closed is not None
+
+    await repo.update_case("a", {"stage": "closed"})
+    await repo.update_case("a", {"status": "dropped"})
+    assert await closed_at() == first_closed  # Still closed; the clock keeps running
+
+    await repo.update_case("a", {"status": "active", "stage": "hearing"})
+    assert await closed_at() is None
+
+    await repo.update_case("a", {"stage": "closed", "sub_stage": "$status"})
+    assert await closed_at() is not None
+    assert (await db.cases.find_one({"id": "a"}))["sub_stage"] == "$status"  # Text, not a field path
+    assert await repo.update_case("missing", {"status": "closed"}) is False
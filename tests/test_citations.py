@@ -0,0 +1,52 @@
+import pytest
+
+from citations import extract_citations
+
+
+def summary(citation):
+    if citation["kind"] == "case":
+        return citation["key"]
+    return (citation["provision"], citation["act"], citation["sections"])
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Case citations
+    ("AIR 1973 SC 1461", ["air:1973:sc:1461"]),
+    ("(2017) 10 SCC 1", ["scc:2017:10:1"]),
+    ("(2019) 3 SCC (Cri) 45", ["scc:2019:3:45"]),
+    ("1994 Supp (3) SCC 569", ["scc:1994:supp3:569"]),
+    ("(1994) Suppl. (3) SCC 569", ["scc:1994:supp3:569"]),
+    ("2021 SCC OnLine SC 123", ["scconline:2021:sc:123"]),
+    ("(1978) 2 SCR 621", ["scr:1978:2:621"]),
+    ("[1950] SCR 1", ["scr:1950::1"]),
+    ("1995 Supp SCR 1", ["scr:1995:supp:1"]),
+    ("1995 Supp (1) SCR 1", ["scr:1995:supp1:1"]),
+    ("1999 Cri LJ 456", ["crilj:1999:456"]),
+    ("2023 INSC 123", ["insc:2023:123"]),
+    ("2023:DHC:1234", ["neutral:2023:dhc:1234"]),
+    # Statutory references
+    ("Section 138 of the Negotiable Instruments Act, 1881", [("section", "Negotiable Instruments Act", ["138"])]),
+    ("s. 302 IPC", [("section", "Indian Penal Code", ["302"])]),
+    ("ss. 302 and 34 IPC", [("section", "Indian Penal Code", ["302", "34"])]),
+    ("u/s 498A IPC", [("section", "Indian Penal Code", ["498A"])]),
+    ("Sec. 9 of the Arbitration Act", [("section", "Arbitration and Conciliation Act", ["9"])]),
+    ("Sec 9 Arbitration Act", [("section", "Arbitration and Conciliation Act", ["9"])]),
+    ("Secs 9 and 34 of the Arbitration Act", [("section", "Arbitration and Conciliation Act", ["9", "34"])]),
+    ("Section 5 of the Foo Bar Act, 2001", [("section", "Foo Bar Act, 2001", ["5"])]),
+    ("Article 21 of the Constitution", [("article", "Constitution of India", ["21"])]),
+    ("Art 21", [("article", "Constitution of India", ["21"])]),
+    # Mixed, repeated and non-citations
+    (
+        "Under Section 138 NI Act, see (2017) 10 SCC 1 and again (2017) 10 SCC 1.",
+        [("section", "Negotiable Instruments Act", ["138"]), "scc:2017:10:1"],
+    ),
+    ("The Secretary 5 said the Article was fine", []),
+    ("", []),
+])
+def test_extract_citations(text, expected):
+    assert [summary(citation) for citation in extract_citations(text)] == expected
+
+
+def test_unresolved_act_keeps_its_year():
+    [citation] = extract_citations("Section 5 of the Foo Bar Act, 2001")
+    assert citation["resolved"] is False and citation["act_year"] == 2001
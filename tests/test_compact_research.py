@@ -0,0 +1,41 @@
+import pytest
+
+from compact_research import compact_update
+from repository import RESEARCH_COMPRESSED_FIELDS, RESEARCH_PREVIEW_CHARS
+from storage_codec import FieldCodec
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+pytestmark = pytest.mark.anyio
+
+LONG_ANSWER = "Section 138 of the Negotiable Instruments Act requires a statutory notice. " * 40
+
+
+@pytest.fixture
+def codec():
+    return FieldCodec(RESEARCH_COMPRESSED_FIELDS, algorithm="zlib", min_bytes=1024)
+
+
+async def test_every_document_is_rewritten_once(codec):
+    research = mongomock_motor.AsyncMongoMockClient()["legalsuite_test"]["research_results"]
+    await research.insert_many([
+        {"id": "large", "ai_response": LONG_ANSWER, "indian_kanoon_results": [{"tid": 1}]},
+        {"id": "small", "ai_response": "Short answer", "indian_kanoon_results": []},
+    ])
+
+    for run in range(2):
+        pending = await research.find({"compression": {"$exists": False}}, {"_id": 0}).to_list(None)
+        if pending:
+            await research.bulk_write([compact_update(codec, document) for document in pending])
+        assert len(pending) == (2 if run == 0 else 0)
+
+    large = await research.find_one({"id": "large"}, {"_id": 0})
+    assert large["compression"] == "zlib" and "ai_response" not in large and "ai_response_z" in large
+    assert large["ai_preview"] == LONG_ANSWER[:RESEARCH_PREVIEW_CHARS]
+    assert codec.unpack(large)["ai_response"] == LONG_ANSWER
+
+    small = await research.find_one({"id": "small"}, {"_id": 0})
+    assert small["compression"] == "none" and small["ai_preview"] == "Short answer"
+    assert codec.unpack(small) == {
+        "id": "small", "ai_response": "Short answer", "indian_kanoon_results": [], "ai_preview": "Short answer",
+    }
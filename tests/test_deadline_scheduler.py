@@ -0,0 +1,140 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from deadline_scheduler import DeadlineScheduler  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+LEAD_DAYS = {"next_hearing_date": (7, 1), "filing_deadline": (7, 2)}
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["legalsuite_test"]
+
+
+def utcnow() -> datetime:
+    # Mongo keeps milliseconds; compare dates as they come back
+    now = datetime.utcnow()
+    return now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+
+def scheduler(db, **kwargs) -> DeadlineScheduler:
+    scheduler = DeadlineScheduler(LEAD_DAYS, tick_s=5, **kwargs)
+    scheduler.db = db
+    return scheduler
+
+
+async def add_case(db, case_id="c1", **fields):
+    await db.cases.insert_one({
+        "id": case_id, "law_firm_id": "firm-1", "case_number": f"CS/{case_id}", "status": "active", "stage": "hearing",
+        "alerts": [], **fields,
+    })
+
+
+async def alerts(db, case_id="c1"):
+    return (await db.cases.find_one({"id": case_id}))["alerts"]
+
+
+async def lead(db, now):
+    """A scheduler holding the lease, with its window loaded"""
+    leader = scheduler(db)
+    assert await leader._hold_lease()
+    await leader._load_window(now)
+    return leader
+
+
+async def test_lease_is_taken_over_once_it_expires(db):
+    first, second = scheduler(db, lease_ttl_s=60), scheduler(db, lease_ttl_s=60)
+    assert await first._hold_lease() is True
+    assert await second._hold_lease() is False
+    assert await first._hold_lease() is True  # Renewal
+
+    await db.scheduler_leases.update_one({"_id": "deadline_scheduler"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    assert await second._hold_lease() is True
+    assert await first._hold_lease() is False
+    assert first.is_leader is False and first._heap == [] and first._loaded_until is None
+    assert second.leader_changes == 1 and first.leader_changes == 2
+
+
+async def test_due_alert_fires_once(db):
+    now = utcnow()
+    await add_case(db, next_hearing_date=now + timedelta(days=3))
+    leader = await lead(db, now)
+
+    await leader._fire_due(now)
+    [alert] = await alerts(db)
+    assert alert["type"] == "hearing" and alert["priority"] == "high" and "in 3 days" in alert["message"]
+    # The 1-day lead is still queued; a new leader does not duplicate the 7-day one
+    assert [entry[5] for entry in leader._heap] == [1]
+    await db.scheduler_leases.delete_many({})  # As when the old leader stops
+    await (await lead(db, now))._fire_due(now)
+    assert len(await alerts(db)) == 1
+
+
+async def test_date_moved_after_queueing_is_not_alerted(db):
+    now = utcnow()
+    await add_case(db, next_hearing_date=now + timedelta(days=3))
+    leader = await lead(db, now)
+
+    moved = now + timedelta(days=30)
+    await db.cases.update_one({"id": "c1"}, {"$set": {"next_hearing_date": moved}})
+    await leader._fire_due(now)
+    assert await alerts(db) == []
+
+    # Once told, the leader requeues the new date's leads instead
+    leader.case_changed("c1")
+    leader._loaded_until = now + timedelta(days=60)
+    await leader._requeue_changed(now)
+    assert sorted(entry[4] for entry in leader._heap if entry[6] == leader._generations["c1"]) == [moved, moved]
+
+
+async def test_case_closed_before_firing_is_not_alerted(db):
+    now = utcnow()
+    await add_case(db, next_hearing_date=now + timedelta(days=3), filing_deadline=now + timedelta(days=1))
+    leader = await lead(db, now)
+
+    await db.cases.update_one({"id": "c1"}, {"$set": {"stage": "closed"}})
+    await leader._fire_due(now)
+    assert await alerts(db) == []
+
+
+class FailingWrites:
+    """A cases collection whose bulk writes fail ``failures`` times"""
+
+    def __init__(self, collection, failures: int):
+        self._collection = collection
+        self.failures = failures
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    async def bulk_write(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("primary stepped down")
+        return await self._collection.bulk_write(*args, **kwargs)
+
+
+async def test_failed_write_is_retried_on_a_later_tick(db):
+    now = utcnow()
+    await add_case(db, next_hearing_date=now + timedelta(days=3))
+    await add_case(db, "c2", filing_deadline=now + timedelta(days=1))
+    leader = await lead(db, now)
+    cases = FailingWrites(db.cases, failures=1)
+    leader.db = SimpleNamespace(cases=cases, scheduler_leases=db.scheduler_leases)
+
+    with pytest.raises(ConnectionError):
+        await leader._fire_due(now)
+    assert await alerts(db, "c1") == [] and await alerts(db, "c2") == []
+
+    await leader._fire_due(now)
+    assert await alerts(db, "c1") == []  # Not due again until the next tick
+
+    await leader._fire_due(now + timedelta(seconds=5))
+    assert len(await alerts(db, "c1")) == 1 and len(await alerts(db, "c2")) == 1
+    assert leader.alerts_fired == 2
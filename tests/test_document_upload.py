@@ -0,0 +1,57 @@
+import httpx
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import server  # noqa: E402
+from read_cache import ReadCache  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def api(monkeypatch):
+    monkeypatch.setattr(server, "client", mongomock_motor.AsyncMongoMockClient())
+    monkeypatch.setattr(server, "db", server.client["legalsuite_test"])
+    monkeypatch.setattr(server, "read_cache", ReadCache())
+    monkeypatch.setattr(server, "OPENROUTER_API_KEY", "test-key")
+    calls = []
+
+    async def complete(messages, max_tokens, temperature):
+        # Echo the prompt, so the summary shows what the model was told
+        calls.append(messages)
+        return {"content": "\n".join(m["content"] for m in messages), "model": "test-model", "usage": {}, "latency_ms": 1.0}
+
+    monkeypatch.setattr(server.ai_router, "complete", complete)
+    async with server.lifespan(server.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            client.llm_calls = calls
+            yield client
+
+
+async def upload(api, firm, filename, content=b"Sale deed between the parties dated 1 April 2026"):
+    response = await api.post(
+        "/api/documents/upload",
+        files={"file": (filename, content, "text/plain")},
+        data={"law_firm_id": firm, "uploaded_by": f"{firm}-user", "document_type": "contract"},
+    )
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_identical_uploads_are_not_shared_across_firms(api):
+    first = await upload(api, "firm-a", "acme-settlement.txt")
+    second = await upload(api, "firm-b", "globex-deed.txt")
+
+    assert len(api.llm_calls) == 2
+    assert second["analysis_cached"] is False
+    assert "firm-b" in second["ai_summary"] and "globex-deed.txt" in second["ai_summary"]
+    assert "firm-a" not in second["ai_summary"] and "acme-settlement.txt" not in second["ai_summary"]
+    assert "firm-b" not in first["ai_summary"] and "globex-deed.txt" not in first["ai_summary"]
+
+
+async def test_identical_upload_within_a_firm_reuses_the_analysis(api):
+    first = await upload(api, "firm-a", "deed.txt")
+    again = await upload(api, "firm-a", "deed.txt")
+    assert len(api.llm_calls) == 1
+    assert again["analysis_cached"] is True and again["ai_summary"] == first["ai_summary"]
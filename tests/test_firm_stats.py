@@ -0,0 +1,30 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from repository import firm_stats_pipeline, is_closed
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_open_cases_and_overdue_deadlines_match_is_closed():
+    cases = mongomock_motor.AsyncMongoMockClient()["legalsuite_test"]["cases"]
+    now = datetime.utcnow()
+    overdue = now - timedelta(days=1)
+    documents = [
+        {"id": "open", "status": "active", "stage": "hearing", "filing_deadline": overdue},
+        {"id": "closed-stage", "status": "active", "stage": "closed", "filing_deadline": overdue},
+        {"id": "dropped", "status": "dropped", "stage": "hearing", "filing_deadline": overdue},
+        {"id": "closed", "status": "closed", "stage": "judgment"},
+        {"id": "no-status", "stage": "filing"},
+        {"id": "other-firm", "law_firm_id": "firm-2", "status": "active", "stage": "hearing"},
+    ]
+    await cases.insert_many([{"law_firm_id": "firm-1", **document} for document in documents])
+
+    [stats] = await cases.aggregate(firm_stats_pipeline("firm-1", now)).to_list(None)
+    [totals] = stats["totals"]
+    assert totals["cases"] == 5
+    assert totals["open_cases"] == sum(not is_closed(d) for d in documents if "law_firm_id" not in d) == 2
+    assert totals["overdue_deadlines"] == 1
@@ -0,0 +1,165 @@
+import asyncio
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from idempotency import IdempotencyMiddleware, IdempotencyStore, request_fingerprint
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+pytestmark = pytest.mark.anyio
+
+
+class Endpoints:
+    """Counts executions; ``/flaky`` fails once, ``/slow`` waits for ``release``"""
+
+    def __init__(self):
+        self.calls = 0
+        self.release = asyncio.Event()
+        self.started = asyncio.Event()
+
+    async def create(self, request):
+        self.calls += 1
+        return JSONResponse({"call": self.calls, "size": len(await request.body())}, status_code=201)
+
+    async def flaky(self, request):
+        self.calls += 1
+        if self.calls == 1:
+            return JSONResponse({"detail": "upstream down"}, status_code=500)
+        return JSONResponse({"call": self.calls})
+
+    async def slow(self, request):
+        self.calls += 1
+        self.started.set()
+        await self.release.wait()
+        return JSONResponse({"call": self.calls})
+
+    def app(self):
+        return Starlette(routes=[
+            Route("/create", self.create, methods=["POST"]),
+            Route("/flaky", self.flaky, methods=["POST"]),
+            Route("/slow", self.slow, methods=["POST"]),
+        ])
+
+
+@pytest.fixture
+async def collection():
+    collection = mongomock_motor.AsyncMongoMockClient()["legalsuite_test"]["idempotency_keys"]
+    await collection.create_index("key", unique=True)
+    return collection
+
+
+@pytest.fixture
+def endpoints():
+    return Endpoints()
+
+
+@pytest.fixture
+async def api(collection, endpoints):
+    store = IdempotencyStore(wait_timeout_s=0.2, poll_s=0.01)
+    store.attach(collection)
+    app = IdempotencyMiddleware(endpoints.app(), store, paths=["/create", "/flaky", "/slow"])
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        client.store = store
+        yield client
+
+
+async def test_duplicate_replays_the_stored_response(api, endpoints):
+    first = await api.post("/create", json={"title": "Sharma v. Verma"}, headers={"Idempotency-Key": "k1"})
+    second = await api.post("/create", json={"title": "Sharma v. Verma"}, headers={"Idempotency-Key": "k1"})
+    assert first.status_code == second.status_code == 201
+    assert second.json() == first.json() == {"call": 1, "size": first.json()["size"]}
+    assert "idempotent-replayed" not in first.headers
+    assert second.headers["idempotent-replayed"] == "true"
+    assert endpoints.calls == 1
+    assert api.store.snapshot()["executed"] == 1 and api.store.snapshot()["replayed"] == 1
+
+
+async def test_requests_without_a_key_always_execute(api, endpoints):
+    await api.post("/create", json={})
+    await api.post("/create", json={})
+    assert endpoints.calls == 2
+
+
+async def test_key_reused_with_a_different_body_is_rejected(api, endpoints):
+    await api.post("/create", json={"title": "A"}, headers={"Idempotency-Key": "k1"})
+    response = await api.post("/create", json={"title": "B"}, headers={"Idempotency-Key": "k1"})
+    assert response.status_code == 422
+    assert endpoints.calls == 1
+
+
+async def test_duplicate_of_a_running_request_gets_409_once_the_wait_runs_out(api, endpoints):
+    original = asyncio.create_task(api.post("/slow", json={}, headers={"Idempotency-Key": "k1"}))
+    await endpoints.started.wait()
+    duplicate = await api.post("/slow", json={}, headers={"Idempotency-Key": "k1"})
+    assert duplicate.status_code == 409
+    assert duplicate.headers["retry-after"] == "5"
+
+    endpoints.release.set()
+    assert (await original).status_code == 200
+    assert endpoints.calls == 1
+
+
+async def test_duplicate_waits_for_the_running_original_and_replays_it(api, endpoints):
+    api.store.wait_timeout_s = 5
+    original = asyncio.create_task(api.post("/slow", json={}, headers={"Idempotency-Key": "k1"}))
+    await endpoints.started.wait()
+    duplicate = asyncio.create_task(api.post("/slow", json={}, headers={"Idempotency-Key": "k1"}))
+    await asyncio.sleep(0.05)
+    endpoints.release.set()
+    assert (await original).json() == (await duplicate).json() == {"call": 1}
+    assert (await duplicate).headers["idempotent-replayed"] == "true"
+    assert endpoints.calls == 1
+
+
+async def test_server_error_releases_the_key(api, endpoints, collection):
+    failed = await api.post("/flaky", json={}, headers={"Idempotency-Key": "k1"})
+    assert failed.status_code == 500
+    assert await collection.count_documents({}) == 0
+
+    retried = await api.post("/flaky", json={}, headers={"Idempotency-Key": "k1"})
+    assert retried.status_code == 200 and retried.json() == {"call": 2}
+    assert "idempotent-replayed" not in retried.headers
+
+
+async def test_multipart_retries_match_despite_new_boundaries(api, endpoints):
+    files = {"file": ("deed.txt", b"Sale deed dated 1 April 2026", "text/plain")}
+    first = await api.post("/create", files=files, data={"case_id": "c1"}, headers={"Idempotency-Key": "k1"})
+    second = await api.post("/create", files=files, data={"case_id": "c1"}, headers={"Idempotency-Key": "k1"})
+    assert second.headers["idempotent-replayed"] == "true"
+    assert second.json() == first.json()
+    assert endpoints.calls == 1
+
+
+def test_fingerprint_ignores_the_multipart_boundary_only():
+    def multipart(boundary, content):
+        body = f"--{boundary}\r\nContent-Disposition: form-data; name=\"f\"\r\n\r\n{content}\r\n--{boundary}--\r\n"
+        return body.encode(), f'multipart/form-data; boundary="{boundary}"'
+
+    assert request_fingerprint(*multipart("aaa111", "deed")) == request_fingerprint(*multipart("bbb222", "deed"))
+    assert request_fingerprint(*multipart("aaa111", "deed")) != request_fingerprint(*multipart("aaa111", "will"))
+
+
+async def test_malformed_content_length_is_passed_through(collection, endpoints):
+    store = IdempotencyStore()
+    store.attach(collection)
+    app = IdempotencyMiddleware(endpoints.app(), store, paths=["/create"])
+    scope = {
+        "type": "http", "method": "POST", "path": "/create", "raw_path": b"/create", "query_string": b"",
+        "headers": [(b"idempotency-key", b"k1"), (b"content-length", b"ten")],
+    }
+    messages = iter([{"type": "http.request", "body": b"{}", "more_body": False}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    assert sent[0]["status"] == 201
+    assert endpoints.calls == 1 and store.snapshot()["executed"] == 0
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from external_integrations.indian_kanoon import IndianKanoonClient, KanoonServiceError
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeKanoon(IndianKanoonClient):
+    """Serves canned pages, each after its own delay"""
+
+    def __init__(self, pages, delays, **kwargs):
+        super().__init__(api_key="test", base_url="http://kanoon.test", **kwargs)
+        self.pages = pages
+        self.delays = delays
+
+    async def search_page(self, query, pagenum=0):
+        await asyncio.sleep(self.delays[pagenum])
+        page = self.pages[pagenum]
+        if isinstance(page, Exception):
+            raise page
+        return [{"tid": tid, "title": f"Case {tid}"} for tid in page]
+
+
+def tids(event):
+    return [result["tid"] for result in event["results"]]
+
+
+async def test_stream_yields_pages_in_order_and_dedups_toward_lower_page():
+    # Page 1 arrives first and shares tid 2 with page 0
+    client = FakeKanoon(pages=[[1, 2], [2, 3], [3, 4]], delays=[0.05, 0.0, 0.02])
+    events = [event async for event in client.stream("bail", pages=3)]
+    assert [(event["page"], tids(event)) for event in events] == [(0, [1, 2]), (1, [3]), (2, [4])]
+
+
+async def test_search_over_pages_does_not_depend_on_arrival_order():
+    fast_first = FakeKanoon(pages=[[1, 2], [2, 3]], delays=[0.0, 0.03])
+    slow_first = FakeKanoon(pages=[[1, 2], [2, 3]], delays=[0.03, 0.0])
+    expected = [1, 2, 3]
+    assert [r["tid"] for r in await fast_first.search("bail", pages=2)] == expected
+    assert [r["tid"] for r in await slow_first.search("bail", pages=2)] == expected
+
+
+async def test_stream_skips_failed_pages_and_raises_when_all_fail():
+    client = FakeKanoon(pages=[KanoonServiceError("down"), [5, 6]], delays=[0.02, 0.0])
+    events = [event async for event in client.stream("bail", pages=2)]
+    assert [(event["page"], tids(event)) for event in events] == [(1, [5, 6])]
+
+    client = FakeKanoon(pages=[KanoonServiceError("down"), KanoonServiceError("down")], delays=[0.0, 0.0])
+    with pytest.raises(KanoonServiceError):
+        [event async for event in client.stream("bail", pages=2)]
+
+
+async def test_fetch_judgment_cancels_fragment_request_when_doc_fails():
+    client = IndianKanoonClient(api_key="test", base_url="http://kanoon.test")
+    fragment_cancelled = asyncio.Event()
+
+    async def get(path, params):
+        if path.startswith("/doc/"):
+            raise KanoonServiceError("down")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            fragment_cancelled.set()
+            raise
+
+    client._get = get
+    with pytest.raises(KanoonServiceError):
+        await client.fetch_judgment(7, query="bail")
+    await asyncio.wait_for(fragment_cancelled.wait(), 1)
@@ -0,0 +1,166 @@
+import asyncio
+import time
+
+import pytest
+
+from llm_scheduler import BACKGROUND, INTERACTIVE, LLMQueueFull, LLMScheduler, TokenBucket
+
+pytestmark = pytest.mark.anyio
+
+
+async def hold(scheduler, firm_id, release, priority=INTERACTIVE):
+    async with scheduler.slot(firm_id, priority):
+        await release.wait()
+
+
+async def admit_in_order(scheduler, waiters, order):
+    """Queue ``(name, firm_id, priority)`` waiters in order; each records its admission and releases at once"""
+
+    async def run(name, firm_id, priority):
+        async with scheduler.slot(firm_id, priority):
+            order.append(name)
+
+    tasks = []
+    for name, firm_id, priority in waiters:
+        tasks.append(asyncio.create_task(run(name, firm_id, priority)))
+        await asyncio.sleep(0)  # Enqueue before the next one
+    return tasks
+
+
+async def test_firms_are_served_round_robin():
+    scheduler = LLMScheduler(global_limit=1, per_firm_limit=1)
+    release = asyncio.Event()
+    blocker = asyncio.create_task(hold(scheduler, "X", release))
+    await asyncio.sleep(0)
+
+    order = []
+    tasks = await admit_in_order(scheduler, [
+        ("a1", "A", INTERACTIVE), ("a2", "A", INTERACTIVE), ("a3", "A", INTERACTIVE),
+        ("b1", "B", INTERACTIVE), ("c1", "C", INTERACTIVE),
+    ], order)
+    assert scheduler.queued == 5
+
+    release.set()
+    await asyncio.gather(blocker, *tasks)
+    assert order == ["a1", "b1", "c1", "a2", "a3"]
+    assert scheduler.active == 0 and scheduler.queued == 0
+
+
+async def test_interactive_calls_jump_background_ones():
+    scheduler = LLMScheduler(global_limit=1, per_firm_limit=1)
+    release = asyncio.Event()
+    blocker = asyncio.create_task(hold(scheduler, "X", release))
+    await asyncio.sleep(0)
+
+    order = []
+    tasks = await admit_in_order(scheduler, [
+        ("batch-1", "A", BACKGROUND), ("batch-2", "B", BACKGROUND), ("ask", "C", INTERACTIVE),
+    ], order)
+    release.set()
+    await asyncio.gather(blocker, *tasks)
+    assert order == ["ask", "batch-1", "batch-2"]
+
+
+async def test_per_firm_limit_lets_other_firms_through():
+    scheduler = LLMScheduler(global_limit=4, per_firm_limit=1)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(scheduler, "A", release))
+    await asyncio.sleep(0)
+
+    order = []
+    tasks = await admit_in_order(scheduler, [("a2", "A", INTERACTIVE), ("b1", "B", INTERACTIVE)], order)
+    await asyncio.sleep(0.01)  # Let the admitted waiter resume
+    assert order == ["b1"]
+    assert scheduler.snapshot()["queued_by_firm"] == {"A": 1}
+
+    release.set()
+    await asyncio.gather(holder, *tasks)
+    assert order == ["b1", "a2"]
+
+
+async def test_full_queue_is_rejected_with_retry_after():
+    scheduler = LLMScheduler(global_limit=1, per_firm_limit=1, max_queue=2, max_queue_per_firm=1)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(scheduler, "X", release))
+    await asyncio.sleep(0)
+    queued = [asyncio.create_task(hold(scheduler, firm_id, release)) for firm_id in ("A", "B")]
+    await asyncio.sleep(0)
+
+    # Per-firm bound: A already has one waiter
+    with pytest.raises(LLMQueueFull) as per_firm:
+        async with scheduler.slot("A"):
+            pass
+    # Global bound: two waiters queued in total
+    with pytest.raises(LLMQueueFull) as global_full:
+        async with scheduler.slot("C"):
+            pass
+    assert per_firm.value.retry_after >= 1 and global_full.value.retry_after >= 1
+    assert scheduler.rejected == 2
+
+    release.set()
+    await asyncio.gather(holder, *queued)
+
+
+async def test_wait_timeout_raises_and_withdraws_the_waiter():
+    scheduler = LLMScheduler(global_limit=1, per_firm_limit=1, max_wait_s=0.05)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(scheduler, "X", release))
+    await asyncio.sleep(0)
+
+    with pytest.raises(LLMQueueFull) as timed_out:
+        async with scheduler.slot("A"):
+            pass
+    assert "Timed out" in str(timed_out.value) and timed_out.value.retry_after >= 1
+    assert scheduler.timed_out == 1 and scheduler.queued == 0
+
+    release.set()
+    await holder
+    assert scheduler.active == 0
+
+
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = LLMScheduler(global_limit=1, per_firm_limit=1)
+    release = asyncio.Event()
+    holder = asyncio.create_task(hold(scheduler, "X", release))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(hold(scheduler, "A", release))
+    await asyncio.sleep(0)
+    assert scheduler.queued == 1
+
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert scheduler.queued == 0
+
+    release.set()
+    await holder
+    assert scheduler.active == 0 and scheduler.snapshot()["active_by_firm"] == {}
+
+
+async def test_token_bucket_paces_admissions():
+    scheduler = LLMScheduler(global_limit=8, per_firm_limit=8, rate_per_s=20, burst=1)
+    admitted = []
+
+    async def call():
+        async with scheduler.slot("A"):
+            admitted.append(time.monotonic())
+
+    await asyncio.gather(*[call() for _ in range(3)])
+    # The burst admits one call at once, then one token arrives every 50ms
+    assert admitted[2] - admitted[0] >= 0.08
+    assert scheduler.admitted == 3
+
+
+async def test_sub_one_rate_still_admits_a_call():
+    scheduler = LLMScheduler(rate_per_s=0.5)
+    assert scheduler.bucket.capacity == 1.0
+    async with scheduler.slot("A"):
+        pass
+    assert scheduler.admitted == 1
+
+
+def test_token_bucket_never_exceeds_capacity():
+    bucket = TokenBucket(rate=1000, capacity=2)
+    time.sleep(0.01)
+    assert bucket.try_take() and bucket.try_take() and not bucket.try_take()
+    assert bucket.tokens <= bucket.capacity
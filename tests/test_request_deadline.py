@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+from external_integrations.resilience import DeadlineExceeded
+from request_deadline import (
+    RequestDeadlineMiddleware, RequestDeadlines, capped_timeout, current_deadline, detached_task
+)
+from request_timing import ServerTimingMiddleware, span
+
+pytestmark = pytest.mark.anyio
+
+
+class Endpoints:
+    def __init__(self):
+        self.cancelled = asyncio.Event()
+        self.detached_done = asyncio.Event()
+        self.detached_deadline = "unset"
+
+    async def fast(self, request):
+        return JSONResponse({"remaining": current_deadline().remaining() if current_deadline() else None})
+
+    async def slow(self, request):
+        with span("llm"):
+            await asyncio.sleep(0.02)
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+    async def swallowing(self, request):
+        time.sleep(0.08)  # Blocks the loop past the deadline, so the endpoint sees the expiry first
+        try:
+            capped_timeout(5)
+        except DeadlineExceeded as e:
+            return JSONResponse({"detail": str(e)}, status_code=500)
+        return JSONResponse({})
+
+    async def stream(self, request):
+        async def chunks():
+            try:
+                while True:
+                    yield b"{}\n"
+                    await asyncio.sleep(0.02)
+            except asyncio.CancelledError:
+                self.cancelled.set()
+                raise
+        return StreamingResponse(chunks(), media_type="application/x-ndjson")
+
+    async def detaching(self, request):
+        async def flush():
+            await asyncio.sleep(0.1)
+            self.detached_deadline = current_deadline()
+            self.detached_done.set()
+        detached_task(flush())
+        await asyncio.sleep(10)
+
+    def app(self, deadlines):
+        app = Starlette(routes=[
+            Route(path, endpoint, methods=["GET", "POST"])
+            for path, endpoint in [
+                ("/fast", self.fast), ("/slow", self.slow), ("/swallowing", self.swallowing),
+                ("/stream", self.stream), ("/detaching", self.detaching),
+            ]
+        ])
+        return ServerTimingMiddleware(RequestDeadlineMiddleware(app, deadlines=deadlines))
+
+
+@pytest.fixture
+def endpoints():
+    return Endpoints()
+
+
+@pytest.fixture
+def deadlines():
+    return RequestDeadlines(default_s=0.05, routes=[("GET", "/stream", 0.1), ("POST", "/fast", 0)])
+
+
+@pytest.fixture
+async def api(endpoints, deadlines):
+    transport = httpx.ASGITransport(app=endpoints.app(deadlines))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+async def call(app, path, messages, method="GET", headers=()):
+    """Run ``app`` on a raw request; ``messages`` are (delay_s, message) fed to receive()"""
+    scope = {
+        "type": "http", "method": method, "path": path, "raw_path": path.encode(), "query_string": b"",
+        "headers": list(headers),
+    }
+    queue = list(messages)
+    sent = []
+
+    async def receive():
+        if not queue:
+            await asyncio.sleep(10)
+        delay_s, message = queue.pop(0)
+        await asyncio.sleep(delay_s)
+        return message
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    return sent
+
+
+def test_budget_for_route_default_and_disabled(deadlines):
+    assert deadlines.budget_for("GET", "/stream") == 0.1
+    assert deadlines.budget_for("GET", "/fast") == 0.05
+    assert deadlines.budget_for("POST", "/fast") is None
+
+
+async def test_fast_request_runs_under_its_budget(api):
+    response = await api.get("/fast")
+    assert response.status_code == 200
+    assert 0 < response.json()["remaining"] <= 0.05
+    assert (await api.post("/fast")).json() == {"remaining": None}
+
+
+async def test_slow_request_gets_504_with_timings(api, endpoints, deadlines):
+    response = await api.get("/slow")
+    assert response.status_code == 504
+    body = response.json()
+    assert body["deadline_ms"] == 50
+    assert body["elapsed_ms"] >= 50
+    assert body["timings_ms"]["llm"] >= 20
+    assert endpoints.cancelled.is_set()
+    assert deadlines.timed_out == {"/slow": 1}
+
+
+async def test_endpoint_error_after_expiry_is_replaced_by_504(api, deadlines):
+    response = await api.get("/swallowing")
+    assert response.status_code == 504
+    assert response.json()["deadline_ms"] == 50
+    assert deadlines.timed_out == {"/swallowing": 1}
+
+
+async def test_client_disconnect_cancels_the_endpoint(endpoints):
+    deadlines = RequestDeadlines(default_s=None)
+    sent = await call(endpoints.app(deadlines), "/slow", [
+        (0, {"type": "http.request", "body": b"", "more_body": False}),
+        (0.03, {"type": "http.disconnect"}),
+    ])
+    assert sent == []
+    assert endpoints.cancelled.is_set()
+    assert deadlines.disconnected == {"/slow": 1}
+    assert deadlines.timed_out == {}
+
+
+async def test_stream_past_its_deadline_is_cut_off(endpoints, deadlines):
+    sent = await call(endpoints.app(deadlines), "/stream", [(0, {"type": "http.request", "body": b"", "more_body": False})])
+    assert sent[0]["type"] == "http.response.start" and sent[0]["status"] == 200
+    bodies = sent[1:]
+    assert len(bodies) >= 2
+    assert all(message.get("more_body") for message in bodies)  # Never completed
+    assert endpoints.cancelled.is_set()
+    assert deadlines.timed_out == {"/stream": 1}
+
+
+async def test_detached_task_outlives_the_request(api, endpoints):
+    response = await api.get("/detaching")
+    assert response.status_code == 504
+    await asyncio.wait_for(endpoints.detached_done.wait(), 1)
+    assert endpoints.detached_deadline is None
+
+
+async def test_malformed_content_length_does_not_fail_the_request(endpoints, deadlines):
+    sent = await call(endpoints.app(deadlines), "/fast", [
+        (0, {"type": "http.request", "body": b"{}", "more_body": False}),
+    ], method="POST", headers=[(b"content-length", b"two")])
+    assert sent[0]["status"] == 200
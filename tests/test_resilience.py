@@ -0,0 +1,206 @@
+import asyncio
+import time
+
+import aiohttp
+import pytest
+
+from external_integrations import openrouter
+from external_integrations.openrouter import AIRequestError, AIServiceError, ModelRouter
+from external_integrations.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceeded, TransientUpstreamError, retrying
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def connector_error() -> aiohttp.ClientConnectorError:
+    return aiohttp.ClientConnectorError(None, OSError(111, "Connection refused"))
+
+
+# Circuit breaker
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout_s=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # Resets the streak
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.times_opened == 1
+
+    with pytest.raises(CircuitOpenError) as rejected:
+        breaker.before_call()
+    assert 0 < rejected.value.retry_after <= 60
+    assert breaker.total_rejected == 1
+
+
+def test_half_open_allows_a_single_trial():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout_s=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only one trial at a time
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout_s=0.01)
+    for _ in range(5):
+        breaker.record_failure()
+    time.sleep(0.02)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.times_opened == 2
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+
+async def test_guard_only_counts_upstream_failures():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout_s=60)
+
+    with pytest.raises(KeyError):
+        async with breaker.guard(ignore=(KeyError,)):
+            raise KeyError("not found")
+    with pytest.raises(DeadlineExceeded):
+        async with breaker.guard():
+            raise DeadlineExceeded("out of time")
+    with pytest.raises(asyncio.CancelledError):
+        async with breaker.guard():
+            raise asyncio.CancelledError()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.total_failures == 0
+
+    with pytest.raises(RuntimeError):
+        async with breaker.guard():
+            raise RuntimeError("upstream down")
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+# Retry classification
+
+async def attempts_until(error: Exception, idempotent: bool) -> int:
+    calls = 0
+    with pytest.raises(type(error)):
+        async for attempt in retrying(3, base_delay_s=0, idempotent=idempotent):
+            with attempt:
+                calls += 1
+                raise error
+    return calls
+
+
+@pytest.mark.parametrize("error, idempotent_attempts, paid_attempts", [
+    (TransientUpstreamError("503"), 3, 3),
+    (connector_error(), 3, 3),
+    (asyncio.TimeoutError(), 3, 1),
+    (aiohttp.ServerDisconnectedError(), 3, 1),
+    (DeadlineExceeded("out of time"), 1, 1),
+    (ValueError("bad"), 1, 1),
+])
+async def test_retry_classification(error, idempotent_attempts, paid_attempts):
+    assert await attempts_until(error, idempotent=True) == idempotent_attempts
+    assert await attempts_until(error, idempotent=False) == paid_attempts
+
+
+# OpenRouter
+
+def make_router(post_once, models=("m1",)) -> ModelRouter:
+    router = ModelRouter(api_key="k", base_url="http://openrouter.invalid", models=list(models), retry_attempts=3,
+                         breaker=CircuitBreaker("openrouter", failure_threshold=1, reset_timeout_s=60))
+    router._post_once = post_once
+    return router
+
+
+async def test_completion_is_not_resent_after_a_timeout():
+    calls = []
+
+    async def post_once(model, messages, max_tokens, temperature):
+        calls.append(model)
+        raise asyncio.TimeoutError()
+
+    router = make_router(post_once)
+    with pytest.raises(AIServiceError, match="timed out"):
+        await router.complete([{"role": "user", "content": "q"}])
+    assert calls == ["m1"]
+
+
+async def test_completion_is_retried_when_never_sent(monkeypatch):
+    calls = []
+
+    async def post_once(model, messages, max_tokens, temperature):
+        calls.append(model)
+        if len(calls) < 3:
+            raise connector_error() if len(calls) == 1 else TransientUpstreamError("429")
+        return {"content": "ok", "model": model, "usage": {}, "latency_ms": 1.0}
+
+    monkeypatch.setattr(openrouter, "retrying", lambda attempts, **kwargs: retrying(attempts, base_delay_s=0, **kwargs))
+    router = make_router(post_once)
+    assert (await router.complete([{"role": "user", "content": "q"}]))["content"] == "ok"
+    assert calls == ["m1", "m1", "m1"]
+
+
+async def test_rejected_requests_do_not_trip_the_breaker():
+    async def post_once(model, messages, max_tokens, temperature):
+        raise AIRequestError(f"OpenRouter API returned status 400 for {model}")
+
+    router = make_router(post_once, models=("m1", "m2"))
+    with pytest.raises(AIRequestError):
+        await router.complete([{"role": "user", "content": "q"}])
+    assert router.breaker.state == CircuitBreaker.CLOSED and router.breaker.total_failures == 0
+
+
+async def test_upstream_failures_trip_the_breaker():
+    async def post_once(model, messages, max_tokens, temperature):
+        raise AIServiceError(f"OpenRouter API returned status 401 for {model}") if model == "m1" else KeyError("choices")
+
+    router = make_router(post_once, models=("m1", "m2"))
+    with pytest.raises(AIServiceError) as failed:
+        await router.complete([{"role": "user", "content": "q"}])
+    assert not isinstance(failed.value, AIRequestError)
+    assert router.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        await router.complete([{"role": "user", "content": "q"}])
+
+
+class FakeResponse:
+    def __init__(self, status: int):
+        self.status = status
+
+    async def text(self):
+        return "error"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    closed = False
+
+    def __init__(self, status: int):
+        self.status = status
+
+    def post(self, *args, **kwargs):
+        return FakeResponse(self.status)
+
+
+@pytest.mark.parametrize("status, error, recorded", [
+    (400, AIRequestError, []),
+    (413, AIRequestError, []),
+    (503, TransientUpstreamError, [False]),
+    (501, AIServiceError, [False]),
+])
+async def test_only_upstream_errors_count_against_model_health(status, error, recorded):
+    router = ModelRouter(api_key="k", base_url="http://openrouter.invalid", models=["m1"])
+    router._session = FakeSession(status)
+    with pytest.raises(error):
+        await router._post_once("m1", [{"role": "user", "content": "q"}], 10, 0.7)
+    assert [ok for _, _, ok in router.health["m1"].samples] == recorded
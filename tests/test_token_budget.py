@@ -0,0 +1,64 @@
+import pytest
+
+import token_budget
+from token_budget import TokenBudget, count_tokens
+
+
+class FakeEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+class FakeTiktoken:
+    """Fails to load ``failures`` times, as when encodings cannot be downloaded"""
+
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.loads = 0
+
+    def encoding_for_model(self, name):
+        self.loads += 1
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("could not download encoding")
+        return FakeEncoding()
+
+
+@pytest.fixture
+def tiktoken(monkeypatch):
+    def install(failures: int = 0) -> FakeTiktoken:
+        fake = FakeTiktoken(failures)
+        monkeypatch.setattr(token_budget, "tiktoken", fake)
+        monkeypatch.setattr(token_budget, "_encoders", {})
+        monkeypatch.setattr(token_budget, "_encoder_failed_at", {})
+        token_budget._cached_count.cache_clear()
+        return fake
+    yield install
+    token_budget._cached_count.cache_clear()
+
+
+TEXT = "one two three four five six seven eight nine ten eleven twelve"
+ESTIMATE = int(len(TEXT) / 3.5) + 1
+
+
+def test_failed_tokenizer_load_is_retried_after_the_backoff(tiktoken, monkeypatch):
+    fake = tiktoken(failures=1)
+    assert count_tokens(TEXT) == ESTIMATE
+    assert count_tokens(TEXT) == ESTIMATE  # Within the backoff: no new attempt
+    assert fake.loads == 1
+
+    monkeypatch.setattr(token_budget, "ENCODER_RETRY_S", 0)
+    assert count_tokens(TEXT) == 12
+    assert count_tokens(TEXT) == 12
+    assert fake.loads == 2
+
+
+def test_snapshot_does_not_load_the_tokenizer(tiktoken):
+    fake = tiktoken()
+    budget = TokenBudget(["openai/gpt-4o"])
+    assert budget.snapshot()["tokenizer"] == "estimate"
+    assert fake.loads == 0
+
+    budget.warm_up()
+    assert budget.snapshot()["tokenizer"] == "tiktoken"
+    assert fake.loads == 1